@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
+import json
+from pathlib import Path
 from rich.console import Console
+from rich.table import Table
 
 from tontine_initializer import TontineInitializer
 from tontine_executor import TontineExecutor
@@ -15,15 +19,139 @@ def main():
                         help="Nombre de mois à simuler")
     parser.add_argument("--output", type=str, default="simulation_results",
                         help="Répertoire pour stocker les résultats de la simulation")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Graine aléatoire pour rendre la simulation reproductible")
+    parser.add_argument("--mode", type=str, default="simulate", choices=["simulate", "serve", "sensitivity", "calibrate", "nowcast", "compare", "batch", "merge", "worker", "coordinator", "optimize", "validate"],
+                        help="simulate : une simulation détaillée ; serve : service local de simulation (JSON-RPC) ; "
+                             "sensitivity : analyse de sensibilité globale (indices de Sobol) ; "
+                             "calibrate : calibration des probabilités des participants sur des registres observés ; "
+                             "nowcast : intégration d'un mois réel et prévision à partir de l'état persistant ; "
+                             "compare : comparaison appariée de deux configurations (réduction de variance) ; "
+                             "batch : réplications d'un fragment résumées dans un fichier de sketch ; "
+                             "merge : fusion de fichiers de sketch ; "
+                             "worker : exécution des unités d'une file de travail partagée ; "
+                             "coordinator : création d'une file de travail et fusion des résultats ; "
+                             "optimize : recherche des règles minimisant le risque de faillite (réductions successives) ; "
+                             "validate : équivalence statistique du moteur --engine avec le moteur de référence")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="Adresse d'écoute du service (mode serve)")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="Port d'écoute du service (mode serve)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Nombre de processus de simulation (par défaut : nombre de CPU)")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="Nombre maximal de travaux en attente dans le service (mode serve)")
+    parser.add_argument("--cache-size", type=int, default=100_000,
+                        help="Nombre maximal de réplications gardées en cache (mode serve)")
+    parser.add_argument("--replicas", type=int, default=20,
+                        help="Nombre de réplications Monte Carlo par point évalué")
+    parser.add_argument("--samples", type=int, default=64,
+                        help="Taille de l'échantillon de base de l'analyse de sensibilité, nombre initial de candidats (mode optimize)")
+    parser.add_argument("--sampler", type=str, default="lhs", choices=["lhs", "sobol"],
+                        help="Échantillonnage quasi-aléatoire : hypercube latin ou suite de Sobol (nécessite scipy)")
+    parser.add_argument("--parameter", type=str, action="append", default=None,
+                        help="Paramètre étudié, sous la forme nom:min:max (répétable). "
+                             "participants.<champ> multiplie la probabilité de tous les participants")
+    parser.add_argument("--cache", type=str, default=None,
+                        help="Fichier de cache des réplications (par défaut : <output>/cache.jsonl)")
+    parser.add_argument("--ledger", type=str, default=None,
+                        help="Registre mensuel observé, CSV ou Parquet (mode calibrate)")
+    parser.add_argument("--level", type=str, default="member", choices=["member", "archetype"],
+                        help="Calibration par membre ou par archétype (colonne archetype du registre)")
+    parser.add_argument("--method", type=str, default="bayes", choices=["mle", "bayes"],
+                        help="Maximum de vraisemblance ou bayésien empirique (loi a priori Beta)")
+    parser.add_argument("--report", type=str, default="stream", choices=["stream", "console"],
+                        help="stream : rapport HTML construit à partir des indicateurs mensuels (mémoire bornée) ; "
+                             "console : enregistrement complet de la console (simulation.html)")
+    parser.add_argument("--state", type=str, default=None,
+                        help="Répertoire d'état persistant de la tontine (mode nowcast, créé depuis --config s'il n'existe pas)")
+    parser.add_argument("--observed", type=str, default=None,
+                        help="Mois réel observé à intégrer avant la prévision, CSV ou Parquet (mode nowcast)")
+    parser.add_argument("--engine", type=str, default="auto", choices=["auto", "reference", "kernel"],
+                        help="Moteur des réplications Monte Carlo : reference (TontineExecutor), kernel (noyau compilé "
+                             "sur tableaux, rapide avec numba) ou auto (kernel si numba est installé, toujours kernel en modes validate et compare)")
+    parser.add_argument("--variant", type=str, default=None,
+                        help="Configuration B comparée à --config (mode compare)")
+    parser.add_argument("--change", type=str, action="append", default=None,
+                        help="Modification de --config définissant la variante B, sous la forme nom=valeur (répétable, "
+                             "mode compare). participants.<champ> multiplie la probabilité de tous les participants")
+    parser.add_argument("--antithetic", action=argparse.BooleanOptionalAction, default=True,
+                        help="Variables antithétiques (mode compare)")
+    parser.add_argument("--control-variate", action=argparse.BooleanOptionalAction, default=True,
+                        help="Variable de contrôle sur les cotisations attendues (mode compare)")
+    parser.add_argument("--shard", type=int, default=0,
+                        help="Numéro du fragment : réplications shard*replicas à (shard+1)*replicas-1 (mode batch)")
+    parser.add_argument("--sketch", type=str, action="append", default=None,
+                        help="Fichier de sketch à fusionner (répétable, mode merge)")
+    parser.add_argument("--queue", type=str, default=None,
+                        help="Répertoire partagé de la file de travail (modes worker et coordinator)")
+    parser.add_argument("--unit-size", type=int, default=50,
+                        help="Nombre de réplications par unité de travail (mode coordinator)")
+    parser.add_argument("--lease", type=float, default=300.0,
+                        help="Durée du bail d'une unité en secondes : au-delà, une unité non renouvelée est reprise (mode coordinator)")
+    parser.add_argument("--sweep", type=str, action="append", default=None,
+                        help="Paramètre balayé, sous la forme nom=v1,v2,... (répétable, produit cartésien, mode coordinator). "
+                             "participants.<champ> multiplie la probabilité de tous les participants")
+    parser.add_argument("--trajectory", action="store_true",
+                        help="Enregistrer l'historique mensuel de chaque membre dans <output>/trajectory.bin (mode simulate)")
+    parser.add_argument("--profile-memory", type=int, default=None, metavar="K",
+                        help="Profil mémoire tous les K mois (tracemalloc, objets par type), écrit dans <output>/memory_profile.html (mode simulate)")
+    parser.add_argument("--scenario", type=str, default=None,
+                        help="Scénario de chocs JSON : défauts corrélés, régimes et calendrier de probabilités (modes simulate, batch, optimize, validate et compare)")
+    parser.add_argument("--target-payout", type=float, default=None,
+                        help="Distributions minimales par membre sur l'horizon (mode optimize, par défaut : celles de la configuration)")
+    parser.add_argument("--eta", type=int, default=3,
+                        help="Facteur de réduction : 1/eta des candidats gardés et eta fois plus de réplications à chaque tour (mode optimize)")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Écart maximal des moyennes, en écarts types de référence (mode validate)")
     
     args = parser.parse_args()
     
-    console = Console(record=True)
+    if args.mode == "serve":
+        return serve(args)
+    if args.mode == "sensitivity":
+        return sensitivity(args)
+    if args.mode == "calibrate":
+        return calibrate(args)
+    if args.mode == "nowcast":
+        return nowcast(args)
+    if args.mode == "compare":
+        return compare(args)
+    if args.mode == "batch":
+        return batch(args)
+    if args.mode == "merge":
+        return merge(args)
+    if args.mode == "worker":
+        return worker(args)
+    if args.mode == "coordinator":
+        return coordinator(args)
+    if args.mode == "optimize":
+        return optimize(args)
+    if args.mode == "validate":
+        return validate(args)
+    
+    console = Console(record=args.report == "console")
+    observers = []
+    if args.report == "stream":
+        from tontine_report import StreamingReport
+        from tontine_metrics import RiskMetrics
+        risk_metrics = RiskMetrics(output_path=Path(args.output) / "risk_metrics.json")
+        observers.append(risk_metrics)
+        observers.append(StreamingReport(Path(args.output) / "simulation_report.html", risk_metrics=risk_metrics))
+    if args.trajectory:
+        from tontine_trajectory import TrajectoryRecorder
+        observers.append(TrajectoryRecorder(Path(args.output) / "trajectory"))
+    profiler = None
+    if args.profile_memory is not None:
+        from tontine_profiling import MemoryProfiler
+        profiler = MemoryProfiler(args.profile_memory, Path(args.output) / "memory_profile")
+        observers.append(profiler)
     
     try:
         # Charger la configuration
         console.print("[cyan]Chargement de la configuration de la tontine...[/cyan]")
         tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+        scenario = load_scenario_arg(args)
         
         # Créer l'état initial de la tontine
         console.print("[cyan]Création de l'état initial de la tontine...[/cyan]")
@@ -36,8 +164,15 @@ def main():
             participant_configs=participant_configs,
             console=console,
             initial_state=initial_state,
-            output_dir=args.output
+            output_dir=args.output,
+            seed=args.seed,
+            observers=observers,
+            scenario=scenario
         )
+        if profiler is not None:
+            profiler.watch("recap", executor.recap)
+            if console.record:
+                profiler.watch("console_record", console._record_buffer)
         
         executor.run_simulation(num_months=args.months)
         
@@ -48,5 +183,473 @@ def main():
     
     return 0
 
+def load_scenario_arg(args):
+    """Scénario de chocs de --scenario, ou None"""
+    if args.scenario is None:
+        return None
+    from tontine_scenarios import load_scenario
+    return load_scenario(args.scenario)
+
+def serve(args) -> int:
+    """Démarrer le service local de simulation"""
+    from tontine_service import TontineService
+
+    console = Console()
+    service = TontineService(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        cache_size=args.cache_size
+    )
+    console.print(f"[cyan]Service de simulation à l'écoute sur {args.host}:{args.port}...[/cyan]")
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        console.print("[cyan]Arrêt du service.[/cyan]")
+    return 0
+
+def sensitivity(args) -> int:
+    """Analyse de sensibilité globale du risque de faillite et du trésor final"""
+    from tontine_batch import ResultStore
+    from tontine_sensitivity import SensitivityAnalysis, parse_parameter
+
+    console = Console()
+    tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+    output_dir = Path(args.output)
+    output_dir.mkdir(exist_ok=True, parents=True)
+    store = ResultStore(args.cache or output_dir / "cache.jsonl")
+
+    analysis = SensitivityAnalysis(
+        tontine_config,
+        participant_configs,
+        parameters=[parse_parameter(spec) for spec in args.parameter] if args.parameter else None,
+        num_months=args.months,
+        replicas=args.replicas,
+        seed=args.seed or 0,
+        sampler=args.sampler,
+        store=store,
+        workers=args.workers,
+        engine=args.engine
+    )
+    console.print(f"[cyan]Analyse de sensibilité : {args.samples} échantillons, {args.replicas} réplications "
+                  f"({len(store)} réplications déjà en cache)...[/cyan]")
+    with console.status("[cyan]Évaluation des points...") as status:
+        report = analysis.run(
+            args.samples,
+            on_progress=lambda done, total: status.update(f"[cyan]Évaluation des points {done}/{total}")
+        )
+
+    for output, indices in report["outputs"].items():
+        table = Table(title=f"Indices de Sobol - {output}")
+        table.add_column("Paramètre", style="cyan")
+        table.add_column("S1", style="green")
+        table.add_column("ST", style="yellow")
+        for i, name in enumerate(report["parameters"]):
+            table.add_row(
+                name,
+                f"{indices['first_order'][i]:.3f} ± {indices['first_order_conf'][i]:.3f}",
+                f"{indices['total'][i]:.3f} ± {indices['total_conf'][i]:.3f}"
+            )
+        console.print(table)
+
+    with open(output_dir / "sensitivity.json", "w") as f:
+        json.dump(report, f, indent=2)
+    console.print(f"[green]Résultats enregistrés dans {output_dir / 'sensitivity.json'}")
+    return 0
+
+def optimize(args) -> int:
+    """Rechercher les règles de la tontine qui minimisent le risque de faillite"""
+    from tontine_batch import ResultStore
+    from tontine_optimize import PolicyOptimizer
+    from tontine_sensitivity import parse_parameter
+
+    console = Console()
+    tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+    output_dir = Path(args.output)
+    output_dir.mkdir(exist_ok=True, parents=True)
+    store = ResultStore(args.cache or output_dir / "cache.jsonl")
+
+    optimizer = PolicyOptimizer(
+        tontine_config,
+        participant_configs,
+        parameters=[parse_parameter(spec) for spec in args.parameter] if args.parameter else None,
+        num_months=args.months,
+        replicas=args.replicas,
+        eta=args.eta,
+        target_payout=args.target_payout,
+        seed=args.seed or 0,
+        sampler=args.sampler,
+        store=store,
+        workers=args.workers,
+        engine=args.engine,
+        scenario=load_scenario_arg(args)
+    )
+    console.print(f"[cyan]Optimisation : {args.samples} candidats, {args.replicas} réplications au premier tour "
+                  f"({len(store)} réplications déjà en cache)...[/cyan]")
+
+    def on_round(summary):
+        best = summary["best"]
+        console.print(f"Tour {summary['round'] + 1} : {summary['candidates']} candidats x {summary['replicas']} réplications, "
+                      f"meilleur : faillite {best['failure_probability']:.2%}, distributions ${best['member_payout']:.2f}/membre")
+
+    with console.status("[cyan]Évaluation des candidats...") as status:
+        report = optimizer.run(
+            args.samples,
+            on_progress=lambda done, total: status.update(f"[cyan]Évaluation des candidats {done}/{total}"),
+            on_round=on_round
+        )
+
+    table = Table(title=f"Meilleure configuration (distributions cibles : ${report['target_payout']:.2f}/membre)")
+    table.add_column("Paramètre", style="cyan")
+    table.add_column("Configuration", style="yellow")
+    table.add_column("Optimum", style="green")
+    for name in report["parameters"]:
+        table.add_row(name, f"{report['base']['values'][name]:g}", f"{report['best']['values'][name]:g}")
+    for key, label in (("failure_probability", "Probabilité de faillite"), ("member_payout", "Distributions par membre")):
+        error = "failure_std_error" if key == "failure_probability" else "payout_std_error"
+        table.add_row(label, *(f"{report[side][key]:.4f} ± {1.96 * report[side][error]:.4f}" for side in ("base", "best")))
+    console.print(table)
+    console.print(f"{report['evaluations']} réplications utilisées")
+
+    with open(output_dir / "optimization.json", "w") as f:
+        json.dump(report, f, indent=2)
+    console.print(f"[green]Résultats enregistrés dans {output_dir / 'optimization.json'}")
+    return 0
+
+def validate(args) -> int:
+    """Vérifier qu'un moteur alternatif reproduit statistiquement le moteur de référence"""
+    from tontine_snapshot import save_results
+    from tontine_validation import EngineValidation
+
+    console = Console()
+    tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+    output_dir = Path(args.output)
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    validation = EngineValidation(
+        tontine_config,
+        participant_configs,
+        num_months=args.months,
+        replicas=args.replicas,
+        candidate=args.engine,
+        seed=args.seed or 0,
+        tolerance=args.tolerance,
+        workers=args.workers,
+        scenario=load_scenario_arg(args)
+    )
+    console.print(f"[cyan]Validation du moteur {validation.candidate} : {args.replicas} réplications sur {args.months} mois...[/cyan]")
+    with console.status("[cyan]Simulation...") as status:
+        report = validation.run(
+            on_progress=lambda engine, done, total: status.update(f"[cyan]Moteur {engine} : {done}/{total} groupes")
+        )
+
+    table = Table(title=f"Moteur {report['candidate']} contre le moteur de référence")
+    table.add_column("Sortie", style="cyan")
+    table.add_column("Référence", style="yellow")
+    table.add_column("Candidat", style="yellow")
+    table.add_column("Écart (σ)", style="magenta")
+    table.add_column("KS (p)", style="magenta")
+    table.add_column("Résultat")
+    failure = report["failure_probability"]
+    table.add_row("Probabilité de faillite", f"{failure['reference']:.2%}", f"{failure['candidate']:.2%}", "-",
+                  f"{failure['p_value']:.3f}", "[green]OK" if failure["passed"] else "[bold red]ÉCHEC")
+    for name, output in report["outputs"].items():
+        table.add_row(name, f"{output['reference']['mean']:.2f}", f"{output['candidate']['mean']:.2f}",
+                      f"{output['standardized_difference']:.3f}", f"{output['ks_p_value']:.3f}",
+                      "[green]OK" if output["passed"] else "[bold red]ÉCHEC")
+    console.print(table)
+    console.print(f"Référence : {report['reference_seconds']:.2f} s, {report['candidate']} : {report['candidate_seconds']:.2f} s "
+                  f"(accélération x{report['speedup']:.1f})")
+
+    with open(output_dir / "validation.json", "w") as f:
+        json.dump(report, f, indent=2)
+    for engine, results in validation.results.items():
+        save_results(output_dir / "validation_replicas" / engine, results, {"engine": engine, "months": args.months})
+    if not report["passed"]:
+        console.print(f"[bold red]Le moteur {report['candidate']} s'écarte du moteur de référence[/bold red]")
+        return 1
+    console.print(f"[green]Moteur {report['candidate']} équivalent au moteur de référence ; résultats dans {output_dir / 'validation.json'}")
+    return 0
+
+def calibrate(args) -> int:
+    """Calibrer les probabilités des participants sur un registre observé"""
+    from tontine_calibration import LedgerCalibrator, load_ledger
+
+    console = Console()
+    if args.ledger is None:
+        console.print("[bold red]Erreur : --ledger est requis en mode calibrate[/bold red]")
+        return 1
+    tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+    output_dir = Path(args.output)
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    console.print(f"[cyan]Lecture du registre {args.ledger}...[/cyan]")
+    ledger = load_ledger(args.ledger)
+    calibrator = LedgerCalibrator(tontine_config, level=args.level, method=args.method)
+    estimates = calibrator.fit(ledger)
+    if "loan_prob" not in estimates:
+        console.print("[yellow]loan_prob non estimée : le registre n'a ni loan_amount/repaid_amount ni loan_eligible, "
+                      "la valeur de la configuration est conservée[/yellow]")
+    calibrated_config, calibrated_participants = calibrator.calibrated_config(
+        ledger, estimates, participant_configs[0] if participant_configs else None
+    )
+
+    table = Table(title=f"Calibration ({args.level}, {args.method}) - {ledger['member_id'].nunique()} membres")
+    table.add_column("Probabilité", style="cyan")
+    table.add_column("Moyenne", style="green")
+    table.add_column("Min", style="green")
+    table.add_column("Max", style="green")
+    table.add_column("Essais", style="yellow")
+    table.add_column("Log-vraisemblance", style="yellow")
+    for probability, estimate in estimates.items():
+        table.add_row(
+            probability,
+            f"{estimate.probability.mean():.4f}",
+            f"{estimate.probability.min():.4f}",
+            f"{estimate.probability.max():.4f}",
+            str(int(estimate.trials.sum())),
+            f"{estimate.log_likelihood:.1f}"
+        )
+    console.print(table)
+
+    LedgerCalibrator.estimates_table(estimates).to_csv(output_dir / "calibration_estimates.csv", index=False)
+    with open(output_dir / "calibrated_config.json", "w") as f:
+        json.dump(TontineInitializer.dump_config(calibrated_config, calibrated_participants), f, indent=2)
+    console.print(f"[green]Configuration calibrée enregistrée dans {output_dir / 'calibrated_config.json'}")
+    return 0
+
+def nowcast(args) -> int:
+    """Intégrer un mois réel dans l'état persistant puis prévoir les mois suivants"""
+    from tontine_batch import ResultStore
+    from tontine_nowcast import Nowcaster, load_observed_month
+
+    console = Console()
+    output_dir = Path(args.output)
+    output_dir.mkdir(exist_ok=True, parents=True)
+    state_path = Path(args.state or output_dir / "nowcast_state")
+
+    if state_path.exists():
+        nowcaster = Nowcaster.load(state_path)
+    else:
+        console.print(f"[cyan]Création de l'état persistant {state_path} depuis {args.config}...[/cyan]")
+        tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+        nowcaster = Nowcaster.create(state_path, tontine_config, participant_configs)
+
+    if args.observed is not None:
+        console.print(f"[cyan]Intégration du mois réel {nowcaster.month + 1} ({args.observed})...[/cyan]")
+        overpayments = nowcaster.ingest(load_observed_month(args.observed))
+        if overpayments:
+            console.print(f"[yellow]{len(overpayments)} remboursement(s) au-delà de la dette et des intérêts dus, "
+                          f"surplus non comptabilisé : ${sum(overpayments.values()):.2f}[/yellow]")
+
+    store = ResultStore(args.cache or output_dir / "cache.jsonl")
+    with console.status("[cyan]Projection Monte Carlo...") as status:
+        forecast = nowcaster.forecast(
+            horizon=args.months,
+            replicas=args.replicas,
+            seed=args.seed or 0,
+            store=store,
+            workers=args.workers,
+            on_progress=lambda done, total: status.update(f"[cyan]Projection Monte Carlo {done}/{total}"),
+            engine=args.engine
+        )
+
+    summary = forecast["summary"]
+    table = Table(title=f"Prévision à {args.months} mois après le mois réel {nowcaster.month}")
+    table.add_column("Indicateur", style="cyan")
+    table.add_column("Valeur", style="green")
+    table.add_row("Probabilité de faillite", f"{summary['failure_probability']:.2%}")
+    table.add_row("Trésor final médian", f"${summary['final_treasury']['p50']:.2f}")
+    table.add_row("Trésor final (5% - 95%)", f"${summary['final_treasury']['p05']:.2f} - ${summary['final_treasury']['p95']:.2f}")
+    table.add_row("Réplications calculées", f"{forecast['computed_replicas']} / {summary['replicas']}")
+    console.print(table)
+
+    with open(output_dir / f"nowcast_month_{nowcaster.month}.json", "w") as f:
+        json.dump(forecast, f, indent=2)
+    return 0
+
+def compare(args) -> int:
+    """Comparaison appariée de deux configurations avec réduction de variance"""
+    from tontine_batch import ResultStore
+    from tontine_compare import PairedComparison, apply_changes, parse_change
+
+    console = Console()
+    config_a = TontineInitializer.load_config(args.config)
+    if args.variant is not None:
+        config_b = TontineInitializer.load_config(args.variant)
+    elif args.change:
+        config_b = apply_changes(*config_a, [parse_change(spec) for spec in args.change])
+    else:
+        raise Exception("The compare mode needs --variant or --change")
+    output_dir = Path(args.output)
+    output_dir.mkdir(exist_ok=True, parents=True)
+    store = ResultStore(args.cache or output_dir / "cache.jsonl")
+
+    comparison = PairedComparison(
+        config_a,
+        config_b,
+        num_months=args.months,
+        seed=args.seed or 0,
+        antithetic=args.antithetic,
+        control_variate=args.control_variate,
+        store=store,
+        workers=args.workers,
+        engine=args.engine,
+        scenario=load_scenario_arg(args)
+    )
+    with console.status("[cyan]Réplications appariées...") as status:
+        report = comparison.run(
+            args.replicas,
+            on_progress=lambda done, total: status.update(f"[cyan]Réplications appariées {done}/{total}")
+        )
+
+    for output, result in report["outputs"].items():
+        table = Table(title=f"{output} : A = {result['mean_a']:.4g}, B = {result['mean_b']:.4g}")
+        table.add_column("Méthode", style="cyan")
+        table.add_column("Différence B - A", style="green")
+        table.add_column("IC 95%", style="green")
+        table.add_column("Réduction de variance", style="yellow")
+        for method, estimate in result["estimates"].items():
+            reduction = estimate["variance_reduction"]
+            table.add_row(
+                method,
+                f"{estimate['difference']:.4g}",
+                f"[{estimate['ci95'][0]:.4g}, {estimate['ci95'][1]:.4g}]",
+                f"x{reduction:.1f}" if reduction is not None else "-"
+            )
+        console.print(table)
+
+    with open(output_dir / "comparison.json", "w") as f:
+        json.dump(report, f, indent=2)
+    console.print(f"[green]Résultats enregistrés dans {output_dir / 'comparison.json'}")
+    return 0
+
+def print_sketch_summary(console: Console, summary: dict, title: str):
+    table = Table(title=title)
+    table.add_column("Indicateur", style="cyan")
+    table.add_column("Moyenne", style="green")
+    table.add_column("5% - 50% - 95%", style="green")
+    table.add_row("Probabilité de faillite", f"{summary['failure_probability']:.2%}", "-")
+    for output in ("final_treasury", "emergency_fund", "total_interest", "default_rate", "active_members"):
+        values = summary[output]
+        table.add_row(output, f"{values['mean']:.4g}", f"{values['p05']:.4g} - {values['p50']:.4g} - {values['p95']:.4g}")
+    console.print(table)
+
+def batch(args) -> int:
+    """Réplications d'un fragment d'étude, résumées dans un fichier de sketch fusionnable"""
+    from tontine_sketch import run_shard
+
+    console = Console()
+    tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+    output_dir = Path(args.output)
+    with console.status("[cyan]Réplications du fragment...") as status:
+        sketch = run_shard(
+            tontine_config,
+            participant_configs,
+            num_months=args.months,
+            replicas=args.replicas,
+            seed=args.seed or 0,
+            shard=args.shard,
+            engine=args.engine,
+            workers=args.workers,
+            on_progress=lambda done, total: status.update(f"[cyan]Réplications du fragment {done}/{total}"),
+            scenario=load_scenario_arg(args)
+        )
+    path = output_dir / f"sketch_{args.shard}.json.gz"
+    sketch.save(path)
+    print_sketch_summary(console, sketch.summary(), f"Fragment {args.shard} : {sketch.replicas} réplications")
+    console.print(f"[green]Sketch enregistré dans {path}")
+    return 0
+
+def merge(args) -> int:
+    """Fusionner des fichiers de sketch produits par le mode batch"""
+    from tontine_sketch import merge_sketches
+
+    console = Console()
+    output_dir = Path(args.output)
+    merged = merge_sketches(args.sketch or [])
+    merged.save(output_dir / "sketch_merged.json.gz")
+    summary = merged.summary()
+    with open(output_dir / "sketch_summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    print_sketch_summary(console, summary, f"{len(args.sketch)} fragments : {merged.replicas} réplications")
+    console.print(f"[green]Résumé enregistré dans {output_dir / 'sketch_summary.json'}")
+    return 0
+
+def worker(args) -> int:
+    """Exécuter les unités d'une file de travail partagée jusqu'à la fin de l'étude"""
+    from tontine_workqueue import run_worker
+
+    if args.queue is None:
+        raise Exception("The worker mode needs --queue")
+    console = Console()
+    console.print(f"[cyan]Worker de la file {args.queue}...[/cyan]")
+    completed = run_worker(
+        args.queue,
+        on_unit=lambda unit: console.print(f"Unité {unit['id']} terminée ({unit['count']} réplications)")
+    )
+    console.print(f"[green]Étude terminée, {completed} unités exécutées par ce worker")
+    return 0
+
+def coordinator(args) -> int:
+    """Créer la file de travail d'une étude, attendre les workers puis fusionner les résultats"""
+    import multiprocessing
+    from tontine_workqueue import collect_study, create_study, run_worker
+
+    if args.queue is None:
+        raise Exception("The coordinator mode needs --queue")
+    console = Console()
+    tontine_config, participant_configs = TontineInitializer.load_config(args.config)
+    queue = create_study(
+        args.queue,
+        tontine_config,
+        participant_configs,
+        num_months=args.months,
+        replicas=args.replicas,
+        unit_size=args.unit_size,
+        seed=args.seed or 0,
+        engine=args.engine,
+        sweeps=args.sweep,
+        lease=args.lease
+    )
+    console.print(f"[cyan]File {args.queue} : {queue.study['units']} unités, {len(queue.study['points'])} points[/cyan]")
+
+    # --workers lance des workers locaux ; d'autres machines peuvent rejoindre la file avec --mode worker
+    local_workers = [multiprocessing.Process(target=run_worker, args=(args.queue,)) for _ in range(args.workers or 0)]
+    for process in local_workers:
+        process.start()
+    with console.status("[cyan]Attente des workers...") as status:
+        report = collect_study(
+            args.queue,
+            on_progress=lambda counts: status.update(
+                f"[cyan]Unités : {counts['done']} terminées, {counts['claimed']} en cours, {counts['pending']} en attente"
+            )
+        )
+    for process in local_workers:
+        process.join()
+
+    table = Table(title=f"Étude : {report['replicas']} réplications par point sur {report['months']} mois")
+    table.add_column("Point", style="cyan")
+    table.add_column("Probabilité de faillite", style="green")
+    table.add_column("Trésor final médian", style="green")
+    table.add_column("Trésor final (5% - 95%)", style="green")
+    for point in report["points"]:
+        summary = point["summary"]
+        table.add_row(
+            ", ".join(f"{name}={value:g}" for name, value in point["changes"].items()) or "référence",
+            f"{summary['failure_probability']:.2%}",
+            f"${summary['final_treasury']['p50']:.2f}",
+            f"${summary['final_treasury']['p05']:.2f} - ${summary['final_treasury']['p95']:.2f}"
+        )
+    console.print(table)
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(exist_ok=True, parents=True)
+    with open(output_dir / "study_summary.json", "w") as f:
+        json.dump(report, f, indent=2)
+    console.print(f"[green]Résultats enregistrés dans {output_dir / 'study_summary.json'}")
+    return 0
+
 if __name__ == "__main__":
     exit(main())
\ No newline at end of file
@@ -0,0 +1,368 @@
+import copy
+import hashlib
+import json
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_initializer import TontineInitializer
+from tontine_state import TontineState
+from tontine_executor import TontineExecutor, NullTontineLogger
+from tontine_scenarios import Scenario
+
+
+@dataclass
+class ReplicaResult:
+    """Summary of one headless simulation run (one Monte Carlo replica)"""
+    seed: int
+    months: int                      # Nombre de mois demandés
+    failure_month: Optional[int]     # Mois (0-indexé) où la faillite est constatée, None si aucune faillite
+    final_treasury: float
+    emergency_fund: float
+    total_contributions: float
+    total_interest: float
+    loans_outstanding: float
+    total_distributed: float         # Total des distributions mensuelles versées aux membres
+    total_defaults: int              # Nombre total de cotisations manquées
+    default_rate: float
+    loan_recovery_rate: float
+    active_members: int
+    total_members: int
+    expected_contributions: float = 0.0  # Cotisations attendues compte tenu des membres présents chaque mois
+    treasury_path: List[float] = field(default_factory=list)  # Trésor au début de chaque mois simulé
+
+    @property
+    def failed(self) -> bool:
+        return self.failure_month is not None
+
+
+def canonical_config(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig]
+) -> Dict[str, Any]:
+    """Configuration dictionary with numbers normalised, so that equivalent configs compare equal"""
+    def normalise(value):
+        if isinstance(value, dict):
+            return {key: normalise(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [normalise(item) for item in value]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return value
+
+    return normalise(TontineInitializer.dump_config(tontine_config, participant_configs))
+
+
+# Version du modèle de simulation, incluse dans toutes les clés de cache : à incrémenter dès qu'un
+# changement du simulateur ou du noyau modifie les résultats, pour ne plus servir les anciens
+MODEL_VERSION = 2
+
+
+def config_hash(*parts: Any) -> str:
+    """Stable hash of JSON-serialisable parts (configs, horizons, seeds...) and of the model version"""
+    payload = json.dumps([MODEL_VERSION, *parts], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def replica_seed(base_seed: int, index: int) -> int:
+    """Seed of the index-th replica of a batch, independent of the batch size"""
+    return int(np.random.SeedSequence([base_seed, index]).generate_state(1)[0])
+
+
+ENGINES = ("auto", "reference", "kernel")
+
+
+def resolve_engine(engine: str) -> str:
+    """
+    Simulation engine actually used for `engine`: "reference" is TontineExecutor, "kernel" the
+    flat-array engine of tontine_kernel, and "auto" the kernel when numba is installed
+    """
+    if engine not in ENGINES:
+        raise Exception(f"Unknown engine: {engine}")
+    if engine == "auto":
+        from tontine_kernel import NUMBA_AVAILABLE
+        return "kernel" if NUMBA_AVAILABLE else "reference"
+    return engine
+
+
+def run_replica(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    num_months: int,
+    seed: int,
+    initial_state: Optional[TontineState] = None,
+    start_month: int = 0,
+    engine: str = "reference",
+    antithetic: bool = False,
+    scenario: Optional[Scenario] = None
+) -> ReplicaResult:
+    """
+    Run one headless simulation (no console, no plots, no files) and summarise it.
+    With an initial_state, the simulation resumes from a copy of it at start_month.
+    antithetic (kernel engine only) runs on the antithetic draws 1 - u of the seed's stream.
+    A scenario scales the default and exit probabilities along paths drawn from the seed
+    """
+    if resolve_engine(engine) == "kernel":
+        from tontine_kernel import run_kernel_replica
+        return run_kernel_replica(
+            tontine_config, participant_configs, num_months, seed, initial_state, start_month, antithetic, scenario
+        )
+    if antithetic:
+        raise Exception("Antithetic replicas need the kernel engine")
+
+    if initial_state is None:
+        initial_state = TontineInitializer.create_initial_state(tontine_config, participant_configs)
+    else:
+        initial_state = copy.deepcopy(initial_state)
+    executor = TontineExecutor(
+        tontine_config=tontine_config,
+        participant_configs=participant_configs,
+        console=None,
+        initial_state=initial_state,
+        seed=seed,
+        logger=NullTontineLogger(),
+        interactive=False,
+        scenario=scenario
+    )
+    state = executor.run_simulation(num_months=num_months, start_month=start_month)
+    members = state.historical_participant.values()
+
+    return ReplicaResult(
+        seed=seed,
+        months=num_months,
+        failure_month=executor.failure_month,
+        final_treasury=state.treasury_balance,
+        emergency_fund=state.emergency_fund,
+        total_contributions=state.total_contributions_received,
+        total_interest=state.total_interest_earned,
+        loans_outstanding=state.total_loans_outstanding,
+        total_distributed=sum(p.monthly_distributions_received for p in members),
+        total_defaults=sum(p.missed_payments for p in members),
+        default_rate=state.default_rate,
+        loan_recovery_rate=state.loan_recovery_rate,
+        active_members=len(state.active_participants),
+        total_members=state.total_participants_history,
+        expected_contributions=executor.expected_contributions,
+        treasury_path=[executor.recap[month][1] for month in sorted(executor.recap)]
+    )
+
+
+def run_replica_group(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    num_months: int,
+    seeds: List[int],
+    initial_state: Optional[TontineState] = None,
+    start_month: int = 0,
+    engine: str = "reference",
+    antithetic: bool = False,
+    scenario: Optional[Scenario] = None
+) -> List[ReplicaResult]:
+    """Run several replicas of the same configuration (and starting state) in one worker task"""
+    return [
+        run_replica(tontine_config, participant_configs, num_months, seed, initial_state, start_month, engine, antithetic, scenario)
+        for seed in seeds
+    ]
+
+
+def run_groups(
+    groups: List[tuple],
+    workers: Optional[int] = None,
+    pool: Optional[Executor] = None,
+    on_group: Optional[Callable[[int, List[ReplicaResult]], None]] = None,
+    task: Callable[..., Any] = None
+) -> List[List[ReplicaResult]]:
+    """
+    Run groups of replicas, each group being the arguments of run_replica_group
+    (tontine_config, participant_configs, num_months, seeds[, initial_state, start_month, engine, antithetic, scenario]),
+    and return the results group by group. Another module-level `task` may run the groups
+    instead, e.g. to reduce each group in the worker before it is sent back.
+
+    Groups are spread over `pool` when given, otherwise over a temporary process pool of
+    `workers` processes (workers=1 runs everything in the current process). `on_group`
+    is called with the group index as soon as each group completes.
+    """
+    task = task or run_replica_group
+    results: List[Optional[List[ReplicaResult]]] = [None] * len(groups)
+    if pool is None and workers == 1:
+        for index, group in enumerate(groups):
+            results[index] = task(*group)
+            if on_group is not None:
+                on_group(index, results[index])
+        return results
+
+    owned_pool = pool is None
+    pool = pool or ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(task, *group): index for index, group in enumerate(groups)}
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            if on_group is not None:
+                on_group(index, results[index])
+        return results
+    finally:
+        if owned_pool:
+            pool.shutdown()
+
+
+def run_batch(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    num_months: int,
+    seeds: List[int],
+    workers: Optional[int] = None,
+    pool: Optional[Executor] = None,
+    on_result: Optional[Callable[[ReplicaResult], None]] = None,
+    engine: str = "auto"
+) -> List[ReplicaResult]:
+    """
+    Run one replica per seed and return the results in seed order.
+
+    Replicas are spread over `pool` when given, otherwise over a temporary process
+    pool of `workers` processes (workers=1 runs everything in the current process).
+    `on_result` is called as soon as each replica completes, e.g. to report progress.
+    """
+    def on_group(index: int, group_results: List[ReplicaResult]):
+        if on_result is not None:
+            on_result(group_results[0])
+
+    engine = resolve_engine(engine)
+    groups = [(tontine_config, participant_configs, num_months, [seed], None, 0, engine) for seed in seeds]
+    return [group[0] for group in run_groups(groups, workers=workers, pool=pool, on_group=on_group)]
+
+
+class ResultStore:
+    """
+    Append-only on-disk cache of JSON-serialisable results, keyed by hash.
+    Survives restarts, so extended studies only compute what is new.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.entries: Dict[str, Any] = {}
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Truncated last line of an interrupted run
+                        continue
+                    self.entries[entry["key"]] = entry["value"]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.entries.get(key)
+
+    def put(self, key: str, value: Any):
+        self.entries[key] = value
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "value": value}) + "\n")
+
+
+def summarize_results(results: List[ReplicaResult]) -> Dict[str, Any]:
+    """Aggregate statistics over a list of replicas"""
+    if not results:
+        return {"replicas": 0}
+
+    failures = np.array([r.failed for r in results], dtype=bool)
+    treasury = np.array([r.final_treasury for r in results])
+    failure_months = np.array([r.failure_month for r in results if r.failed], dtype=float)
+
+    def describe(values: np.ndarray) -> Dict[str, float]:
+        return {
+            "mean": float(values.mean()),
+            "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+            "p05": float(np.quantile(values, 0.05)),
+            "p50": float(np.quantile(values, 0.50)),
+            "p95": float(np.quantile(values, 0.95)),
+        }
+
+    return {
+        "replicas": len(results),
+        "failure_probability": float(failures.mean()),
+        "mean_failure_month": float(failure_months.mean()) if len(failure_months) else None,
+        "final_treasury": describe(treasury),
+        "emergency_fund": describe(np.array([r.emergency_fund for r in results])),
+        "total_interest": describe(np.array([r.total_interest for r in results])),
+        "default_rate": describe(np.array([r.default_rate for r in results])),
+        "active_members": describe(np.array([r.active_members for r in results], dtype=float)),
+    }
+
+
+def evaluate_configs(
+    configs: List[Tuple[TontineConfig, List[IndividualParticipantConfig]]],
+    num_months: int,
+    seeds: List[int],
+    store: Optional[ResultStore] = None,
+    workers: Optional[int] = None,
+    pool: Optional[Executor] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    engine: str = "auto",
+    antithetic: bool = False,
+    scenario: Optional[Scenario] = None
+) -> List[List[ReplicaResult]]:
+    """
+    Run the replicas `seeds` of every configuration in one batch and return them config by config.
+
+    Replicas already present in `store` are not recomputed, and new ones are added to it
+    (without their treasury path), so a study can be extended with more points or more
+    replicas and resumed after an interruption. The engine is part of the cache key, since
+    the kernel and the reference executor draw different random streams for the same seed,
+    and so is the scenario, if any.
+    Replicas of a configuration are split into several worker tasks when there are few
+    configurations, so that a study of two configurations still uses every worker.
+    """
+    engine = resolve_engine(engine)
+    variant = (engine, "antithetic") if antithetic else (engine,)
+    if scenario is not None:
+        variant += (scenario.to_dict(),)
+    keys = [config_hash(canonical_config(*config), num_months, *variant) for config in configs]
+    results: List[Dict[int, ReplicaResult]] = [{} for _ in configs]
+    groups = []
+    owners = []
+    completed = 0
+    chunk = max(1, -(-len(configs) * len(seeds) // (4 * (workers or os.cpu_count() or 1))))
+    for index, (tontine_config, participant_configs) in enumerate(configs):
+        missing = []
+        for seed in seeds:
+            cached = store.get(config_hash(keys[index], seed)) if store is not None else None
+            if cached is not None:
+                results[index][seed] = ReplicaResult(**cached)
+            else:
+                missing.append(seed)
+        for start in range(0, len(missing), chunk):
+            groups.append((tontine_config, participant_configs, num_months, missing[start:start + chunk],
+                           None, 0, engine, antithetic, scenario))
+            owners.append(index)
+
+    def on_group(group_index: int, group_results: List[ReplicaResult]):
+        nonlocal completed
+        index = owners[group_index]
+        for result in group_results:
+            results[index][result.seed] = result
+            if store is not None:
+                cached = asdict(result)
+                cached["treasury_path"] = []
+                store.put(config_hash(keys[index], result.seed), cached)
+        completed += 1
+        if on_progress is not None:
+            on_progress(completed, len(groups))
+
+    run_groups(groups, workers=workers, pool=pool, on_group=on_group)
+    return [[results[index][seed] for seed in seeds] for index in range(len(configs))]
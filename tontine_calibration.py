@@ -0,0 +1,319 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_initializer import TontineInitializer
+
+
+REQUIRED_COLUMNS = ["member_id", "month", "paid", "borrowed", "repaid", "exited"]
+
+# Groupe des lignes sans archétype (ou sans membre) : calibré comme les autres plutôt qu'ignoré
+MISSING_GROUP = "(none)"
+
+# Probabilité du simulateur -> colonne de succès du processus de Bernoulli correspondant
+PROCESSES = {
+    "default_probability": "defaulted",
+    "loan_prob": "borrowed",
+    "loan_reemboursement_prob": "repaid",
+    "exit_probability": "exited",
+}
+
+
+@dataclass
+class ProcessEstimate:
+    """Fitted probability of one Bernoulli process, for every member or archetype"""
+    groups: np.ndarray        # Identifiants des membres ou des archétypes
+    trials: np.ndarray        # Nombre d'essais observés par groupe
+    successes: np.ndarray     # Nombre de succès observés par groupe
+    probability: np.ndarray   # Probabilité estimée par groupe
+    std_error: np.ndarray     # Écart-type (asymptotique ou a posteriori) de l'estimation
+    log_likelihood: float     # Log-vraisemblance des observations aux probabilités estimées
+
+
+def load_ledger(path: str) -> pd.DataFrame:
+    """
+    Read an observed monthly ledger (CSV or Parquet), one row per member and month of membership.
+
+    Required columns: member_id, month, paid, borrowed, repaid, exited (flags are 0/1).
+    Optional columns: archetype, in_debt (member owed money at the start of the month),
+    loan_eligible (member could borrow that month), loan_amount and repaid_amount (amounts
+    lent and repaid that month, used to track each member's debt and open loans; without them
+    or loan_eligible, loan_prob cannot be estimated).
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        ledger = pd.read_parquet(path)
+    else:
+        ledger = pd.read_csv(path, dtype={"member_id": str, "archetype": str})
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in ledger.columns]
+    if missing:
+        raise Exception(f"Ledger is missing columns: {', '.join(missing)}")
+    return ledger
+
+
+class LedgerCalibrator:
+    """
+    Fit the participant probabilities of the simulator to observed ledgers.
+
+    Every probability drives an independent Bernoulli process of the simulator, so the
+    likelihood factorises per process and per member: each process reduces to counting
+    trials and successes, done with vectorised group sums over all members and months.
+
+    - default_probability: every month of membership is a trial, success = contribution missed
+    - loan_prob: months where the member is eligible for a loan, success = loan taken
+    - loan_reemboursement_prob: months where the member is in debt, success = repayment made
+    - exit_probability: months at a cycle end (and months with an exit), success = exit
+
+    When in_debt / loan_eligible are not in the ledger they are derived like the simulator does,
+    from a debt balance replayed month by month: a missed contribution adds the contribution
+    plus interest, a loan adds its amount, a repayment pays the interest due then principal,
+    and the balance and the member's open loans return to zero only once the debt is repaid.
+    A member is in debt when the balance is positive at the start of the month. Eligibility is
+    only re-evaluated by the simulator at paid months, so a member is eligible when, at its last
+    paid month, it had been a member for at least min_membership_months and had fewer open
+    loans than max_simultaneous_loans.
+
+    The balance needs loan_amount and repaid_amount. Without them in_debt is replayed with the
+    simulator's mean amounts, but the month a loan is closed is unknown, so loan_prob is not
+    estimated (calibrated_config then keeps the participant template's value) unless the
+    ledger gives loan_eligible.
+
+    method="mle" gives the maximum likelihood estimates k / n. method="bayes" uses a Beta
+    prior fitted on all groups (empirical Bayes), which shrinks groups with few trials towards
+    the population instead of giving them 0 or 1.
+    """
+
+    def __init__(
+        self,
+        tontine_config: TontineConfig,
+        level: str = "member",
+        method: str = "bayes"
+    ):
+        if level not in ("member", "archetype"):
+            raise Exception(f"Unknown calibration level: {level}")
+        if method not in ("mle", "bayes"):
+            raise Exception(f"Unknown calibration method: {method}")
+        self.tontine_config = tontine_config
+        self.level = level
+        self.method = method
+
+    def prepare(self, ledger: pd.DataFrame) -> pd.DataFrame:
+        """Sort the ledger and add the trial/success columns of every process"""
+        ledger = ledger.sort_values(["member_id", "month"], kind="stable").reset_index(drop=True)
+        member_codes, _ = pd.factorize(ledger["member_id"])
+        month = ledger["month"].to_numpy()
+        paid = ledger["paid"].to_numpy().astype(bool)
+        defaulted = ~paid
+        borrowed = ledger["borrowed"].to_numpy().astype(bool)
+
+        # Position of the first row of each member, to compute per-member running values
+        first_row = np.r_[True, member_codes[1:] != member_codes[:-1]]
+        group_start = np.maximum.accumulate(np.where(first_row, np.arange(len(ledger)), 0))
+
+        if "in_debt" not in ledger.columns or "loan_eligible" not in ledger.columns:
+            debt, open_loans = self._replay_debt(ledger, first_row, defaulted, borrowed)
+
+        if "in_debt" in ledger.columns:
+            in_debt = ledger["in_debt"].to_numpy().astype(bool)
+        else:
+            in_debt = debt > 0
+
+        if "loan_eligible" in ledger.columns:
+            loan_eligible = ledger["loan_eligible"].to_numpy().astype(bool)
+        elif self.has_amounts(ledger):
+            # Le simulateur ne réévalue l'éligibilité qu'aux mois payés : elle reste celle du dernier paiement
+            tenure = month - month[group_start]
+            condition = (
+                (tenure >= self.tontine_config.min_membership_months)
+                & (open_loans < self.tontine_config.max_simultaneous_loans)
+            )
+            last_paid = np.maximum.accumulate(np.where(paid, np.arange(len(ledger)), -1))
+            loan_eligible = (last_paid >= group_start) & condition[np.maximum(last_paid, 0)]
+        else:
+            # Sans montants, on ne sait pas quand un prêt est soldé : loan_prob n'est pas estimée
+            loan_eligible = None
+
+        cycle = self.tontine_config.cycle_duration_months
+        exited = ledger["exited"].to_numpy().astype(bool)
+        cycle_end = ((month - month.min() + 1) % cycle) == 0
+
+        ledger["defaulted"] = defaulted
+        ledger["default_probability_trial"] = True
+        if loan_eligible is not None:
+            ledger["loan_prob_trial"] = loan_eligible
+        ledger["loan_reemboursement_prob_trial"] = in_debt
+        ledger["exit_probability_trial"] = cycle_end | exited
+        return ledger
+
+    def _replay_debt(
+        self,
+        ledger: pd.DataFrame,
+        first_row: np.ndarray,
+        defaulted: np.ndarray,
+        borrowed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Debt balance and number of open loans of every row at the start of its month"""
+        repaid = ledger["repaid"].to_numpy().astype(bool)
+        contribution = self.tontine_config.monthly_contrib
+        rate = self.tontine_config.monthly_interest_rate
+        if self.has_amounts(ledger):
+            lent = ledger["loan_amount"].fillna(0.0).to_numpy(dtype=np.float64).tolist()
+            repayments = ledger["repaid_amount"].fillna(0.0).to_numpy(dtype=np.float64).tolist()
+        else:
+            # Sans montants : montants moyens du simulateur (prêt de 0,75 x max_loan_amount au plus,
+            # remboursement des intérêts plus, une fois sur deux, entre une cotisation et 20 % de la dette)
+            lent = [0.75 * self.tontine_config.max_loan_amount] * len(ledger)
+            repayments = None
+
+        debt = np.zeros(len(ledger))
+        open_loans = np.zeros(len(ledger), dtype=np.int64)
+        balance, loans = 0.0, 0
+        # Même ordre que le simulateur dans le mois : cotisations, prêts, puis remboursements
+        for row, (first, default, loan, repayment) in enumerate(zip(
+            first_row.tolist(), defaulted.tolist(), borrowed.tolist(), repaid.tolist()
+        )):
+            if first:
+                balance, loans = 0.0, 0
+            debt[row], open_loans[row] = balance, loans
+            if default:
+                balance += contribution + balance * rate
+            if loan:
+                balance += lent[row]
+                loans += 1
+            if repayment and balance > 0:
+                if repayments is None:
+                    amount = balance * rate + 0.25 * (contribution + 0.2 * balance)
+                else:
+                    amount = repayments[row]
+                interest = min(amount, balance * rate)
+                principal = amount - interest
+                # Un remboursement des seuls intérêts ne solde jamais la dette, même infime
+                if principal > 1e-9 * amount:
+                    balance -= min(principal, balance)
+                    if balance <= 1e-9:
+                        balance, loans = 0.0, 0
+        return debt, open_loans
+
+    @staticmethod
+    def has_amounts(ledger: pd.DataFrame) -> bool:
+        """Whether the ledger gives the amounts lent and repaid, needed to know when loans are closed"""
+        return "loan_amount" in ledger.columns and "repaid_amount" in ledger.columns
+
+    def _group_keys(self, ledger: pd.DataFrame) -> pd.Series:
+        """Member or archetype of every row, rows without one being grouped under MISSING_GROUP"""
+        key = "archetype" if self.level == "archetype" else "member_id"
+        if key not in ledger.columns:
+            raise Exception(f"Ledger has no '{key}' column for {self.level} calibration")
+        return ledger[key].astype(object).where(ledger[key].notna(), MISSING_GROUP)
+
+    def fit(self, ledger: pd.DataFrame) -> Dict[str, ProcessEstimate]:
+        """Estimate the probabilities for every member or archetype (loan_prob needs amounts or loan_eligible)"""
+        ledger = self.prepare(ledger)
+        codes, groups = pd.factorize(self._group_keys(ledger))
+
+        estimates = {}
+        for probability, success_column in PROCESSES.items():
+            if f"{probability}_trial" not in ledger.columns:
+                continue
+            trial = ledger[f"{probability}_trial"].to_numpy().astype(bool)
+            success = ledger[success_column].to_numpy().astype(bool) & trial
+            trials = np.bincount(codes, weights=trial, minlength=len(groups))
+            successes = np.bincount(codes, weights=success, minlength=len(groups))
+            estimates[probability] = self._estimate(np.asarray(groups), trials, successes)
+        return estimates
+
+    def _estimate(self, groups: np.ndarray, trials: np.ndarray, successes: np.ndarray) -> ProcessEstimate:
+        pooled = successes.sum() / trials.sum() if trials.sum() > 0 else 0.0
+        observed = trials > 0
+
+        if self.method == "mle":
+            probability = np.where(observed, successes / np.maximum(trials, 1), pooled)
+            std_error = np.sqrt(probability * (1 - probability) / np.maximum(trials, 1))
+        else:
+            alpha, beta = self._fit_beta_prior(trials, successes, pooled)
+            probability = (successes + alpha) / (trials + alpha + beta)
+            std_error = np.sqrt(probability * (1 - probability) / (trials + alpha + beta + 1))
+
+        clipped = np.clip(probability, 1e-12, 1 - 1e-12)
+        log_likelihood = float(np.sum(successes * np.log(clipped) + (trials - successes) * np.log1p(-clipped)))
+        return ProcessEstimate(groups, trials, successes, probability, std_error, log_likelihood)
+
+    @staticmethod
+    def _fit_beta_prior(trials: np.ndarray, successes: np.ndarray, pooled: float) -> Tuple[float, float]:
+        """Method of moments Beta(alpha, beta) prior over the group rates"""
+        observed = trials > 0
+        if observed.sum() < 2 or pooled <= 0 or pooled >= 1:
+            # Not enough information on the spread: weak prior centred on the pooled rate
+            strength = 2.0
+        else:
+            rates = successes[observed] / trials[observed]
+            weights = trials[observed] / trials[observed].sum()
+            mean = np.sum(weights * rates)
+            variance = np.sum(weights * (rates - mean) ** 2)
+            # Part of the observed variance is binomial sampling noise
+            sampling = np.mean(mean * (1 - mean) / trials[observed])
+            between = max(variance - sampling, 1e-9)
+            strength = float(np.clip(mean * (1 - mean) / between - 1, 0.5, 1e6))
+        return pooled * strength, (1 - pooled) * strength
+
+    def calibrated_config(
+        self,
+        ledger: pd.DataFrame,
+        estimates: Dict[str, ProcessEstimate],
+        participant_template: Optional[IndividualParticipantConfig] = None
+    ) -> Tuple[TontineConfig, List[IndividualParticipantConfig]]:
+        """
+        Ready-to-run configuration: one participant per member still active at the last
+        month of the ledger, with its own (member level) or its archetype's probabilities
+        """
+        last_month = ledger["month"].max()
+        last_rows = ledger[(ledger["month"] == last_month) & (ledger["exited"] == 0)]
+        keys = self._group_keys(last_rows)
+        max_consecutive_defaults = participant_template.max_consecutive_defaults if participant_template else 3
+
+        lookup = {
+            probability: dict(zip(estimate.groups, estimate.probability))
+            for probability, estimate in estimates.items()
+        }
+        # Probabilités non estimées (loan_prob sans montants) : valeur du participant modèle
+        for probability in PROCESSES:
+            if probability not in lookup:
+                if participant_template is None:
+                    raise Exception(f"{probability} was not estimated and no participant template gives it")
+                lookup[probability] = defaultdict(lambda value=getattr(participant_template, probability): value)
+
+        participant_configs = []
+        for member_id, group in zip(last_rows["member_id"], keys):
+            participant_configs.append(IndividualParticipantConfig(
+                id=str(member_id),
+                name=str(member_id) if self.level == "member" else f"{member_id} ({group})",
+                default_probability=float(lookup["default_probability"][group]),
+                loan_prob=float(lookup["loan_prob"][group]),
+                loan_reemboursement_prob=float(lookup["loan_reemboursement_prob"][group]),
+                exit_probability=float(lookup["exit_probability"][group]),
+                max_consecutive_defaults=max_consecutive_defaults
+            ))
+
+        tontine_config = TontineConfig(**{
+            **TontineInitializer.dump_config(self.tontine_config, [])["tontine"],
+            "num_participants_start": len(participant_configs),
+        })
+        return tontine_config, participant_configs
+
+    @staticmethod
+    def estimates_table(estimates: Dict[str, ProcessEstimate]) -> pd.DataFrame:
+        """One row per member or archetype with estimates, standard errors and counts"""
+        columns: Dict[str, Any] = {}
+        for probability, estimate in estimates.items():
+            columns.setdefault("group", estimate.groups)
+            columns[probability] = estimate.probability
+            columns[f"{probability}_std"] = estimate.std_error
+            columns[f"{probability}_trials"] = estimate.trials.astype(int)
+            columns[f"{probability}_successes"] = estimate.successes.astype(int)
+        return pd.DataFrame(columns)
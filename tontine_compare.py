@@ -0,0 +1,173 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_batch import ReplicaResult, ResultStore, evaluate_configs, replica_seed, resolve_engine
+from tontine_scenarios import Scenario
+from tontine_sensitivity import SensitivityParameter, apply_parameters
+
+
+OUTPUTS: Dict[str, Callable[[ReplicaResult], float]] = {
+    "final_treasury": lambda r: r.final_treasury,
+    "failure_probability": lambda r: float(r.failed),
+    "total_interest": lambda r: r.total_interest,
+    "total_distributed": lambda r: r.total_distributed,
+    "active_members": lambda r: float(r.active_members),
+}
+
+
+def parse_change(spec: str) -> SensitivityParameter:
+    """Parse a "name=value" change of the variant (same names as the sensitivity parameters)"""
+    try:
+        name, value = spec.split("=")
+        return SensitivityParameter(name, float(value), float(value))
+    except ValueError:
+        raise Exception(f"Invalid change specification '{spec}', expected name=value")
+
+
+def apply_changes(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    changes: List[SensitivityParameter]
+) -> Tuple[TontineConfig, List[IndividualParticipantConfig]]:
+    return apply_parameters(tontine_config, participant_configs, changes, np.array([c.low for c in changes]))
+
+
+def control_variate_estimate(values: np.ndarray, controls: np.ndarray) -> Tuple[float, float]:
+    """
+    Mean of `values` adjusted with zero-mean `controls` (n, k): the regression coefficients are
+    fitted by least squares and the standard error comes from the regression residuals
+    """
+    n, k = controls.shape
+    design = np.column_stack([np.ones(n), controls])
+    coefficients, *_ = np.linalg.lstsq(design, values, rcond=None)
+    residuals = values - design @ coefficients
+    adjusted = float(values.mean() - controls.mean(axis=0) @ coefficients[1:])
+    variance = residuals @ residuals / max(n - k - 1, 1)
+    return adjusted, float(np.sqrt(variance / n))
+
+
+class PairedComparison:
+    """
+    Difference of outcomes between two configurations (B - A) with variance reduction.
+
+    - Common random numbers: both variants run with the same seeds (and the same scenario
+      paths). On the kernel engine, the default, the counter-based stream gives every member,
+      month and phase the same draw in both runs; the reference engine's sequential stream
+      only keeps the draws aligned until the two runs diverge.
+    - Antithetic variates (kernel engine only): every seed is also run on the antithetic
+      draws 1 - u, and the two runs are averaged.
+    - Control variate: contributions minus their expectation given the members present each
+      month (zero mean by construction), in both variants, regressed out of the difference.
+
+    Each estimate is reported with its 95% confidence interval and the variance reduction
+    factor against independent replicas of the two variants with the same number of runs.
+    """
+
+    def __init__(
+        self,
+        config_a: Tuple[TontineConfig, List[IndividualParticipantConfig]],
+        config_b: Tuple[TontineConfig, List[IndividualParticipantConfig]],
+        num_months: int = 36,
+        seed: int = 0,
+        antithetic: bool = True,
+        control_variate: bool = True,
+        store: Optional[ResultStore] = None,
+        workers: Optional[int] = None,
+        engine: str = "kernel",
+        scenario: Optional[Scenario] = None
+    ):
+        self.config_a = config_a
+        self.config_b = config_b
+        self.num_months = num_months
+        self.seed = seed
+        # "auto" désigne ici le noyau, qui s'exécute aussi sans numba
+        self.engine = "kernel" if engine == "auto" else resolve_engine(engine)
+        if antithetic and self.engine != "kernel":
+            raise Exception("Antithetic replicas need the kernel engine")
+        self.scenario = scenario
+        self.antithetic = antithetic
+        self.control_variate = control_variate
+        self.store = store
+        self.workers = workers
+
+    def run(
+        self,
+        replicas: int,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        seeds = [replica_seed(self.seed, index) for index in range(replicas)]
+        plain_a, plain_b = evaluate_configs(
+            [self.config_a, self.config_b], self.num_months, seeds,
+            store=self.store, workers=self.workers, on_progress=on_progress, engine=self.engine, scenario=self.scenario
+        )
+        runs = {"a": [plain_a], "b": [plain_b]}
+        if self.antithetic:
+            anti_a, anti_b = evaluate_configs(
+                [self.config_a, self.config_b], self.num_months, seeds,
+                store=self.store, workers=self.workers, on_progress=on_progress, engine=self.engine, antithetic=True,
+                scenario=self.scenario
+            )
+            runs["a"].append(anti_a)
+            runs["b"].append(anti_b)
+
+        runs_per_variant = replicas * len(runs["a"])
+        report = {
+            "replicas": replicas,
+            "engine": self.engine,
+            "runs_per_variant": runs_per_variant,
+            "antithetic": self.antithetic,
+            "control_variate": self.control_variate,
+            "outputs": {},
+        }
+        # Écarts de cotisations à leur espérance, moyennés sur les runs d'une même graine
+        control_a = np.mean([[r.total_contributions - r.expected_contributions for r in results] for results in runs["a"]], axis=0)
+        control_b = np.mean([[r.total_contributions - r.expected_contributions for r in results] for results in runs["b"]], axis=0)
+
+        for output, value in OUTPUTS.items():
+            a = np.array([[value(r) for r in results] for results in runs["a"]])
+            b = np.array([[value(r) for r in results] for results in runs["b"]])
+            # Variance of one run of each variant: the difference of means of n independent
+            # runs per variant has variance run_variance / n
+            run_variance = a.var(ddof=1) + b.var(ddof=1)
+
+            estimates = {
+                "independent": (float(b.mean() - a.mean()), float(np.sqrt(run_variance / runs_per_variant)), runs_per_variant)
+            }
+            plain_difference = b[0] - a[0]
+            estimates["common_random_numbers"] = (
+                float(plain_difference.mean()), float(plain_difference.std(ddof=1) / np.sqrt(replicas)), replicas
+            )
+            difference = (b - a).mean(axis=0)
+            if self.antithetic:
+                estimates["antithetic"] = (
+                    float(difference.mean()), float(difference.std(ddof=1) / np.sqrt(replicas)), runs_per_variant
+                )
+            if self.control_variate:
+                estimates["control_variate"] = (
+                    *control_variate_estimate(difference, np.column_stack([control_a, control_b])), runs_per_variant
+                )
+
+            report["outputs"][output] = {
+                "mean_a": float(a.mean()),
+                "mean_b": float(b.mean()),
+                "estimates": {
+                    method: self._describe(estimate, std_error, run_variance, runs)
+                    for method, (estimate, std_error, runs) in estimates.items()
+                },
+            }
+        return report
+
+    @staticmethod
+    def _describe(estimate: float, std_error: float, run_variance: float, runs: int) -> Dict[str, Any]:
+        """Estimate with its confidence interval, against independent sampling with the same `runs` per variant"""
+        variance_reduction = run_variance / runs / std_error ** 2 if std_error > 0 else None
+        return {
+            "difference": estimate,
+            "std_error": std_error,
+            "ci95": [estimate - 1.96 * std_error, estimate + 1.96 * std_error],
+            "variance_reduction": variance_reduction,
+            # Runs per variant that independent sampling would need for the same precision
+            "equivalent_runs": variance_reduction * runs if variance_reduction is not None else None,
+        }
@@ -1,15 +1,10 @@
 import random
-from datetime import datetime, timedelta
-import time
 import numpy as np
 import uuid
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Set, Optional
 import json
-import os
+from contextlib import nullcontext
 from pathlib import Path
-import matplotlib.pyplot as plt
-from matplotlib.lines import Line2D
-from matplotlib.ticker import MultipleLocator, FormatStrFormatter
 
 from rich.console import Console
 from rich.table import Table
@@ -18,8 +13,10 @@ from rich.panel import Panel
 from rich.text import Text
 
 from tontine_config import TontineConfig, IndividualParticipantConfig
-from tontine_state import TontineState, ParticipantState, ParticipantStatus
+from tontine_state import TontineState, ParticipantState, ParticipantStatus, MonthlyMetrics
 from tontine_initializer import TontineInitializer
+from tontine_scenarios import Scenario, ScenarioPaths
+from tontine_snapshot import save_state
 
 class TontineExecutor:
     """
@@ -33,120 +30,284 @@ class TontineExecutor:
         console:Console,
         initial_state: Optional[TontineState] = None,
         output_dir: str = "simulation_results",
-        recap: dict[int , list[int]]={} #dictionnaire consitue de cle: mois en cours , valeur : proportion de membres integres
-       
+        recap: Optional[dict[int , list[int]]] = None, #dictionnaire consitue de cle: mois en cours , valeur : proportion de membres integres
+        seed: Optional[int] = None,
+        logger: Optional["TontineLogger"] = None,
+        interactive: bool = True,
+        observers: Optional[list] = None,
+        scenario: Optional[Scenario] = None
     ):
-        self.recap = recap
+        self.recap = recap if recap is not None else {}
         self.tontine_config = tontine_config
         self.participant_configs = participant_configs
-        self.state = initial_state or TontineInitializer.create_initial_state(tontine_config)
+        self.state = initial_state or TontineInitializer.create_initial_state(tontine_config, participant_configs)
         self.console = console
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(exist_ok=True, parents=True)
+        # Dedicated generator so that a seed reproduces a run, even when several
+        # executors share a process (batch workers, simulation service)
+        self.rng = random.Random(seed)
+        self.seed = seed
+        # Scénario de chocs : multiplicateurs des probabilités tirés pour tout l'horizon au début du run
+        self.scenario = scenario
+        self.scenario_paths: Optional[ScenarioPaths] = None
+        # interactive=False disables the progress bar and the final matplotlib plots
+        self.interactive = interactive
+        self.failure_month: Optional[int] = None
+        # Cotisations attendues des membres présents (somme des contributions * (1 - probabilité de défaut)),
+        # variable de contrôle d'espérance connue pour les comparaisons Monte Carlo
+        self.expected_contributions = 0.0
+        # Objects notified after every month with on_month(metrics, state), and at the end
+        # of the run with on_simulation_end(state, failure_month)
+        self.observers = observers or []
+        self._build_indexes()
         
         # Liste des configurations de participants
-        self.logger = TontineLogger(self.console, self.output_dir)
+        if logger is None:
+            self.output_dir.mkdir(exist_ok=True, parents=True)
+            logger = TontineLogger(self.console, self.output_dir)
+        self.logger = logger
     
-    def _advance_date(self, month_num :int):
-        """Advance the simulation date by one month"""
-        self.state.current_date += timedelta(days=30)  # Approximate month
-        self.state.month_in_cycle = (month_num % 12) or 12
+    def _build_indexes(self):
+        """
+        Index the active members so that each phase only visits the members it concerns:
+        loan candidates (is_eligible_for_loan), debtors, members below the loan cap, and
+        members reaching the minimum membership, bucketed by month. Phases iterate the
+        indexes in join order, so the random draws are the same as a scan of all members.
+        """
+        self.join_rank: Dict[str, int] = {pid: rank for rank, pid in enumerate(self.state.historical_participant)}
+        self.loan_candidates: Dict[str, ParticipantState] = {}
+        self.debtors: Dict[str, ParticipantState] = {}
+        self.below_loan_cap: Set[str] = set()
+        # Mois -> membres atteignant l'ancienneté minimale ce mois-là
+        self.eligibility_buckets: Dict[int, List[str]] = {}
+        # Membres dont l'éligibilité doit être réévaluée à leur prochain paiement
+        self.eligibility_changes: Set[str] = set()
+        for participant in self.state.active_participants.values():
+            self._index_participant(participant)
+            if participant.is_eligible_for_loan:
+                self.loan_candidates[participant.id] = participant
+
+    def _index_participant(self, participant: ParticipantState):
+        """Add a member joining the active set to the indexes"""
+        self.join_rank.setdefault(participant.id, len(self.join_rank))
+        if participant.current_debt > 0:
+            self.debtors[participant.id] = participant
+        if len(participant.active_loans) < self.tontine_config.max_simultaneous_loans:
+            self.below_loan_cap.add(participant.id)
+        if participant.eligible_month > self.state.current_month:
+            self.eligibility_buckets.setdefault(participant.eligible_month, []).append(participant.id)
+        else:
+            self.eligibility_changes.add(participant.id)
+
+    def _in_join_order(self, index: Dict[str, ParticipantState]) -> List[ParticipantState]:
+        return sorted(index.values(), key=lambda p: self.join_rank[p.id])
+
+    def _update_debtor(self, participant: ParticipantState):
+        if participant.current_debt > 0:
+            self.debtors[participant.id] = participant
+        else:
+            self.debtors.pop(participant.id, None)
 
+    def _update_loan_cap(self, participant: ParticipantState):
+        """Keep below_loan_cap in sync after a change of the member's loans"""
+        below_cap = len(participant.active_loans) < self.tontine_config.max_simultaneous_loans
+        if below_cap != (participant.id in self.below_loan_cap):
+            if below_cap:
+                self.below_loan_cap.add(participant.id)
+            else:
+                self.below_loan_cap.discard(participant.id)
+            self.eligibility_changes.add(participant.id)
+
+    def _advance_month(self):
+        """Move the simulation clock to the next month"""
+        self.state.current_month += 1
+        self.state.month_in_cycle = self.state.current_month % 12 + 1
 
-    def run_simulation(self, num_months: int = 60):
+
+    def run_simulation(self, num_months: int = 60, start_month: int = 0) -> TontineState:
         """
-        Run the tontine simulation for a specified number of months
+        Run the tontine simulation for a specified number of months.
+        start_month > 0 resumes a tontine whose state already covers the months before it
+        (num_months stays the total horizon)
         """
+        if self.scenario is not None:
+            self.scenario_paths = self.scenario.paths(self.participant_configs, num_months, self.seed)
         self.logger.log_simulation_start(self.tontine_config, self.participant_configs)
         # Log the initial participants state at simulation start
         self.logger.log_initial_participants(self.state)
         
-        with Progress(
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-            TimeElapsedColumn(),
-            console=self.console
-        ) as progress:
-            task = progress.add_task("[cyan]Running simulation...", total=num_months)
+        if self.interactive:
+            progress = Progress(
+                TextColumn("[progress.description]{task.description}"),
+                BarColumn(),
+                TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+                TimeElapsedColumn(),
+                console=self.console
+            )
+        else:
+            progress = None
+        
+        with progress or nullcontext():
+            if progress is not None:
+                task = progress.add_task("[cyan]Running simulation...", total=num_months - start_month)
             membres_actifs=[] # liste du nombre de memebre actifs par mois
-            for month in range(num_months):
-                # Initialize monthly accumulators
-                self.monthly_defaults = []      # names of participants who default this month
-                self.monthly_total_collected = 0.0
-                self.monthly_debt_refunded = 0.0
-                self.monthly_beneficiary = "None"
-                
-                self.recuperer_donne_synthese(month , self.state.active_participants, self.state.treasury_balance , membres_actifs)
-                if self.state.is_tontine_failed(self.tontine_config)== True :
-                   self.logger.log_tontine_failure(self.state)
-                   self.tracer_ligne(self.recap ,membres_actifs)
-                   return
-                
-                self._process_month() 
-
-                # Log monthly summary with extra parameters
-                self.logger.log_monthly_summary(
-                    state=self.state,
-                    month_num=month + 1,
-                    beneficiary=self.monthly_beneficiary,
-                    defaults=self.monthly_defaults,
-                    total_collected=self.monthly_total_collected,
-                    debt_refunded=self.monthly_debt_refunded,
-                )
+            for month in range(start_month, num_months):
+                if not self._run_month(month, num_months, membres_actifs):
+                    self.failure_month = month
+                    self.logger.log_tontine_failure(self.state)
+                    self._notify_simulation_end()
+                    if self.interactive:
+                        self.tracer_ligne(self.recap ,membres_actifs)
+                    return self.state
+                self._notify_month(month)
 
-                
-                
-                if (month +1 ) % 12 == 0:
-                    # Cycle end processing gathers exit and arrival info
-                    exited_names = []
-                    new_member_names = []
-                    #self.state.current_date += timedelta(days=30)
-                    for participant_id, participant in list(self.state.active_participants.items()):
-                        if participant.status != ParticipantStatus.ACTIVE:
-                            continue
-                        if random.random() < participant.config.exit_probability:
-                            participant.status = ParticipantStatus.EXITED
-                            exited_names.append(participant.config.name)
-                            self.state.historical_participant[participant_id].exit_date = self.state.current_date
-                            self.state.active_participants.pop(participant_id)
-                            return_amount = 0
-                            if participant.current_debt > 0:
-                                return_amount = max(0, participant.total_contributions - participant.current_debt)
-                            self.state.treasury_balance -= return_amount
-                            self.monthly_debt_refunded += return_amount
-                            self.state.cycle_exits += 1
-                        else:
-                          mois_restant= num_months - month -1
-                          participant.exit_date = participant.join_date + timedelta(days=30*mois_restant)
-                    for _ in range(self._calculate_new_arrivals()):
-                        new_id = self._add_new_participant(num_months)
-                        new_member_names.append(self.state.active_participants[new_id].config.name)
-                        self.state.historical_participant[new_id]= self.state.active_participants[new_id]
-                    
-                    self.logger.log_cycle_summary(self.state,exited_names, new_member_names)
-
-                    
-                    # Reset cycle stats and log detailed participants table at cycle end
-                    self.state.cycle_contributions = 0
-                    self.state.cycle_defaults = 0
-                    self.state.cycle_new_members = 0
-                    self.state.cycle_exits = 0
-                    self.state.cycle_number += 1
-                    self.state.month_in_cycle = 1
-                else:
-                    self._advance_date(month + 1)
-
-                progress.update(task, advance=1, description=f"[cyan]Month {month + 1}/{num_months}")
+                if progress is not None:
+                    progress.update(task, advance=1, description=f"[cyan]Month {month + 1}/{num_months}")
                
     
             self.logger.log_simulation_end(self.state)
-            self.tracer_ligne(self.recap, membres_actifs)
+            self._notify_simulation_end()
+            if self.interactive:
+                self.tracer_ligne(self.recap, membres_actifs)
+        return self.state
+    
+    def _notify_month(self, month: int):
+        """Stream the metrics of the month that just ended to the observers"""
+        if not self.observers:
+            return
+        metrics = MonthlyMetrics(
+            month=month,
+            cycle_number=self.state.cycle_number,
+            month_in_cycle=self.state.month_in_cycle,
+            treasury_balance=self.state.treasury_balance,
+            emergency_fund=self.state.emergency_fund,
+            total_loans_outstanding=self.state.total_loans_outstanding,
+            total_contributions_received=self.state.total_contributions_received,
+            total_interest_earned=self.state.total_interest_earned,
+            default_rate=self.state.default_rate,
+            loan_recovery_rate=self.state.loan_recovery_rate,
+            active_participants=len(self.state.active_participants),
+            total_participants_history=self.state.total_participants_history,
+            collected=self.monthly_total_collected,
+            debt_refunded=self.monthly_debt_refunded,
+            defaults=len(self.monthly_defaults),
+            exits=self.monthly_exits,
+            arrivals=self.monthly_arrivals,
+            beneficiary=self.monthly_beneficiary,
+            members_due=self.monthly_members_due,
+            debt_changes=[
+                (before, self.state.active_participants[pid].current_debt if pid in self.state.active_participants else None)
+                for pid, before in self.monthly_debt_before.items()
+            ],
+            changed_members=list(self.monthly_debt_before),
+            paid_members=self.monthly_payers
+        )
+        for observer in self.observers:
+            observer.on_month(metrics, self.state)
+    
+    def _notify_simulation_end(self):
+        for observer in self.observers:
+            observer.on_simulation_end(self.state, self.failure_month)
+    
+    def _run_month(self, month: int, num_months: int, membres_actifs: list) -> bool:
+        """Simulate one month, including end of cycle processing. Return False if the tontine has failed"""
+        # Initialize monthly accumulators
+        self.monthly_defaults = []      # names of participants who default this month
+        self.monthly_total_collected = 0.0
+        self.monthly_debt_refunded = 0.0
+        self.monthly_beneficiary = "None"
+        self.monthly_exits = 0
+        self.monthly_arrivals = 0
+        self.monthly_members_due = 0
+        self.monthly_repayments = 0
+        self.monthly_debt_before: Dict[str, Optional[float]] = {}  # Dette en début de mois des membres modifiés
+        self.monthly_payers: List[str] = []  # Membres ayant payé leur cotisation ce mois-ci
+        
+        self.recuperer_donne_synthese(month , self.state.active_participants, self.state.treasury_balance , membres_actifs)
+        if self.state.is_tontine_failed(self.tontine_config)== True :
+           return False
+        
+        self._process_month() 
+
+        # Log monthly summary with extra parameters
+        self.logger.log_monthly_summary(
+            state=self.state,
+            month_num=month + 1,
+            beneficiary=self.monthly_beneficiary,
+            defaults=self.monthly_defaults,
+            total_collected=self.monthly_total_collected,
+            debt_refunded=self.monthly_debt_refunded,
+        )
+
+        
+        
+        if (month +1 ) % 12 == 0:
+            # Cycle end processing gathers exit and arrival info
+            exited_names = self._process_exits(month, num_months)
+            new_member_names = self._process_arrivals(num_months)
+            
+            self.logger.log_cycle_summary(self.state,exited_names, new_member_names)
+
+            
+            # Reset cycle stats and log detailed participants table at cycle end
+            self.state.cycle_contributions = 0
+            self.state.cycle_defaults = 0
+            self.state.cycle_new_members = 0
+            self.state.cycle_exits = 0
+            self.state.cycle_number += 1
+        return True
+    
+    def _process_exits(self, month: int, num_months: int) -> List[str]:
+        """Let participants leave the tontine at the end of a cycle and return their names"""
+        exited_names = []
+        paths = self.scenario_paths
+        scales = paths.column(paths.exit_scale, month) if paths is not None else None
+        for participant_id, participant in list(self.state.active_participants.items()):
+            if participant.status != ParticipantStatus.ACTIVE:
+                continue
+            probability = participant.config.exit_probability
+            if scales is not None:
+                probability = min(1.0, probability * scales[paths.row(participant.config.id)])
+            if self.rng.random() < probability:
+                exited_names.append(participant.config.name)
+                self._remove_participant(participant_id)
+            else:
+              mois_restant= num_months - month -1
+              participant.exit_month = participant.join_month + mois_restant
+        return exited_names
+    
+    def _remove_participant(self, participant_id: str):
+        """Remove an exiting participant, returning its contributions net of its debt if it owes money"""
+        self._track_debt(self.state.active_participants[participant_id])
+        participant = self.state.active_participants.pop(participant_id)
+        participant.status = ParticipantStatus.EXITED
+        self.loan_candidates.pop(participant_id, None)
+        self.debtors.pop(participant_id, None)
+        self.below_loan_cap.discard(participant_id)
+        self.eligibility_changes.discard(participant_id)
+        self.state.historical_participant[participant_id].exit_month = self.state.current_month
+        return_amount = 0
+        if participant.current_debt > 0:
+            return_amount = max(0, participant.total_contributions - participant.current_debt)
+        self.state.treasury_balance -= return_amount
+        self.monthly_debt_refunded += return_amount
+        self.state.cycle_exits += 1
+        self.monthly_exits += 1
+    
+    def _process_arrivals(self, num_months: int) -> List[str]:
+        """Add the new participants arriving at the end of a cycle and return their names"""
+        new_member_names = []
+        for _ in range(self._calculate_new_arrivals()):
+            new_id = self._add_new_participant(num_months)
+            new_member_names.append(self.state.active_participants[new_id].config.name)
+            self.state.historical_participant[new_id]= self.state.active_participants[new_id]
+        return new_member_names
     
     def _process_month(self):
         """Process all activities for a single month"""
         
         total_contribution = self._collect_contributions()
+        self._update_default_rate()
         
         self._process_monthly_distribution(total_contribution)
         
@@ -154,55 +315,39 @@ class TontineExecutor:
         
         
         self._process_loan_repayments()
+        self._update_recovery_rate()
         
         
         if self.state.is_cycle_end():
             self._process_end_of_cycle()
             
         
-        self._advance_date(self.state.month_in_cycle + 1 )
+        self._advance_month()
     
     def _collect_contributions(self):
         """Collect monthly contributions from all participants and return total collected"""
         total_collected = 0.0
         # Reset defaults list for the month
         self.monthly_defaults = []
+        for participant_id in self.eligibility_buckets.pop(self.state.current_month, []):
+            if participant_id in self.state.active_participants:
+                self.eligibility_changes.add(participant_id)
         
+        paths = self.scenario_paths
+        scales = paths.column(paths.default_scale, self.state.current_month) if paths is not None else None
         for participant_id, participant in list(self.state.active_participants.items()):
             if participant.status != ParticipantStatus.ACTIVE:
                 continue
+            probability = participant.config.default_probability
+            if scales is not None:
+                probability = min(1.0, probability * scales[paths.row(participant.config.id)])
+            self.expected_contributions += self.tontine_config.monthly_contrib * (1 - probability)
                 
-            if random.random() < participant.config.default_probability:
+            if self.rng.random() < probability:
                 # Default : Le participant décide de ne pas payer!
-                participant.consecutive_defaults += 1
-                participant.missed_payments += 1
-                
-                # Ajout de la dette du participant
-                interest_amount = participant.current_debt * self.tontine_config.monthly_interest_rate
-                participant.current_debt += self.tontine_config.monthly_contrib + interest_amount
-                
-                # Update tontine state
-                self.state.cycle_defaults += 1
-                self.state.default_rate = (
-                    self.state.cycle_defaults / 
-                    (len(self.state.active_participants) * self.state.month_in_cycle)
-                )
-                self.monthly_defaults.append(participant.config.name)
+                self._record_default(participant)
             else:
-                # Le par
-                participant.total_contributions += self.tontine_config.monthly_contrib
-                participant.consecutive_defaults = 0
-                participant.last_payment_date = self.state.current_date
-                
-                # Update credit score (improve slightly)
-                total_collected += self.tontine_config.monthly_contrib
-                
-                # Update participant eligibility for loans
-                months_since_join = (self.state.current_date - participant.join_date).days // 30
-                participant.is_eligible_for_loan = (
-                    months_since_join >= self.tontine_config.min_membership_months and
-                    len(participant.active_loans) < self.tontine_config.max_simultaneous_loans
-                )
+                total_collected += self._record_payment(participant)
         
         # Update tontine state with total contributions
         self.state.total_contributions_received += total_collected
@@ -211,6 +356,64 @@ class TontineExecutor:
         
         return total_collected
     
+    def _track_debt(self, participant: ParticipantState):
+        """Remember the debt of a participant before its first change of the month"""
+        self.monthly_debt_before.setdefault(participant.id, participant.current_debt)
+    
+    def _update_default_rate(self):
+        """Default rate of the current cycle, computed once the month's contributions are collected"""
+        if self.monthly_defaults:
+            self.state.default_rate = (
+                self.state.cycle_defaults / 
+                (len(self.state.active_participants) * self.state.month_in_cycle)
+            )
+    
+    def _update_recovery_rate(self):
+        """Loan recovery metrics, computed once the month's repayments are booked"""
+        if self.monthly_repayments and self.state.total_loans_outstanding > 0:
+            self.state.loan_recovery_rate = (
+                self.state.total_interest_earned / 
+                self.state.total_loans_outstanding
+            )
+    
+    def _record_default(self, participant: ParticipantState):
+        """Book a missed contribution: it is added to the participant's debt with interest"""
+        self._track_debt(participant)
+        self.monthly_members_due += 1
+        participant.consecutive_defaults += 1
+        participant.missed_payments += 1
+        
+        # Ajout de la dette du participant
+        interest_amount = participant.current_debt * self.tontine_config.monthly_interest_rate
+        participant.current_debt += self.tontine_config.monthly_contrib + interest_amount
+        self._update_debtor(participant)
+        
+        # Update tontine state
+        self.state.cycle_defaults += 1
+        self.monthly_defaults.append(participant.config.name)
+    
+    def _record_payment(self, participant: ParticipantState) -> float:
+        """Book a paid contribution and return the amount collected"""
+        # Le par
+        self.monthly_members_due += 1
+        participant.total_contributions += self.tontine_config.monthly_contrib
+        participant.consecutive_defaults = 0
+        participant.last_payment_month = self.state.current_month
+        self.monthly_payers.append(participant.id)
+        
+        # Update participant eligibility for loans, only when seniority or the loan cap changed
+        if participant.id in self.eligibility_changes:
+            self.eligibility_changes.discard(participant.id)
+            participant.is_eligible_for_loan = (
+                self.state.current_month >= participant.eligible_month and
+                participant.id in self.below_loan_cap
+            )
+            if participant.is_eligible_for_loan:
+                self.loan_candidates[participant.id] = participant
+            else:
+                self.loan_candidates.pop(participant.id, None)
+        return self.tontine_config.monthly_contrib
+    
     def _process_monthly_distribution(self, total_contribution: float):
         """Process the monthly distribution where one participant receives a portion of contributions"""
         if total_contribution <= 0:
@@ -267,12 +470,8 @@ class TontineExecutor:
     
     def _process_loan_requests(self):
         """Process loan requests from eligible participants"""
-        for participant_id, participant in self.state.active_participants.items():
-            if (
-                participant.status == ParticipantStatus.ACTIVE and
-                participant.is_eligible_for_loan and
-                random.random() < participant.config.loan_prob  # Use participant-specific probability
-            ):
+        for participant in self._in_join_order(self.loan_candidates):
+            if self.rng.random() < participant.config.loan_prob:  # Use participant-specific probability
                 max_possible_loan = min(
                     self.state.treasury_balance * 0.5,
                     self.tontine_config.max_loan_amount)
@@ -281,59 +480,63 @@ class TontineExecutor:
                 if max_possible_loan <= 0:
                     continue
                     
-                loan_amount = random.uniform(0.5 * max_possible_loan, max_possible_loan)
-                
-                # Issue the loan
-                participant.active_loans.append(loan_amount)
-                participant.current_debt += loan_amount
-                participant.total_borrowed += loan_amount
-                
-                # Update tontine state
-                self.state.treasury_balance -= loan_amount
-                self.state.total_loans_outstanding += loan_amount
+                loan_amount = self.rng.uniform(0.5 * max_possible_loan, max_possible_loan)
+                self._issue_loan(participant, loan_amount)
+    
+    def _issue_loan(self, participant: ParticipantState, loan_amount: float):
+        """Lend loan_amount from the treasury to a participant"""
+        self._track_debt(participant)
+        participant.active_loans.append(loan_amount)
+        participant.current_debt += loan_amount
+        participant.total_borrowed += loan_amount
+        self._update_debtor(participant)
+        self._update_loan_cap(participant)
+        
+        # Update tontine state
+        self.state.treasury_balance -= loan_amount
+        self.state.total_loans_outstanding += loan_amount
     
     def _process_loan_repayments(self):
         """Process loan repayments"""
-        for participant_id, participant in self.state.active_participants.items():
-            if (
-                participant.status == ParticipantStatus.ACTIVE and
-                participant.current_debt > 0 and
-                random.random() < participant.config.loan_reemboursement_prob
-            ):
-                # Calculate interest due
-                interest_amount = participant.current_debt * self.tontine_config.monthly_interest_rate
-                
-                # Determine repayment amount (principal + interest)
-                repayment_amount = interest_amount
+        for participant in self._in_join_order(self.debtors):
+            if self.rng.random() < participant.config.loan_reemboursement_prob:
+                principal_repayment = 0.0
                 
                 # Optionally repay some principal
-                if random.random() > 0.5:  # 50% chance to repay some principal
-                    principal_repayment = random.uniform(
+                if self.rng.random() > 0.5:  # 50% chance to repay some principal
+                    principal_repayment = self.rng.uniform(
                         self.tontine_config.monthly_contrib, 
                         participant.current_debt * 0.2  # Up to 20% of current debt
                     )
-                    repayment_amount += principal_repayment
-                
-                # Apply the repayment
-                participant.current_debt -= (repayment_amount - interest_amount)  # Subtract principal
-                participant.total_repaid += repayment_amount
-                
-                # Remove fully repaid loans
-                if participant.current_debt <= 0:
-                    participant.active_loans = []
-                    participant.current_debt = 0
-                    
-                # Update tontine state
-                self.state.treasury_balance += repayment_amount
-                self.state.total_loans_outstanding -= (repayment_amount - interest_amount)
-                self.state.total_interest_earned += interest_amount
                 
-                # Update loan recovery metrics
-                if self.state.total_loans_outstanding > 0:
-                    self.state.loan_recovery_rate = (
-                        self.state.total_interest_earned / 
-                        self.state.total_loans_outstanding
-                    )
+                self._apply_repayment(participant, principal_repayment)
+    
+    def _apply_repayment(self, participant: ParticipantState, principal_repayment: float, interest_amount: Optional[float] = None):
+        """Book a repayment: interest_amount (by default the interest due on the current debt) plus principal_repayment"""
+        self._track_debt(participant)
+        self.monthly_repayments += 1
+        # Calculate interest due
+        if interest_amount is None:
+            interest_amount = participant.current_debt * self.tontine_config.monthly_interest_rate
+        
+        # Determine repayment amount (principal + interest)
+        repayment_amount = interest_amount + principal_repayment
+        
+        # Apply the repayment
+        participant.current_debt -= (repayment_amount - interest_amount)  # Subtract principal
+        participant.total_repaid += repayment_amount
+        
+        # Remove fully repaid loans
+        if participant.current_debt <= 0:
+            participant.active_loans = []
+            participant.current_debt = 0
+        self._update_debtor(participant)
+        self._update_loan_cap(participant)
+            
+        # Update tontine state
+        self.state.treasury_balance += repayment_amount
+        self.state.total_loans_outstanding -= (repayment_amount - interest_amount)
+        self.state.total_interest_earned += interest_amount
     
     def _process_end_of_cycle(self):
         
@@ -344,43 +547,54 @@ class TontineExecutor:
         base_arrivals = round(len(self.state.active_participants) * self.tontine_config.arrival_probability)
         
         # Add some randomness
-        variation = random.randint(-2, 2)
+        variation = self.rng.randint(-2, 2)
         new_arrivals = max(0, base_arrivals + variation)
         
         return new_arrivals
     
-    def _add_new_participant(self, month : int):
-        """Add a new participant to the tontine"""
-        participant_id = str(uuid.uuid4())
+    def _add_new_participant(
+        self,
+        month : int,
+        participant_id: Optional[str] = None,
+        ref_config: Optional[IndividualParticipantConfig] = None
+    ):
+        """Add a new participant to the tontine, by default with the config of a random participant"""
+        if participant_id is None:
+            participant_id = str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
         
         # config the config of a random participant
-        ref_config = random.choice(self.participant_configs).clone()
-        ref_config.name= f"Participant {self.state.total_participants_history+1}"
+        if ref_config is None:
+            ref_config = self.rng.choice(self.participant_configs).clone()
+            ref_config.name= f"Participant {self.state.total_participants_history+1}"
 
         # Create a new participant
         participant = ParticipantState(
             id=participant_id,
             config = ref_config,
-            join_date=self.state.current_date,
-            exit_date = self.state.current_date + timedelta(days= 30 * (month - self.state.current_date.timetuple().tm_mon)) ,
+            join_month=self.state.current_month,
+            exit_month=self.state.current_month + month - self.state.month_in_cycle,
             status=ParticipantStatus.ACTIVE,
             total_contributions=0.0,
             current_debt=0.0,
             active_loans=[],
             missed_payments=0,
             consecutive_defaults=0,
-            last_payment_date=self.state.current_date,
+            last_payment_month=self.state.current_month,
             total_borrowed=0.0,
             total_repaid=0.0,
             is_eligible_for_loan=False,  # Not eligible at start
+            eligible_month=self.state.current_month + self.tontine_config.min_membership_months,
         )
         
         # Add to active participants
         self.state.active_participants[participant_id] = participant
+        self.monthly_debt_before.setdefault(participant_id, None)
+        self._index_participant(participant)
         
         # Update tontine state
         self.state.total_participants_history += 1
         self.state.cycle_new_members += 1
+        self.monthly_arrivals += 1
         
         return participant_id
     
@@ -392,7 +606,7 @@ class TontineExecutor:
                 integre+=1
             else:
                 peu_integre+=1    
-        proportion= integre / (integre + peu_integre)
+        proportion= integre / (integre + peu_integre) if donnee_mensuelle else 0.0
         if month not in self.recap:
             self.recap[month]= []
         
@@ -406,6 +620,10 @@ class TontineExecutor:
         Args:
         liste_de_trait: une liste de liste contenant (date entree , date de sortie et probabilite de remboursement)]
           """
+          # matplotlib is only needed for the interactive plots, keep it out of headless imports
+          import matplotlib.pyplot as plt
+          from matplotlib.ticker import MultipleLocator, FormatStrFormatter
+
           x =[] #liste de numero de mois
           y=[]  # liste de proportion de membres integres
           fund=[] # liste de valeur du tresor par mois
@@ -611,11 +829,11 @@ class TontineLogger:
                     loans_str = "None"
                 
                 # Calculate payment history
-                days_since_payment = (state.current_date - participant.last_payment_date).days
+                months_since_payment = state.current_month - participant.last_payment_month
                 payment_status = (
-                    f"Regular ({days_since_payment}d)" if days_since_payment < 30
-                    else f"[yellow]Late ({days_since_payment}d)[/yellow]" if days_since_payment < 60
-                    else f"[red]Very Late ({days_since_payment}d)[/red]"
+                    f"Regular ({months_since_payment}mo)" if months_since_payment < 1
+                    else f"[yellow]Late ({months_since_payment}mo)[/yellow]" if months_since_payment < 2
+                    else f"[red]Very Late ({months_since_payment}mo)[/red]"
                 )
                 
                 active_table.add_row(
@@ -651,6 +869,7 @@ class TontineLogger:
 
          # save ending state
         self.save_state_to_json(state, "final")
+        self.save_state_snapshot(state, "final")
     
     def log_simulation_end(self, final_state: TontineState):
         """Log the end of a simulation with final statistics"""
@@ -662,6 +881,7 @@ class TontineLogger:
         
         # Save final state
         self.save_state_to_json(final_state, "final")
+        self.save_state_snapshot(final_state, "final")
         
         # Display final statistics
         table = Table(title="Final Tontine Statistics")
@@ -685,7 +905,9 @@ class TontineLogger:
         self.console.print("[green]Full simulation data has been saved to the output directory.")
         self.console.print()
 
-        self.console.save_html(self.output_dir/"simulation.html")
+        # Only a recording console keeps the rendered output (see --report console)
+        if self.console.record:
+            self.console.save_html(self.output_dir/"simulation.html")
     
     def save_state_to_json(self, state: TontineState, month_or_label):
         """Save the current state to a JSON file"""
@@ -698,6 +920,10 @@ class TontineLogger:
         with open(filepath, 'w') as f:
             json.dump(state_dict, f, indent=2, default=str)
     
+    def save_state_snapshot(self, state: TontineState, month_or_label):
+        """Save the complete state as a snapshot directory, which load_state reads back exactly"""
+        save_state(self.output_dir / f"tontine_state_{month_or_label}", state)
+
     def _serialize_state(self, state: TontineState) -> dict:
         """Convert TontineState to a serializable dictionary"""
         # Convert participants
@@ -705,15 +931,15 @@ class TontineLogger:
         for pid, participant in state.active_participants.items():
             participants_dict[pid] = {
                 "id": participant.id,
-                "join_date": participant.join_date.isoformat(),
-                "exit_date":participant.exit_date ,
+                "join_date": state.date_of(participant.join_month).isoformat(),
+                "exit_date": state.date_of(participant.exit_month).isoformat(),
                 "status": participant.status.value,
                 "total_contributions": participant.total_contributions,
                 "current_debt": participant.current_debt,
                 "active_loans": participant.active_loans,
                 "missed_payments": participant.missed_payments,
                 "consecutive_defaults": participant.consecutive_defaults,
-                "last_payment_date": participant.last_payment_date.isoformat(),
+                "last_payment_date": state.date_of(participant.last_payment_month).isoformat(),
                 "total_borrowed": participant.total_borrowed,
                 "total_repaid": participant.total_repaid,
                 "is_eligible_for_loan": participant.is_eligible_for_loan,
@@ -722,6 +948,7 @@ class TontineLogger:
         # Convert state
         state_dict = {
             "current_date": state.current_date.isoformat(),
+            "current_month": state.current_month,
             "cycle_number": state.cycle_number,
             "month_in_cycle": state.month_in_cycle,
             "active_participants": participants_dict,
@@ -800,4 +1027,36 @@ class TontineLogger:
         self.console.print('"')
 
         
-        self.log_cycle_end_participants(state=state)
\ No newline at end of file
+        self.log_cycle_end_participants(state=state)
+
+
+class NullTontineLogger(TontineLogger):
+    """
+    Logger that renders and saves nothing, used for headless runs (batches, service)
+    """
+
+    def __init__(self):
+        self.console = None
+        self.output_dir = None
+
+    def log_simulation_start(self, tontine_config: TontineConfig, participants_confg: List[IndividualParticipantConfig]):
+        pass
+
+    def log_initial_participants(self, state: TontineState):
+        pass
+
+    def log_monthly_distribution(self, participant: ParticipantState, amount: float, month: int):
+        pass
+
+    def log_monthly_summary(self, state: TontineState, month_num: int, beneficiary: str,
+                            defaults: list, total_collected: float, debt_refunded: float):
+        pass
+
+    def log_cycle_summary(self, state: TontineState, exited_names: list, new_member_names: list):
+        pass
+
+    def log_tontine_failure(self, state: TontineState):
+        pass
+
+    def log_simulation_end(self, final_state: TontineState):
+        pass
@@ -1,11 +1,10 @@
 import json
-from datetime import datetime, timedelta
-from typing import Dict, Tuple, List, Any
-import uuid
-import random
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, Tuple, List, Any, Optional
 
 from tontine_config import TontineConfig, IndividualParticipantConfig
-from tontine_state import TontineState, ParticipantState, ParticipantStatus
+from tontine_state import TontineState, ParticipantState, ParticipantStatus, DEFAULT_START_DATE
 
 class TontineInitializer:
     """
@@ -20,7 +19,18 @@ class TontineInitializer:
         try:
             with open(config_path, 'r') as config_file:
                 config_data = json.load(config_file)
-                
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            raise Exception(f"Failed to load configuration: {str(e)}")
+        
+        return TontineInitializer.parse_config(config_data)
+    
+    @staticmethod
+    def parse_config(config_data: Dict[str, Any]) -> Tuple[TontineConfig, List[IndividualParticipantConfig]]:
+        """
+        Build tontine and individual participant configurations from an already decoded
+        configuration dictionary (same layout as the JSON configuration file)
+        """
+        try:
             tontine_data = config_data["tontine"]
             
             num_start = tontine_data.get("num_participants_start", len(config_data.get("participants", []))-1)
@@ -48,7 +58,7 @@ class TontineInitializer:
             # Participants are explicitly defined in the config
             for participant_data in config_data["participants"]:
                 config = IndividualParticipantConfig(
-                    id=participant_data.get("id", str(uuid.uuid4())),
+                    id=participant_data.get("id", f"P{len(participant_configs)+1:03d}"),
                     name=participant_data.get("name", f"Participant {len(participant_configs)+1}"),
                     default_probability=participant_data["default_probability"],
                     loan_prob=participant_data["loan_prob"],
@@ -61,18 +71,32 @@ class TontineInitializer:
             
             return tontine_config, participant_configs
             
-        except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
+        except KeyError as e:
             raise Exception(f"Failed to load configuration: {str(e)}")
     
+    @staticmethod
+    def dump_config(
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig]
+    ) -> Dict[str, Any]:
+        """
+        Convert configurations back to the JSON configuration file layout
+        """
+        return {
+            "tontine": asdict(tontine_config),
+            "participants": [asdict(config) for config in participant_configs],
+        }
+    
     @staticmethod
     def create_initial_state(
         tontine_config: TontineConfig, 
-        participant_configs: List[IndividualParticipantConfig]
+        participant_configs: List[IndividualParticipantConfig],
+        start_date: Optional[datetime] = None
     ) -> TontineState:
         """
-        Create an initial tontine state based on the configuration
+        Create an initial tontine state based on the configuration.
+        start_date (DEFAULT_START_DATE by default) only dates month 0 in reports
         """
-        start_date = datetime.now().replace(month=1 , day=1, hour=0, minute=0, second=0, microsecond=0)
         
         # Create initial participant states
         active_participants = {}
@@ -81,25 +105,26 @@ class TontineInitializer:
             participant = ParticipantState(
                 id=participant_config.id,
                 config=participant_config,
-                join_date=start_date,
-                exit_date= start_date + timedelta(days=30 ),  
+                join_month=0,
+                exit_month=1,
                 status=ParticipantStatus.ACTIVE,
                 total_contributions=0.0,
                 current_debt=0.0,
                 active_loans=[],
                 missed_payments=0,
                 consecutive_defaults=0,
-                last_payment_date=start_date,
+                last_payment_month=0,
                 total_borrowed=0.0,
                 total_repaid=0.0,
                 is_eligible_for_loan=False,
+                eligible_month=tontine_config.min_membership_months,
                 monthly_distributions_received=0.0
             )
             historical_participant[participant_config.id]= participant
             active_participants[participant_config.id] = participant
         
         return TontineState(
-            current_date=start_date,
+            current_month=0,
             cycle_number=1,
             month_in_cycle=1,
             active_participants=active_participants,
@@ -115,5 +140,6 @@ class TontineInitializer:
             cycle_contributions=0.0,
             cycle_defaults=0,
             cycle_new_members=0,
-            cycle_exits=0
+            cycle_exits=0,
+            start_date=start_date or DEFAULT_START_DATE
         )
\ No newline at end of file
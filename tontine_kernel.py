@@ -0,0 +1,449 @@
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba est optionnel : les noyaux s'exécutent alors en Python
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_state import TontineState
+from tontine_scenarios import Scenario
+
+
+# Phases des tirages uniformes par mois et par membre (position fixe dans le flux aléatoire)
+U_DEFAULT, U_LOAN, U_LOAN_AMOUNT, U_REPAY, U_PRINCIPAL, U_PRINCIPAL_AMOUNT, U_EXIT = range(7)
+# Tirages de fin de cycle (variation du nombre d'arrivées) et des nouveaux membres (archétype, identifiant)
+U_ARRIVAL_VARIATION, U_ARRIVAL_CONFIG, U_ARRIVAL_ID_HIGH, U_ARRIVAL_ID_LOW = range(8, 12)
+NUM_PHASES = 16
+MAX_SLOTS = 1 << 24
+
+# Indices de l'état global (tableau g)
+(G_TREASURY, G_EMERGENCY, G_OUTSTANDING, G_CONTRIBUTIONS, G_INTEREST, G_DEFAULT_RATE,
+ G_RECOVERY_RATE, G_CYCLE_CONTRIBUTIONS, G_CYCLE_DEFAULTS, G_MONTH, G_MONTH_IN_CYCLE, G_CYCLE_NUMBER,
+ G_EXPECTED_CONTRIBUTIONS) = range(13)
+NUM_GLOBALS = 13
+
+# Indices des paramètres de la tontine (tableau params)
+(P_CONTRIB, P_RATE, P_EMERGENCY, P_DISTRIBUTION, P_MAX_LOAN, P_MIN_MEMBERSHIP,
+ P_MAX_LOANS, P_MIN_PARTICIPANTS, P_ARRIVAL) = range(9)
+
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+@njit(cache=True)
+def _mix64(x):
+    """splitmix64 finaliser (uint64, wraps modulo 2**64); works on scalars and arrays"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+@njit(cache=True)
+def _uniform(key, month, slot, phase):
+    counter = (np.uint64(month) * np.uint64(MAX_SLOTS) + np.uint64(slot)) * np.uint64(NUM_PHASES) + np.uint64(phase)
+    return (_mix64(_mix64(counter) ^ key) >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+@njit(cache=True)
+def _draw(key, month, slot, phase, antithetic):
+    """Uniform of the stream, or its antithetic counterpart 1 - u"""
+    u = _uniform(key, month, slot, phase)
+    return 1.0 - u if antithetic else u
+
+
+def stream_key(seed: int) -> np.uint64:
+    with np.errstate(over="ignore"):
+        return np.uint64(_mix64(np.uint64(seed % (1 << 64)) + np.uint64(0x9E3779B97F4A7C15)))
+
+
+def random_bits(seed: int, month, slot, phase) -> np.ndarray:
+    """
+    Counter-based random stream: 64 random bits for every (month, slot, phase), computed
+    directly from the coordinates (arrays broadcast). A draw never depends on how many other
+    draws were made, so two runs with the same seed share the draw of a given member slot,
+    month and phase.
+    """
+    counter = (np.asarray(month, dtype=np.uint64) * np.uint64(MAX_SLOTS) + np.asarray(slot, dtype=np.uint64)) \
+        * np.uint64(NUM_PHASES) + np.asarray(phase, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        return _mix64(_mix64(counter) ^ stream_key(seed))
+
+
+def random_uniforms(seed: int, month, slot, phase) -> np.ndarray:
+    """Uniforms in [0, 1) of the counter-based stream, the same values the kernel draws"""
+    return (random_bits(seed, month, slot, phase) >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+def uuid_strings(high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """Version 4 UUID strings (as bytes) of 128 random bits, formatted like str(uuid.UUID(...))"""
+    high = (high & ~np.uint64(0xF000)) | np.uint64(0x4000)
+    low = (low & ~np.uint64(0xC000 << 48)) | np.uint64(0x8000 << 48)
+    shifts = np.arange(60, -4, -4, dtype=np.uint64)
+    nibbles = np.concatenate([(high[:, None] >> shifts) & np.uint64(0xF), (low[:, None] >> shifts) & np.uint64(0xF)], axis=1)
+    characters = HEX_DIGITS[nibbles.astype(np.intp)]
+    dash = np.full((len(high), 1), ord("-"), dtype=np.uint8)
+    characters = np.concatenate([
+        characters[:, :8], dash, characters[:, 8:12], dash, characters[:, 12:16], dash,
+        characters[:, 16:20], dash, characters[:, 20:]
+    ], axis=1)
+    return np.ascontiguousarray(characters).view("S36").ravel()
+
+
+@njit(cache=True)
+def _run_months(
+    first_month, last_month, n, num_slots, key, antithetic,
+    active, eligible_month, contributions, debt, num_loans, missed, consecutive, borrowed, repaid,
+    distributions, eligible, last_payment_month, rank, archetype,
+    p_default, p_loan, p_repay, p_exit, default_scale, exit_scale,
+    params, g, treasury_path
+):
+    """
+    Simulate months [first_month, last_month) with exactly the sequential semantics of
+    TontineExecutor._run_month. Members live in slots 0..n-1 in join order; slots
+    n..num_slots-1 are pre-drawn arrivals, taken in order at the cycle ends. With antithetic,
+    every uniform u of the stream is replaced by 1 - u.
+    The default and exit probabilities of a slot are scaled by default_scale and exit_scale
+    [archetype of the slot, month] (scenario multipliers, all ones without scenario).
+    Return (number of used slots, failure month or -1).
+    """
+    contrib = params[P_CONTRIB]
+    rate = params[P_RATE]
+    for month in range(first_month, last_month):
+        treasury_path[month] = g[G_TREASURY]
+
+        num_active = 0
+        for i in range(n):
+            if active[i]:
+                num_active += 1
+        if num_active < params[P_MIN_PARTICIPANTS]:
+            return n, month
+
+        # Collecte des cotisations
+        collected = 0.0
+        defaults = 0
+        for i in range(n):
+            if not active[i]:
+                continue
+            probability = min(1.0, p_default[i] * default_scale[archetype[i], month])
+            g[G_EXPECTED_CONTRIBUTIONS] += contrib * (1.0 - probability)
+            if _draw(key, month, i, U_DEFAULT, antithetic) < probability:
+                consecutive[i] += 1
+                missed[i] += 1
+                debt[i] += contrib + debt[i] * rate
+                defaults += 1
+            else:
+                contributions[i] += contrib
+                consecutive[i] = 0
+                last_payment_month[i] = g[G_MONTH]
+                collected += contrib
+                eligible[i] = g[G_MONTH] >= eligible_month[i] and num_loans[i] < params[P_MAX_LOANS]
+        g[G_CONTRIBUTIONS] += collected
+        g[G_CYCLE_CONTRIBUTIONS] += collected
+        if defaults > 0:
+            g[G_CYCLE_DEFAULTS] += defaults
+            g[G_DEFAULT_RATE] = g[G_CYCLE_DEFAULTS] / (num_active * g[G_MONTH_IN_CYCLE])
+
+        # Distribution mensuelle au membre ayant le moins reçu (ordre des identifiants en cas d'égalité)
+        if collected > 0:
+            emergency = collected * params[P_EMERGENCY]
+            g[G_EMERGENCY] += emergency
+            distributable = collected - emergency
+            distribution = distributable * params[P_DISTRIBUTION]
+            g[G_TREASURY] += distributable - distribution
+            beneficiary = -1
+            for i in range(n):
+                if active[i] and (
+                    beneficiary < 0
+                    or distributions[i] < distributions[beneficiary]
+                    or (distributions[i] == distributions[beneficiary] and rank[i] < rank[beneficiary])
+                ):
+                    beneficiary = i
+            if beneficiary >= 0:
+                distributions[beneficiary] += distribution
+            else:
+                g[G_TREASURY] += distribution
+
+        # Prêts : le plafond dépend du trésor restant après chaque prêt accordé
+        for i in range(n):
+            if active[i] and eligible[i] and _draw(key, month, i, U_LOAN, antithetic) < p_loan[i]:
+                max_possible_loan = min(g[G_TREASURY] * 0.5, params[P_MAX_LOAN])
+                if max_possible_loan <= 0:
+                    continue
+                loan = 0.5 * max_possible_loan + 0.5 * max_possible_loan * _draw(key, month, i, U_LOAN_AMOUNT, antithetic)
+                num_loans[i] += 1
+                debt[i] += loan
+                borrowed[i] += loan
+                g[G_TREASURY] -= loan
+                g[G_OUTSTANDING] += loan
+
+        # Remboursements
+        repayments = 0
+        for i in range(n):
+            if active[i] and debt[i] > 0 and _draw(key, month, i, U_REPAY, antithetic) < p_repay[i]:
+                principal = 0.0
+                if _draw(key, month, i, U_PRINCIPAL, antithetic) > 0.5:
+                    principal = contrib + (debt[i] * 0.2 - contrib) * _draw(key, month, i, U_PRINCIPAL_AMOUNT, antithetic)
+                interest = debt[i] * rate
+                debt[i] -= principal
+                repaid[i] += interest + principal
+                if debt[i] <= 0:
+                    num_loans[i] = 0
+                    debt[i] = 0.0
+                g[G_TREASURY] += interest + principal
+                g[G_OUTSTANDING] -= principal
+                g[G_INTEREST] += interest
+                repayments += 1
+        if repayments > 0 and g[G_OUTSTANDING] > 0:
+            g[G_RECOVERY_RATE] = g[G_INTEREST] / g[G_OUTSTANDING]
+
+        g[G_MONTH] = month + 1
+        g[G_MONTH_IN_CYCLE] = (month + 1) % 12 + 1
+
+        if (month + 1) % 12 == 0:
+            # Départs puis arrivées de fin de cycle
+            for i in range(n):
+                if active[i] and _draw(key, month, i, U_EXIT, antithetic) < min(1.0, p_exit[i] * exit_scale[archetype[i], month]):
+                    active[i] = False
+                    if debt[i] > 0:
+                        g[G_TREASURY] -= max(0.0, contributions[i] - debt[i])
+            num_active = 0
+            for i in range(n):
+                if active[i]:
+                    num_active += 1
+            variation = min(int(_draw(key, month, 0, U_ARRIVAL_VARIATION, antithetic) * 5), 4) - 2
+            arrivals = min(max(0, int(np.rint(num_active * params[P_ARRIVAL])) + variation), num_slots - n)
+            for i in range(n, n + arrivals):
+                active[i] = True
+                eligible_month[i] = g[G_MONTH] + params[P_MIN_MEMBERSHIP]
+                last_payment_month[i] = g[G_MONTH]
+            n += arrivals
+            g[G_CYCLE_CONTRIBUTIONS] = 0.0
+            g[G_CYCLE_DEFAULTS] = 0.0
+            g[G_CYCLE_NUMBER] += 1
+    return n, -1
+
+
+def warm_up():
+    """Compile (or load from numba's cache) the kernel, so that the first replica does not pay for it"""
+    floats = np.zeros(0, dtype=np.float64)
+    ints = np.zeros(0, dtype=np.int64)
+    flags = np.zeros(0, dtype=np.bool_)
+    scales = np.ones((1, 1))
+    random_bits(0, 0, np.arange(1), U_ARRIVAL_CONFIG)
+    with np.errstate(over="ignore"):
+        _run_months(
+            0, 0, 0, 0, stream_key(0), False,
+            flags, ints, floats, floats, ints, ints, ints, floats, floats, floats, flags, ints, ints, ints,
+            floats, floats, floats, floats, scales, scales,
+            np.zeros(9), np.zeros(NUM_GLOBALS), np.zeros(1)
+        )
+
+
+class KernelEngine:
+    """
+    Flat-array engine running the monthly step of TontineExecutor in one compiled loop
+    (numba), with the same sequential semantics: loans are capped by the treasury left after
+    the previous loans, repayments update the treasury in member order, exits and arrivals
+    happen at cycle ends, ties in the distribution order follow the member ids.
+
+    Draws come from the counter-based stream of random_uniforms instead of random.Random, so
+    a seed gives the same distribution of outcomes as the executor, not the same run. The
+    members that may arrive during the horizon are pre-drawn (archetype and uuid) so that
+    the whole horizon runs in a single call. Without numba the same code runs as plain
+    Python, which is slower than the executor: use resolve_engine("auto").
+
+    With antithetic=True the run uses 1 - u for every uniform u of the stream: paired with the
+    plain run of the same seed, it gives negatively correlated outcomes.
+
+    With a scenario, the multiplier paths of the seed are drawn before the run and indexed by
+    the kernel (archetype of the slot, month), so a stress test costs the same as a plain run.
+    """
+
+    MEMBER_FLOATS = ("contributions", "debt", "borrowed", "repaid", "distributions",
+                     "p_default", "p_loan", "p_repay", "p_exit")
+    MEMBER_INTS = ("eligible_month", "num_loans", "missed", "consecutive", "last_payment_month", "rank", "archetype")
+
+    def __init__(
+        self,
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig],
+        seed: int,
+        initial_state: Optional[TontineState] = None,
+        antithetic: bool = False,
+        scenario: Optional[Scenario] = None
+    ):
+        self.tontine_config = tontine_config
+        self.participant_configs = participant_configs
+        self.seed = seed
+        self.antithetic = antithetic
+        self.scenario = scenario
+        self.params = np.array([
+            tontine_config.monthly_contrib,
+            tontine_config.monthly_interest_rate,
+            tontine_config.emergency_fund_percentage,
+            tontine_config.monthly_distribution_percentage,
+            tontine_config.max_loan_amount,
+            tontine_config.min_membership_months,
+            tontine_config.max_simultaneous_loans,
+            tontine_config.num_partipiants_min,
+            tontine_config.arrival_probability,
+        ], dtype=np.float64)
+        self.config_probabilities = np.array([
+            [c.default_probability, c.loan_prob, c.loan_reemboursement_prob, c.exit_probability]
+            for c in participant_configs
+        ], dtype=np.float64)
+        if initial_state is None:
+            from tontine_initializer import TontineInitializer
+            initial_state = TontineInitializer.create_initial_state(tontine_config, participant_configs)
+        self._load_state(initial_state)
+
+    def _load_state(self, state: TontineState):
+        """Flatten a TontineState: every historical member gets a slot, in join order"""
+        members = list(state.historical_participant.values())
+        self.n = len(members)
+        self.ids = np.array([m.id.encode("utf-8") for m in members], dtype=bytes)
+        self.member_archetypes = [m.config.id for m in members]
+        self._allocate(self.n)
+        self.active[:] = [m.id in state.active_participants for m in members]
+        self.eligible_month[:] = [m.eligible_month for m in members]
+        self.last_payment_month[:] = [m.last_payment_month for m in members]
+        self.contributions[:] = [m.total_contributions for m in members]
+        self.debt[:] = [m.current_debt for m in members]
+        self.num_loans[:] = [len(m.active_loans) for m in members]
+        self.missed[:] = [m.missed_payments for m in members]
+        self.consecutive[:] = [m.consecutive_defaults for m in members]
+        self.borrowed[:] = [m.total_borrowed for m in members]
+        self.repaid[:] = [m.total_repaid for m in members]
+        self.distributions[:] = [m.monthly_distributions_received for m in members]
+        self.eligible[:] = [m.is_eligible_for_loan for m in members]
+        self.p_default[:] = [m.config.default_probability for m in members]
+        self.p_loan[:] = [m.config.loan_prob for m in members]
+        self.p_repay[:] = [m.config.loan_reemboursement_prob for m in members]
+        self.p_exit[:] = [m.config.exit_probability for m in members]
+
+        self.g = np.zeros(NUM_GLOBALS, dtype=np.float64)
+        self.g[G_TREASURY] = state.treasury_balance
+        self.g[G_EMERGENCY] = state.emergency_fund
+        self.g[G_OUTSTANDING] = state.total_loans_outstanding
+        self.g[G_CONTRIBUTIONS] = state.total_contributions_received
+        self.g[G_INTEREST] = state.total_interest_earned
+        self.g[G_DEFAULT_RATE] = state.default_rate
+        self.g[G_RECOVERY_RATE] = state.loan_recovery_rate
+        self.g[G_CYCLE_CONTRIBUTIONS] = state.cycle_contributions
+        self.g[G_CYCLE_DEFAULTS] = state.cycle_defaults
+        self.g[G_MONTH] = state.current_month
+        self.g[G_MONTH_IN_CYCLE] = state.month_in_cycle
+        self.g[G_CYCLE_NUMBER] = state.cycle_number
+
+    def _allocate(self, num_slots: int):
+        """(Re)size the member arrays to num_slots slots, keeping the first self.n"""
+        self.active = self._resize(getattr(self, "active", None), num_slots, np.bool_)
+        self.eligible = self._resize(getattr(self, "eligible", None), num_slots, np.bool_)
+        for name in self.MEMBER_FLOATS:
+            setattr(self, name, self._resize(getattr(self, name, None), num_slots, np.float64))
+        for name in self.MEMBER_INTS:
+            setattr(self, name, self._resize(getattr(self, name, None), num_slots, np.int64))
+
+    def _resize(self, array: Optional[np.ndarray], num_slots: int, dtype) -> np.ndarray:
+        resized = np.zeros(num_slots, dtype=dtype)
+        if array is not None:
+            resized[:self.n] = array[:self.n]
+        return resized
+
+    def max_arrivals(self, num_months: int, start_month: int) -> int:
+        """Upper bound of the arrivals over the horizon (every member stays, +2 every cycle end)"""
+        members = self.n
+        for _ in range(num_months // 12 - start_month // 12):
+            members += int(np.rint(members * self.tontine_config.arrival_probability)) + 2
+        return members - self.n
+
+    def _prepare_arrivals(self, num_candidates: int):
+        """Pre-draw the members that may arrive (archetype and id), and rank all ids"""
+        self._allocate(self.n + num_candidates)
+        candidates = np.arange(num_candidates)
+        uniforms = random_uniforms(self.seed, 0, candidates, U_ARRIVAL_CONFIG)
+        if self.antithetic:
+            uniforms = 1.0 - uniforms
+        choices = np.minimum(uniforms * len(self.participant_configs), len(self.participant_configs) - 1).astype(np.int64)
+        slots = slice(self.n, self.n + num_candidates)
+        self.arrival_choices = choices
+        self.p_default[slots] = self.config_probabilities[choices, 0]
+        self.p_loan[slots] = self.config_probabilities[choices, 1]
+        self.p_repay[slots] = self.config_probabilities[choices, 2]
+        self.p_exit[slots] = self.config_probabilities[choices, 3]
+        # Same kind of identifiers as the executor (uuid4): they decide ties in the distribution order
+        self.ids = np.concatenate([self.ids, uuid_strings(
+            random_bits(self.seed, 0, candidates, U_ARRIVAL_ID_HIGH),
+            random_bits(self.seed, 0, candidates, U_ARRIVAL_ID_LOW)
+        )])
+        self.rank[:] = np.argsort(np.argsort(self.ids, kind="stable"), kind="stable")
+
+    def run(self, num_months: int, start_month: int = 0):
+        """Simulate up to month num_months. Return (treasury path from start_month, failure month or None)"""
+        self._prepare_arrivals(self.max_arrivals(num_months, start_month))
+        treasury_path = np.zeros(max(num_months, 1), dtype=np.float64)
+        if self.scenario is not None:
+            paths = self.scenario.paths(self.participant_configs, num_months, self.seed)
+            default_scale, exit_scale = paths.default_scale, paths.exit_scale
+            self.archetype[:self.n] = paths.rows_of(self.member_archetypes)
+            self.archetype[self.n:] = paths.rows_of([c.id for c in self.participant_configs])[self.arrival_choices]
+        else:
+            default_scale = exit_scale = np.ones((1, max(num_months, 1)))
+            self.archetype[:] = 0
+        with np.errstate(over="ignore"):
+            self.n, failed = _run_months(
+                start_month, num_months, self.n, len(self.active), stream_key(self.seed), self.antithetic,
+                self.active, self.eligible_month, self.contributions, self.debt, self.num_loans, self.missed,
+                self.consecutive, self.borrowed, self.repaid, self.distributions, self.eligible,
+                self.last_payment_month, self.rank, self.archetype,
+                self.p_default, self.p_loan, self.p_repay, self.p_exit, default_scale, exit_scale,
+                self.params, self.g, treasury_path
+            )
+        self.ids = self.ids[:self.n]
+        if failed >= 0:
+            return treasury_path[start_month:failed + 1], failed
+        return treasury_path[start_month:num_months], None
+
+
+def run_kernel_replica(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    num_months: int,
+    seed: int,
+    initial_state: Optional[TontineState] = None,
+    start_month: int = 0,
+    antithetic: bool = False,
+    scenario: Optional[Scenario] = None
+):
+    """Kernel counterpart of tontine_batch.run_replica"""
+    from tontine_batch import ReplicaResult
+
+    engine = KernelEngine(tontine_config, participant_configs, seed, initial_state, antithetic, scenario)
+    treasury_path, failure_month = engine.run(num_months, start_month)
+    n, g = engine.n, engine.g
+    return ReplicaResult(
+        seed=seed,
+        months=num_months,
+        failure_month=failure_month,
+        final_treasury=float(g[G_TREASURY]),
+        emergency_fund=float(g[G_EMERGENCY]),
+        total_contributions=float(g[G_CONTRIBUTIONS]),
+        total_interest=float(g[G_INTEREST]),
+        loans_outstanding=float(g[G_OUTSTANDING]),
+        total_distributed=float(engine.distributions[:n].sum()),
+        total_defaults=int(engine.missed[:n].sum()),
+        default_rate=float(g[G_DEFAULT_RATE]),
+        loan_recovery_rate=float(g[G_RECOVERY_RATE]),
+        active_members=int(engine.active[:n].sum()),
+        total_members=n,
+        expected_contributions=float(g[G_EXPECTED_CONTRIBUTIONS]),
+        treasury_path=treasury_path.tolist()
+    )
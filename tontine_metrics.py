@@ -0,0 +1,192 @@
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from tontine_state import TontineState, MonthlyMetrics
+from tontine_report import DownsampledSeries
+
+
+class RollingWindow:
+    """Ring buffer of the last `size` values with a running sum: O(1) push and mean"""
+
+    def __init__(self, size: int):
+        self.values = [0.0] * size
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+
+    def push(self, value: float):
+        if self.count == len(self.values):
+            self.total -= self.values[self.position]
+        else:
+            self.count += 1
+        self.values[self.position] = value
+        self.total += value
+        self.position = (self.position + 1) % len(self.values)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class LogHistogram:
+    """
+    Counts of non-negative values in logarithmic bins (`bins_per_decade` per decade between
+    `low` and `high`), plus a bin for zero, an underflow and an overflow bin. Values can be
+    added and removed in O(1), and quantiles are read with a relative error bounded by the bin width.
+    """
+
+    def __init__(self, low: float = 1.0, high: float = 1e7, bins_per_decade: int = 10):
+        self.low = low
+        self.high = high
+        self.bins_per_decade = bins_per_decade
+        self.num_bins = int(math.ceil(math.log10(high / low) * bins_per_decade))
+        # [zéro, sous le minimum, bins logarithmiques..., au-delà du maximum]
+        self.counts = [0] * (self.num_bins + 3)
+        self.total = 0
+
+    def _bin(self, value: float) -> int:
+        if value <= 0:
+            return 0
+        if value < self.low:
+            return 1
+        if value >= self.high:
+            return self.num_bins + 2
+        return 2 + min(int(math.log10(value / self.low) * self.bins_per_decade), self.num_bins - 1)
+
+    def add(self, value: float, count: int = 1):
+        self.counts[self._bin(value)] += count
+        self.total += count
+
+    def quantile(self, q: float) -> float:
+        """Upper edge of the bin holding the q-quantile (geometric mid-point for log bins)"""
+        if self.total == 0:
+            return 0.0
+        rank = q * (self.total - 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen > rank:
+                break
+        if index == 0:
+            return 0.0
+        if index == 1:
+            return self.low
+        if index == self.num_bins + 2:
+            return self.high
+        return self.low * 10 ** ((index - 2 + 0.5) / self.bins_per_decade)
+
+
+class RiskMetrics:
+    """
+    Risk indicators updated from the monthly metrics streamed by the executor, as an observer.
+
+    Every update costs O(1) per month plus O(1) per member whose debt changed that month:
+    rolling sums live in ring buffers and member debts in a log histogram updated from the
+    (before, after) debt changes. Memory does not grow with the horizon.
+    """
+
+    QUANTILES = {"debt_p50": 0.5, "debt_p90": 0.9, "debt_p99": 0.99}
+
+    SERIES = {
+        "rolling_default_rate": "Taux de défaut glissant",
+        "rolling_net_cash_flow": "Flux de trésorerie net glissant",
+        "drawdown": "Baisse depuis le plus haut du trésor",
+        "emergency_coverage": "Couverture des prêts par le fonds d'urgence",
+        "loan_to_treasury": "Prêts en cours / trésor",
+        "debt_p90": "Dette par membre (90e centile)",
+    }
+
+    def __init__(self, window: int = 12, output_path: Optional[str] = None, max_points: int = 400):
+        self.window = window
+        self.output_path = Path(output_path) if output_path else None
+        self.defaults = RollingWindow(window)
+        self.members_due = RollingWindow(window)
+        self.cash_flow = RollingWindow(window)
+        self.debts: Optional[LogHistogram] = None
+        self.series = {name: DownsampledSeries(max_points) for name in self.SERIES}
+        self.previous_treasury: Optional[float] = None
+        self.peak = float("-inf")
+        self.max_drawdown = 0.0
+        self.max_drawdown_month = -1
+        self.current: Dict[str, float] = {}
+        self.months = 0
+
+    def on_month(self, metrics: MonthlyMetrics, state: TontineState):
+        if self.debts is None:
+            # Premier mois : histogramme construit une fois à partir des membres présents
+            self.debts = LogHistogram()
+            for participant in state.active_participants.values():
+                self.debts.add(participant.current_debt)
+        else:
+            for before, after in metrics.debt_changes:
+                if before is not None:
+                    self.debts.add(before, -1)
+                if after is not None:
+                    self.debts.add(after)
+
+        treasury = metrics.treasury_balance
+        if self.previous_treasury is not None:
+            self.cash_flow.push(treasury - self.previous_treasury)
+        self.previous_treasury = treasury
+        self.defaults.push(metrics.defaults)
+        self.members_due.push(metrics.members_due)
+
+        self.peak = max(self.peak, treasury)
+        drawdown = (self.peak - treasury) / self.peak if self.peak > 0 else 0.0
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+            self.max_drawdown_month = metrics.month
+
+        outstanding = metrics.total_loans_outstanding
+        self.current = {
+            "rolling_default_rate": self.defaults.total / self.members_due.total if self.members_due.total else 0.0,
+            "rolling_net_cash_flow": self.cash_flow.mean(),
+            "drawdown": drawdown,
+            "emergency_coverage": metrics.emergency_fund / outstanding if outstanding > 0 else float("inf"),
+            "loan_to_treasury": outstanding / treasury if treasury > 0 else float("inf"),
+        }
+        for name, q in self.QUANTILES.items():
+            self.current[name] = self.debts.quantile(q)
+        for name in self.SERIES:
+            if math.isfinite(self.current[name]):
+                self.series[name].add(metrics.month, self.current[name])
+        self.months += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current indicators, peak and maximum drawdown, as a JSON-ready dict"""
+        return {
+            "months": self.months,
+            "window": self.window,
+            **{name: (value if math.isfinite(value) else None) for name, value in self.current.items()},
+            "treasury_peak": self.peak if self.months else None,
+            "max_drawdown": self.max_drawdown,
+            "max_drawdown_month": self.max_drawdown_month,
+        }
+
+    def on_simulation_end(self, state: TontineState, failure_month: Optional[int]):
+        if self.output_path is None:
+            return
+        self.output_path.parent.mkdir(exist_ok=True, parents=True)
+        report = self.snapshot()
+        report["series"] = {name: self.series[name].points() for name in self.SERIES}
+        with open(self.output_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    def table_rows(self) -> List[tuple]:
+        """(label, formatted value) rows of the current indicators, for reports"""
+        snapshot = self.snapshot()
+
+        def ratio(value):
+            return "-" if value is None else f"{value:.2f}"
+
+        return [
+            (f"Taux de défaut glissant ({self.window} mois)", f"{snapshot.get('rolling_default_rate', 0.0):.2%}"),
+            (f"Flux net mensuel moyen ({self.window} mois)", f"${snapshot.get('rolling_net_cash_flow', 0.0):.2f}"),
+            ("Baisse actuelle du trésor", f"{snapshot.get('drawdown', 0.0):.2%}"),
+            ("Baisse maximale du trésor", f"{self.max_drawdown:.2%} (mois {self.max_drawdown_month + 1})"),
+            ("Couverture des prêts par le fonds d'urgence", ratio(snapshot.get("emergency_coverage"))),
+            ("Prêts en cours / trésor", ratio(snapshot.get("loan_to_treasury"))),
+            ("Dette par membre p50 / p90 / p99",
+             " / ".join(f"${snapshot.get(name, 0.0):.2f}" for name in self.QUANTILES)),
+        ]
@@ -0,0 +1,271 @@
+import os
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_state import TontineState
+from tontine_initializer import TontineInitializer
+from tontine_executor import TontineExecutor, NullTontineLogger
+from tontine_snapshot import Snapshot, is_snapshot, save_state
+from tontine_batch import (
+    ResultStore, ReplicaResult, canonical_config, config_hash, replica_seed, resolve_engine, run_groups,
+    summarize_results
+)
+
+
+def load_observed_month(path: str) -> pd.DataFrame:
+    """
+    Read one observed month (CSV or Parquet), one row per member.
+
+    Columns: member_id, paid (0/1), and optionally loan_amount (amount lent this month),
+    repaid_amount (amount repaid, interest first), exited (0/1), joined (0/1, new member)
+    with archetype (id of the participant config to use for the new member) and name.
+    """
+    path = Path(path)
+    observations = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path, dtype={"member_id": str})
+    if "member_id" not in observations.columns or "paid" not in observations.columns:
+        raise Exception("Observed month needs at least member_id and paid columns")
+    defaults = {"loan_amount": 0.0, "repaid_amount": 0.0, "exited": 0, "joined": 0}
+    for column, default in defaults.items():
+        if column not in observations.columns:
+            observations[column] = default
+    observations["member_id"] = observations["member_id"].astype(str)
+    return observations.fillna(defaults)
+
+
+class ObservedMonthExecutor(TontineExecutor):
+    """
+    Executor replaying one observed month: contributions, loans, repayments, exits and
+    arrivals come from the observations instead of random draws, while all the accounting
+    (debt, interest, distribution, cycle bookkeeping) is the simulator's own
+    """
+
+    def __init__(
+        self,
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig],
+        state: TontineState,
+        observations: pd.DataFrame
+    ):
+        super().__init__(
+            tontine_config=tontine_config,
+            participant_configs=participant_configs,
+            console=None,
+            initial_state=state,
+            logger=NullTontineLogger(),
+            interactive=False
+        )
+        self.observations = {row.member_id: row for row in observations.itertuples(index=False)}
+        self.overpayments: Dict[str, float] = {}   # Montant remboursé au-delà de la dette et des intérêts, par membre
+        missing = [pid for pid in self.state.active_participants if pid not in self.observations]
+        if missing:
+            raise Exception(f"No observation for active members: {', '.join(missing[:10])}")
+
+    def apply(self, month: int):
+        """Apply the observed month as month number `month` of the tontine"""
+        self.month = month
+        if not self._run_month(month, month + 1, []):
+            raise Exception("The tontine is below its minimum number of participants, nothing to forecast")
+
+    def _process_month(self):
+        super()._process_month()
+        # Real members leave and join any month, not only at cycle ends
+        for participant_id, observation in self.observations.items():
+            if observation.exited and participant_id in self.state.active_participants:
+                self._remove_participant(participant_id)
+        for participant_id, observation in self.observations.items():
+            if observation.joined and participant_id not in self.state.historical_participant:
+                self._add_observed_participant(participant_id, observation)
+
+    def _collect_contributions(self):
+        total_collected = 0.0
+        self.monthly_defaults = []
+        for participant_id, participant in list(self.state.active_participants.items()):
+            if self.observations[participant_id].paid:
+                total_collected += self._record_payment(participant)
+            else:
+                self._record_default(participant)
+        self.state.total_contributions_received += total_collected
+        self.state.cycle_contributions += total_collected
+        self.monthly_total_collected = total_collected
+        return total_collected
+
+    def _process_loan_requests(self):
+        for participant_id, participant in self.state.active_participants.items():
+            loan_amount = float(self.observations[participant_id].loan_amount)
+            if loan_amount > 0:
+                self._issue_loan(participant, loan_amount)
+
+    def _process_loan_repayments(self):
+        for participant_id, participant in self.state.active_participants.items():
+            repaid_amount = float(self.observations[participant_id].repaid_amount)
+            if repaid_amount > 0:
+                # Intérêts d'abord, puis le capital dans la limite de la dette ; le surplus n'est pas comptabilisé
+                interest_amount = min(repaid_amount, participant.current_debt * self.tontine_config.monthly_interest_rate)
+                principal_repayment = min(repaid_amount - interest_amount, participant.current_debt)
+                if repaid_amount - interest_amount > principal_repayment:
+                    self.overpayments[participant_id] = repaid_amount - interest_amount - principal_repayment
+                self._apply_repayment(participant, principal_repayment, interest_amount)
+
+    def _process_exits(self, month: int, num_months: int) -> List[str]:
+        return []
+
+    def _process_arrivals(self, num_months: int) -> List[str]:
+        return []
+
+    def _add_observed_participant(self, participant_id: str, observation):
+        archetype = str(getattr(observation, "archetype", ""))
+        template = next((c for c in self.participant_configs if c.id == archetype), self.participant_configs[0])
+        ref_config = template.clone()
+        ref_config.id = participant_id
+        ref_config.name = str(getattr(observation, "name", "") or f"Participant {self.state.total_participants_history+1}")
+        self._add_new_participant(self.month + 1, participant_id=participant_id, ref_config=ref_config)
+        self.state.historical_participant[participant_id] = self.state.active_participants[participant_id]
+
+
+class Nowcaster:
+    """
+    Persisted tontine state updated one real month at a time, with Monte Carlo forecasts
+    projected forward from it.
+
+    Forecast replicas start from the persisted state instead of create_initial_state and only
+    simulate the months ahead. Each replica is cached under (state key, horizon, engine, seed), where the
+    state key chains the configuration and the digests of every ingested month: re-running a
+    forecast whose inputs have not changed is served from the cache.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig],
+        state: TontineState,
+        month: int = 0,
+        inputs: Optional[List[str]] = None
+    ):
+        self.path = Path(path)
+        self.tontine_config = tontine_config
+        self.participant_configs = participant_configs
+        self.state = state
+        self.month = month                # Nombre de mois réels déjà intégrés
+        self.inputs = inputs or []        # Empreintes des mois intégrés, dans l'ordre
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig]
+    ) -> "Nowcaster":
+        state = TontineInitializer.create_initial_state(tontine_config, participant_configs)
+        nowcaster = cls(path, tontine_config, participant_configs, state)
+        nowcaster.save()
+        return nowcaster
+
+    @classmethod
+    def load(cls, path: str) -> "Nowcaster":
+        if not is_snapshot(path):
+            # Les anciens fichiers pickle contiennent des états dont les champs ont changé depuis
+            raise Exception(f"Unsupported legacy nowcast state format: {path} is not a snapshot directory; "
+                            "remove it to start again from the configuration")
+        snapshot = Snapshot(path)
+        metadata = snapshot.metadata
+        tontine_config, participant_configs = TontineInitializer.parse_config(metadata["config"])
+        state = snapshot.state(participant_configs)
+        return cls(path, tontine_config, participant_configs, state, metadata["month"], metadata["inputs"])
+
+    def save(self):
+        """Persist the state as a snapshot directory, with the configuration and ingested months in its header"""
+        save_state(self.path, self.state, {
+            "config": TontineInitializer.dump_config(self.tontine_config, self.participant_configs),
+            "month": self.month,
+            "inputs": self.inputs,
+        })
+
+    @property
+    def state_key(self) -> str:
+        return config_hash(canonical_config(self.tontine_config, self.participant_configs), self.inputs)
+
+    def ingest(self, observations: pd.DataFrame) -> Dict[str, float]:
+        """
+        Apply one real month to the persisted state. Return the repayments in excess of the
+        debt and interest due, by member: they are not booked
+        """
+        digest = config_hash(observations.sort_values("member_id").to_json(orient="records"))
+        executor = ObservedMonthExecutor(self.tontine_config, self.participant_configs, self.state, observations)
+        executor.apply(self.month)
+        self.month += 1
+        self.inputs.append(digest)
+        self.save()
+        return executor.overpayments
+
+    def forecast(
+        self,
+        horizon: int,
+        replicas: int = 200,
+        seed: int = 0,
+        store: Optional[ResultStore] = None,
+        workers: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        engine: str = "auto"
+    ) -> Dict[str, Any]:
+        """Project `horizon` months ahead from the current state"""
+        num_months = self.month + horizon
+        engine = resolve_engine(engine)
+        state_key = self.state_key
+        seeds = [replica_seed(seed, index) for index in range(replicas)]
+
+        results: Dict[int, ReplicaResult] = {}
+        missing = []
+        for replica in seeds:
+            cached = store.get(config_hash(state_key, horizon, engine, replica)) if store is not None else None
+            if cached is not None:
+                results[replica] = ReplicaResult(**cached)
+            else:
+                missing.append(replica)
+
+        chunk = max(1, -(-len(missing) // (4 * (workers or os.cpu_count() or 1))))
+        groups = [
+            (self.tontine_config, self.participant_configs, num_months, missing[i:i + chunk], self.state, self.month, engine)
+            for i in range(0, len(missing), chunk)
+        ]
+        completed = 0
+
+        def on_group(index: int, group_results: List[ReplicaResult]):
+            nonlocal completed
+            for result in group_results:
+                results[result.seed] = result
+                if store is not None:
+                    store.put(config_hash(state_key, horizon, engine, result.seed), asdict(result))
+            completed += 1
+            if on_progress is not None:
+                on_progress(completed, len(groups))
+
+        run_groups(groups, workers=workers, on_group=on_group)
+        ordered = [results[replica] for replica in seeds]
+
+        paths = np.array([
+            r.treasury_path + [r.treasury_path[-1]] * (horizon - len(r.treasury_path))
+            for r in ordered if r.treasury_path
+        ])
+        failures_by_month = np.zeros(horizon, dtype=int)
+        for r in ordered:
+            if r.failed:
+                failures_by_month[r.failure_month - self.month] += 1
+
+        return {
+            "month": self.month,
+            "horizon": horizon,
+            "computed_replicas": len(missing),
+            "summary": summarize_results(ordered),
+            "cumulative_failure_probability": (np.cumsum(failures_by_month) / len(ordered)).tolist(),
+            "treasury_quantiles": {
+                "p05": np.quantile(paths, 0.05, axis=0).tolist() if len(paths) else [],
+                "p50": np.quantile(paths, 0.50, axis=0).tolist() if len(paths) else [],
+                "p95": np.quantile(paths, 0.95, axis=0).tolist() if len(paths) else [],
+            },
+        }
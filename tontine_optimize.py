@@ -0,0 +1,210 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_batch import ReplicaResult, ResultStore, evaluate_configs, replica_seed
+from tontine_scenarios import Scenario
+from tontine_sensitivity import INTEGER_FIELDS, PARTICIPANT_PREFIX, SensitivityParameter, apply_parameters, unit_sample
+
+
+def default_policy_parameters(tontine_config: TontineConfig) -> List[SensitivityParameter]:
+    """Rules of the tontine tuned by the optimizer, with reasonable ranges around a base configuration"""
+    return [
+        SensitivityParameter("emergency_fund_percentage", 0.0, 0.3),
+        SensitivityParameter("monthly_distribution_percentage", 0.2, 0.9),
+        SensitivityParameter("max_loan_amount", 0.5 * tontine_config.max_loan_amount, 2.0 * tontine_config.max_loan_amount),
+        SensitivityParameter("min_membership_months", 1, 12),
+    ]
+
+
+@dataclass
+class Candidate:
+    """Configuration evaluated by the optimizer, with the replicas run so far"""
+    values: np.ndarray
+    origin: str                      # "base", "sample" ou "refined"
+    config: Tuple[TontineConfig, List[IndividualParticipantConfig]]
+    results: List[ReplicaResult] = field(default_factory=list)
+
+    @property
+    def failure_probability(self) -> float:
+        return float(np.mean([r.failed for r in self.results]))
+
+    @property
+    def payouts(self) -> np.ndarray:
+        """Distributions received per member over the horizon, replica by replica"""
+        return np.array([r.total_distributed / max(r.total_members, 1) for r in self.results])
+
+    def describe(self, parameters: List[SensitivityParameter]) -> Dict[str, Any]:
+        replicas = len(self.results)
+        failure = self.failure_probability
+        payouts = self.payouts
+        return {
+            "values": {
+                p.name: int(value) if p.name in INTEGER_FIELDS else float(value)
+                for p, value in zip(parameters, self.values)
+            },
+            "origin": self.origin,
+            "replicas": replicas,
+            "failure_probability": failure,
+            "failure_std_error": float(np.sqrt(failure * (1 - failure) / replicas)),
+            "member_payout": float(payouts.mean()),
+            "payout_std_error": float(payouts.std(ddof=1) / np.sqrt(replicas)) if replicas > 1 else 0.0,
+        }
+
+
+class PolicyOptimizer:
+    """
+    Search of the tontine rules that minimise the failure probability while members receive at
+    least `target_payout` (distributions per member over the horizon; by default, what the base
+    configuration pays).
+
+    Successive halving: every candidate of a quasi-random sample is first evaluated with few
+    replicas, then each round keeps the best 1/eta candidates, adds a few candidates drawn around
+    the best ones (in a neighbourhood that shrinks each round) and multiplies the replicas by eta,
+    so that most simulations go to the promising region. All candidates share the same replica
+    seeds, which makes their comparison much less noisy, and replicas are only run for the seeds a
+    candidate does not have yet. Through the result store, a resumed or extended search only
+    computes what is new. The base configuration is kept to the end as a reference.
+    """
+
+    def __init__(
+        self,
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig],
+        parameters: Optional[List[SensitivityParameter]] = None,
+        num_months: int = 36,
+        replicas: int = 20,
+        max_replicas: Optional[int] = None,
+        eta: int = 3,
+        target_payout: Optional[float] = None,
+        seed: int = 0,
+        sampler: str = "lhs",
+        store: Optional[ResultStore] = None,
+        workers: Optional[int] = None,
+        engine: str = "auto",
+        scenario: Optional[Scenario] = None
+    ):
+        if eta < 2:
+            raise Exception("The halving factor eta must be at least 2")
+        self.tontine_config = tontine_config
+        self.participant_configs = participant_configs
+        self.parameters = parameters or default_policy_parameters(tontine_config)
+        self.num_months = num_months
+        self.replicas = replicas
+        self.max_replicas = max_replicas or replicas * eta ** 3
+        self.eta = eta
+        self.target_payout = target_payout
+        self.seed = seed
+        self.sampler = sampler
+        self.store = store
+        self.workers = workers
+        self.engine = engine
+        self.scenario = scenario
+        self.low = np.array([p.low for p in self.parameters], dtype=float)
+        self.high = np.array([p.high for p in self.parameters], dtype=float)
+        self.rng = np.random.default_rng([seed, 1])
+
+    def _candidate(self, unit: np.ndarray, origin: str) -> Candidate:
+        values = self.low + (self.high - self.low) * np.clip(unit, 0.0, 1.0)
+        for index, parameter in enumerate(self.parameters):
+            if parameter.name in INTEGER_FIELDS:
+                values[index] = round(values[index])
+        config = apply_parameters(self.tontine_config, self.participant_configs, self.parameters, values)
+        return Candidate(values, origin, config)
+
+    def _base(self) -> Candidate:
+        # Les paramètres participants.* sont des multiplicateurs : la configuration de base vaut 1
+        values = np.array([
+            1.0 if p.name.startswith(PARTICIPANT_PREFIX) else getattr(self.tontine_config, p.name)
+            for p in self.parameters
+        ], dtype=float)
+        return Candidate(values, "base", (self.tontine_config, self.participant_configs))
+
+    def _refine(self, parents: List[Candidate], count: int, scale: float) -> List[Candidate]:
+        """New candidates drawn around the parents, in the unit cube of the parameter ranges"""
+        span = np.where(self.high > self.low, self.high - self.low, 1.0)
+        candidates = []
+        for index in range(count):
+            unit = (parents[index % len(parents)].values - self.low) / span
+            candidates.append(self._candidate(unit + self.rng.normal(0.0, scale, len(unit)), "refined"))
+        return candidates
+
+    def _evaluate(self, candidates: List[Candidate], replicas: int, on_progress: Optional[Callable[[int, int], None]]) -> int:
+        """Extend every candidate to `replicas` replicas; return the number of replicas run or read from the cache"""
+        seeds = [replica_seed(self.seed, index) for index in range(replicas)]
+        by_count: Dict[int, List[Candidate]] = {}
+        for candidate in candidates:
+            if len(candidate.results) < replicas:
+                by_count.setdefault(len(candidate.results), []).append(candidate)
+        evaluated = 0
+        for count, group in by_count.items():
+            results = evaluate_configs(
+                [candidate.config for candidate in group], self.num_months, seeds[count:],
+                store=self.store, workers=self.workers, on_progress=on_progress, engine=self.engine,
+                scenario=self.scenario
+            )
+            for candidate, new_results in zip(group, results):
+                candidate.results.extend(new_results)
+            evaluated += len(group) * (replicas - count)
+        return evaluated
+
+    def _rank(self, candidates: List[Candidate], target: float) -> List[Candidate]:
+        """Feasible candidates first by failure probability (then higher payout), the others by payout"""
+        def key(candidate: Candidate):
+            payout = float(candidate.payouts.mean())
+            if payout >= target:
+                return (0, candidate.failure_probability, -payout)
+            return (1, -payout, candidate.failure_probability)
+
+        return sorted(candidates, key=key)
+
+    def run(
+        self,
+        num_candidates: int,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        on_round: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        dimension = len(self.parameters)
+        base = self._base()
+        unit = unit_sample(num_candidates, dimension, seed=self.seed, sampler=self.sampler)
+        alive = [self._candidate(row, "sample") for row in unit]
+        replicas = self.replicas
+        rounds = []
+        evaluations = 0
+        scale = 0.1
+
+        while True:
+            evaluations += self._evaluate(alive + [base], replicas, on_progress)
+            target = self.target_payout if self.target_payout is not None else float(base.payouts.mean())
+            ranked = self._rank(alive, target)
+            round_summary = {
+                "round": len(rounds),
+                "candidates": len(alive),
+                "replicas": replicas,
+                "target_payout": target,
+                "best": ranked[0].describe(self.parameters),
+            }
+            rounds.append(round_summary)
+            if on_round is not None:
+                on_round(round_summary)
+
+            keep = len(alive) // self.eta
+            if keep < 1 or replicas * self.eta > self.max_replicas:
+                break
+            survivors = ranked[:keep]
+            alive = survivors + self._refine(survivors, max(1, keep // 2), scale)
+            replicas *= self.eta
+            scale /= 2
+
+        return {
+            "parameters": [p.name for p in self.parameters],
+            "months": self.num_months,
+            "target_payout": target,
+            "evaluations": evaluations,
+            "rounds": rounds,
+            "best": ranked[0].describe(self.parameters),
+            "base": base.describe(self.parameters),
+            "ranking": [candidate.describe(self.parameters) for candidate in ranked],
+        }
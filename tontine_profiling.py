@@ -0,0 +1,237 @@
+import gc
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+from html import escape
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sized
+
+from tontine_state import TontineState, MonthlyMetrics
+from tontine_report import DownsampledSeries, StreamingReport
+
+try:
+    import resource
+except ImportError:  # resource n'existe pas sous Windows : pas de RSS maximal
+    resource = None
+
+
+# Sous-système d'une allocation, d'après le fichier du cadre le plus récent qui en relève
+SUBSYSTEMS = (
+    ("tontine_executor.py", "executor"),
+    ("tontine_state.py", "state"),
+    ("tontine_initializer.py", "state"),
+    ("tontine_config.py", "state"),
+    ("tontine_report.py", "observers"),
+    ("tontine_metrics.py", "observers"),
+    ("tontine_trajectory.py", "observers"),
+    ("tontine_profiling.py", "profiler"),
+    (f"{os.sep}rich{os.sep}", "console (rich)"),
+    (f"{os.sep}matplotlib{os.sep}", "matplotlib"),
+)
+
+# Types dont le nombre d'instances est toujours suivi (les renderables rich sont regroupés par type)
+TRACKED_TYPES = ("ParticipantState", "IndividualParticipantConfig", "ParticipantStatus", "TontineState")
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of the process in bytes (Linux), or the peak RSS elsewhere when available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    return None
+
+
+def subsystem_of(traceback: tracemalloc.Traceback) -> str:
+    for frame in reversed(traceback):
+        for marker, subsystem in SUBSYSTEMS:
+            if marker in frame.filename:
+                return subsystem
+    return "other"
+
+
+class MemoryProfiler:
+    """
+    Opt-in memory profile of a simulation, as an executor observer.
+
+    Every `interval` months it takes a tracemalloc snapshot and attributes the traced memory
+    to subsystems (executor, state, observers, rich console, matplotlib...), using the most
+    recent frame of each allocation that belongs to one of them. It also counts live objects
+    per type with the garbage collector, and measures the size of the state containers, of
+    the containers registered with watch() and the process RSS. The timeline is written as
+    JSON and as an HTML report, with the allocation sites that grew most since the first sample.
+
+    Snapshots and object counts cost time proportional to the heap: use an interval of several
+    months on long runs.
+    """
+
+    def __init__(self, interval: int, output_path: str, frames: int = 3, top: int = 15, max_points: int = 400):
+        if interval < 1:
+            raise Exception("The profiling interval must be at least one month")
+        self.interval = interval
+        self.output_path = Path(output_path)
+        self.top = top
+        self.max_points = max_points
+        self.watched: Dict[str, Sized] = {}
+        self.samples: List[Dict[str, Any]] = []
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.last: Optional[tracemalloc.Snapshot] = None
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(frames)
+        self.started = time.perf_counter()
+
+    def watch(self, name: str, container: Sized):
+        """Record len(container) at every sample, e.g. the executor's recap or the console record buffer"""
+        self.watched[name] = container
+
+    def on_month(self, metrics: MonthlyMetrics, state: TontineState):
+        if self.baseline is None or (metrics.month + 1) % self.interval == 0:
+            self._sample(metrics.month, state)
+
+    def on_simulation_end(self, state: TontineState, failure_month: Optional[int]):
+        # Dernier mois simulé, s'il n'a pas déjà été échantillonné
+        if not self.samples or self.samples[-1]["month"] != state.current_month - 1:
+            self._sample(state.current_month - 1, state)
+        if self.started_tracing:
+            tracemalloc.stop()
+        self.output_path.parent.mkdir(exist_ok=True, parents=True)
+        report = self.report()
+        with open(self.output_path.with_suffix(".json"), "w") as f:
+            json.dump(report, f, indent=2)
+        with open(self.output_path.with_suffix(".html"), "w", encoding="utf-8") as out:
+            self._write_html(out, report)
+
+    def _sample(self, month: int, state: TontineState):
+        started = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot()
+        subsystems: Counter = Counter()
+        for statistic in snapshot.statistics("traceback"):
+            subsystems[subsystem_of(statistic.traceback)] += statistic.size
+
+        types: Counter = Counter()
+        for obj in gc.get_objects():
+            cls = type(obj)
+            # Certains types exposent __module__ sous forme de descripteur, pas de chaîne
+            module = getattr(cls, "__module__", None)
+            if isinstance(module, str) and module.startswith("rich."):
+                types[f"rich.{cls.__name__}"] += 1
+            else:
+                types[cls.__name__] += 1
+
+        containers = {
+            "historical_participant": len(state.historical_participant),
+            "active_participants": len(state.active_participants),
+            "round_robin_history": len(state.round_robin_history),
+            "monthly_distribution_history": len(getattr(state, "monthly_distribution_history", [])),
+        }
+        for name, container in self.watched.items():
+            containers[name] = len(container)
+
+        traced, peak = tracemalloc.get_traced_memory()
+        self.samples.append({
+            "month": month,
+            "elapsed": time.perf_counter() - self.started,
+            "rss": current_rss(),
+            "traced": traced,
+            "traced_peak": peak,
+            "subsystems": dict(subsystems),
+            "containers": containers,
+            "objects": {name: types.get(name, 0) for name in TRACKED_TYPES},
+            "rich_objects": sum(count for name, count in types.items() if name.startswith("rich.")),
+            "top_types": dict(types.most_common(self.top)),
+            "sample_seconds": time.perf_counter() - started,
+        })
+        if self.baseline is None:
+            self.baseline = snapshot
+        self.last = snapshot
+
+    def report(self) -> Dict[str, Any]:
+        """Timeline of the samples, growth by subsystem and allocation sites that grew most"""
+        if not self.samples:
+            return {"interval": self.interval, "samples": []}
+        first, last = self.samples[0], self.samples[-1]
+        growth = {
+            name: last["subsystems"].get(name, 0) - first["subsystems"].get(name, 0)
+            for name in sorted(set(first["subsystems"]) | set(last["subsystems"]))
+        }
+        sites = []
+        if self.baseline is not None and self.last is not None:
+            for statistic in self.last.compare_to(self.baseline, "lineno")[:self.top]:
+                frame = statistic.traceback[-1]
+                sites.append({
+                    "site": f"{frame.filename}:{frame.lineno}",
+                    "size": statistic.size,
+                    "size_diff": statistic.size_diff,
+                    "count_diff": statistic.count_diff,
+                })
+        first_types, last_types = first["top_types"], last["top_types"]
+        return {
+            "interval": self.interval,
+            "samples": self.samples,
+            "subsystem_growth": dict(sorted(growth.items(), key=lambda item: -item[1])),
+            "object_growth": {
+                name: last_types[name] - first_types.get(name, 0)
+                for name in last_types if last_types[name] != first_types.get(name, 0)
+            },
+            "growing_sites": sites,
+        }
+
+    def _write_html(self, out, report: Dict[str, Any]):
+        out.write(
+            "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Profil mémoire</title><style>"
+            "body{font-family:sans-serif;margin:2em;color:#222}table{border-collapse:collapse;margin:1em 0}"
+            "td,th{border:1px solid #ccc;padding:4px 8px;text-align:right}th{background:#eef}"
+            "td:first-child{text-align:left}svg{background:#fafafa}"
+            "</style></head><body>\n"
+        )
+        samples = report["samples"]
+        out.write(f"<h1>Profil mémoire</h1><p>{len(samples)} échantillons, un tous les {self.interval} mois.</p>\n")
+        if not samples:
+            out.write("</body></html>\n")
+            return
+
+        def megabytes(size: Optional[int]) -> str:
+            return "-" if size is None else f"{size / 1e6:.2f} Mo"
+
+        StreamingReport._write_table(out, "Croissance par sous-système", ["Sous-système", "Début", "Fin", "Croissance"], [
+            (escape(name), megabytes(samples[0]["subsystems"].get(name, 0)), megabytes(samples[-1]["subsystems"].get(name, 0)),
+             megabytes(size))
+            for name, size in report["subsystem_growth"].items()
+        ])
+        StreamingReport._write_table(out, "Allocations en plus forte croissance", ["Ligne", "Taille", "Croissance", "Blocs"], [
+            (escape(site["site"]), megabytes(site["size"]), megabytes(site["size_diff"]), f"{site['count_diff']:+d}")
+            for site in report["growing_sites"]
+        ])
+        StreamingReport._write_table(out, "Objets en plus forte croissance", ["Type", "Croissance"], [
+            (escape(name), f"{count:+d}") for name, count in sorted(report["object_growth"].items(), key=lambda item: -item[1])
+        ])
+        StreamingReport._write_table(
+            out, "Chronologie",
+            ["Mois", "RSS", "Mémoire tracée", *samples[0]["containers"], *TRACKED_TYPES, "Objets rich", "Durée (s)"],
+            [
+                (str(s["month"] + 1), megabytes(s["rss"]), megabytes(s["traced"]),
+                 *(str(count) for count in s["containers"].values()),
+                 *(str(s["objects"][name]) for name in TRACKED_TYPES),
+                 str(s["rich_objects"]), f"{s['sample_seconds']:.2f}")
+                for s in samples
+            ]
+        )
+
+        out.write("<h2>Évolution</h2>\n")
+        charts = {"RSS (octets)": lambda s: s["rss"] or 0, "Mémoire tracée (octets)": lambda s: s["traced"]}
+        for name in report["subsystem_growth"]:
+            charts[f"Mémoire tracée : {name}"] = lambda s, name=name: s["subsystems"].get(name, 0)
+        for title, value in charts.items():
+            series = DownsampledSeries(self.max_points)
+            for sample in samples:
+                series.add(sample["month"], float(value(sample)))
+            out.write(f"<h3>{escape(title)}</h3>\n")
+            StreamingReport._write_chart(out, series)
+        out.write("</body></html>\n")
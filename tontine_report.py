@@ -0,0 +1,240 @@
+import heapq
+from collections import deque
+from html import escape
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, TextIO, Tuple
+
+from tontine_state import TontineState, ParticipantState, MonthlyMetrics
+
+if TYPE_CHECKING:
+    from tontine_metrics import RiskMetrics
+
+
+class DownsampledSeries:
+    """
+    Time series kept in at most max_points buckets (first month, last month, count, sum, min, max).
+    When the buckets are full, adjacent pairs are merged and the bucket width doubles, so memory
+    stays bounded whatever the horizon while min/max envelopes are preserved.
+    """
+
+    def __init__(self, max_points: int = 400):
+        self.max_points = max_points
+        self.width = 1
+        self.buckets: List[List[float]] = []
+
+    def add(self, month: int, value: float):
+        if self.buckets and self.buckets[-1][2] < self.width:
+            bucket = self.buckets[-1]
+            bucket[1] = month
+            bucket[2] += 1
+            bucket[3] += value
+            bucket[4] = min(bucket[4], value)
+            bucket[5] = max(bucket[5], value)
+        else:
+            self.buckets.append([month, month, 1, value, value, value])
+            if len(self.buckets) > self.max_points:
+                self._compact()
+
+    def _compact(self):
+        merged = []
+        for i in range(0, len(self.buckets), 2):
+            first = self.buckets[i]
+            if i + 1 < len(self.buckets):
+                second = self.buckets[i + 1]
+                first = [first[0], second[1], first[2] + second[2], first[3] + second[3],
+                         min(first[4], second[4]), max(first[5], second[5])]
+            merged.append(first)
+        self.buckets = merged
+        self.width *= 2
+
+    def points(self) -> List[Tuple[float, float, float, float]]:
+        """(centre month, mean, min, max) of every bucket"""
+        return [((b[0] + b[1]) / 2, b[3] / b[2], b[4], b[5]) for b in self.buckets]
+
+
+class StreamingReport:
+    """
+    Simulation report built from the monthly metrics streamed by the executor, as an observer.
+
+    Holds aggregate tables, downsampled time series and the recent cycles only, then writes
+    a self-contained HTML file (inline SVG charts, top-N participant tables) in a single pass
+    at the end of the run. Memory does not grow with the horizon, unlike recording every
+    rendered line with Console(record=True).
+    """
+
+    SERIES = {
+        "treasury_balance": "Trésor",
+        "emergency_fund": "Fonds d'urgence",
+        "total_loans_outstanding": "Prêts en cours",
+        "active_participants": "Membres actifs",
+        "default_rate": "Taux de défaut",
+        "collected": "Cotisations collectées",
+    }
+
+    TOP_TABLES: Dict[str, Callable[[ParticipantState], float]] = {
+        "Plus fortes dettes": lambda p: p.current_debt,
+        "Plus fortes cotisations": lambda p: p.total_contributions,
+        "Plus fortes distributions reçues": lambda p: p.monthly_distributions_received,
+        "Plus gros emprunteurs": lambda p: p.total_borrowed,
+    }
+
+    def __init__(
+        self,
+        output_path: str,
+        max_points: int = 400,
+        top_n: int = 10,
+        recent_cycles: int = 24,
+        risk_metrics: Optional["RiskMetrics"] = None
+    ):
+        self.output_path = Path(output_path)
+        self.risk_metrics = risk_metrics
+        self.top_n = top_n
+        self.series = {name: DownsampledSeries(max_points) for name in self.SERIES}
+        self.cycles: deque = deque(maxlen=recent_cycles)
+        self.current_cycle: Optional[Dict[str, float]] = None
+        self.totals = {"months": 0, "collected": 0.0, "defaults": 0, "exits": 0, "arrivals": 0, "debt_refunded": 0.0}
+        self.treasury_low: Tuple[float, int] = (float("inf"), -1)
+        self.treasury_high: Tuple[float, int] = (float("-inf"), -1)
+
+    def on_month(self, metrics: MonthlyMetrics, state: TontineState):
+        for name in self.SERIES:
+            self.series[name].add(metrics.month, float(getattr(metrics, name)))
+
+        self.totals["months"] += 1
+        self.totals["collected"] += metrics.collected
+        self.totals["defaults"] += metrics.defaults
+        self.totals["exits"] += metrics.exits
+        self.totals["arrivals"] += metrics.arrivals
+        self.totals["debt_refunded"] += metrics.debt_refunded
+        self.treasury_low = min(self.treasury_low, (metrics.treasury_balance, metrics.month))
+        self.treasury_high = max(self.treasury_high, (metrics.treasury_balance, metrics.month))
+
+        # Metrics are emitted after cycle-end processing, so the cycle number may already be the next one
+        cycle = metrics.month // 12 + 1
+        if self.current_cycle is None or self.current_cycle["cycle"] != cycle:
+            if self.current_cycle is not None:
+                self.cycles.append(self.current_cycle)
+            self.current_cycle = {"cycle": cycle, "collected": 0.0, "defaults": 0, "exits": 0, "arrivals": 0}
+        self.current_cycle["collected"] += metrics.collected
+        self.current_cycle["defaults"] += metrics.defaults
+        self.current_cycle["exits"] += metrics.exits
+        self.current_cycle["arrivals"] += metrics.arrivals
+        self.current_cycle["treasury"] = metrics.treasury_balance
+        self.current_cycle["active"] = metrics.active_participants
+
+    def on_simulation_end(self, state: TontineState, failure_month: Optional[int]):
+        if self.current_cycle is not None:
+            self.cycles.append(self.current_cycle)
+            self.current_cycle = None
+        self.output_path.parent.mkdir(exist_ok=True, parents=True)
+        with open(self.output_path, "w", encoding="utf-8") as out:
+            self._write(out, state, failure_month)
+
+    def _write(self, out: TextIO, state: TontineState, failure_month: Optional[int]):
+        status = (
+            f"<span class='bad'>Faillite au mois {failure_month + 1}</span>" if failure_month is not None
+            else "<span class='good'>Simulation terminée</span>"
+        )
+        out.write(
+            "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Simulation de tontine</title><style>"
+            "body{font-family:sans-serif;margin:2em;color:#222}table{border-collapse:collapse;margin:1em 0}"
+            "td,th{border:1px solid #ccc;padding:4px 8px;text-align:right}th{background:#eef}"
+            "td:first-child{text-align:left}.good{color:#080}.bad{color:#c00}svg{background:#fafafa}"
+            "</style></head><body>\n"
+        )
+        out.write(f"<h1>Simulation de tontine</h1><p>{status} après {self.totals['months']} mois.</p>\n")
+
+        self._write_table(out, "Synthèse", ["Indicateur", "Valeur"], [
+            ("Trésor final", f"${state.treasury_balance:.2f}"),
+            ("Fonds d'urgence", f"${state.emergency_fund:.2f}"),
+            ("Prêts en cours", f"${state.total_loans_outstanding:.2f}"),
+            ("Cotisations totales", f"${state.total_contributions_received:.2f}"),
+            ("Intérêts perçus", f"${state.total_interest_earned:.2f}"),
+            ("Taux de défaut", f"{state.default_rate:.2%}"),
+            ("Taux de recouvrement", f"{state.loan_recovery_rate:.2%}"),
+            ("Membres actifs", str(len(state.active_participants))),
+            ("Membres (historique)", str(state.total_participants_history)),
+            ("Cotisations manquées", str(self.totals["defaults"])),
+            ("Départs / arrivées", f"{self.totals['exits']} / {self.totals['arrivals']}"),
+            ("Montants rendus aux sortants", f"${self.totals['debt_refunded']:.2f}"),
+            ("Trésor minimal", f"${self.treasury_low[0]:.2f} (mois {self.treasury_low[1] + 1})" if self.totals["months"] else "-"),
+            ("Trésor maximal", f"${self.treasury_high[0]:.2f} (mois {self.treasury_high[1] + 1})" if self.totals["months"] else "-"),
+        ])
+
+        if self.risk_metrics is not None:
+            self._write_table(out, "Indicateurs de risque", ["Indicateur", "Valeur"], self.risk_metrics.table_rows())
+
+        out.write("<h2>Évolution</h2>\n")
+        for name, title in self.SERIES.items():
+            out.write(f"<h3>{escape(title)}</h3>\n")
+            self._write_chart(out, self.series[name])
+        if self.risk_metrics is not None:
+            for name, title in self.risk_metrics.SERIES.items():
+                out.write(f"<h3>{escape(title)}</h3>\n")
+                self._write_chart(out, self.risk_metrics.series[name])
+
+        self._write_table(
+            out, f"Derniers cycles ({len(self.cycles)})",
+            ["Cycle", "Cotisations", "Défauts", "Départs", "Arrivées", "Trésor fin", "Membres actifs"],
+            [
+                (str(c["cycle"]), f"${c['collected']:.2f}", str(c["defaults"]), str(c["exits"]),
+                 str(c["arrivals"]), f"${c['treasury']:.2f}", str(c["active"]))
+                for c in self.cycles
+            ]
+        )
+
+        participants = state.historical_participant.values()
+        for title, key in self.TOP_TABLES.items():
+            top = heapq.nlargest(self.top_n, participants, key=key)
+            self._write_table(
+                out, f"{title} (top {self.top_n})",
+                ["Participant", "Statut", "Cotisations", "Distributions", "Dette", "Emprunté", "Remboursé", "Défauts"],
+                [
+                    (escape(p.config.name), p.status.value, f"${p.total_contributions:.2f}",
+                     f"${p.monthly_distributions_received:.2f}", f"${p.current_debt:.2f}",
+                     f"${p.total_borrowed:.2f}", f"${p.total_repaid:.2f}", str(p.missed_payments))
+                    for p in top
+                ]
+            )
+        out.write("</body></html>\n")
+
+    @staticmethod
+    def _write_table(out: TextIO, title: str, header: List[str], rows):
+        out.write(f"<h2>{escape(title)}</h2><table><tr>")
+        out.write("".join(f"<th>{escape(column)}</th>" for column in header))
+        out.write("</tr>\n")
+        for row in rows:
+            out.write("<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>\n")
+        out.write("</table>\n")
+
+    @staticmethod
+    def _write_chart(out: TextIO, series: DownsampledSeries, width: int = 800, height: int = 160):
+        points = series.points()
+        if not points:
+            out.write("<p>-</p>\n")
+            return
+        x_low, x_high = points[0][0], points[-1][0]
+        y_low = min(p[2] for p in points)
+        y_high = max(p[3] for p in points)
+        x_span = (x_high - x_low) or 1
+        y_span = (y_high - y_low) or 1
+
+        def x(value):
+            return 40 + (value - x_low) / x_span * (width - 50)
+
+        def y(value):
+            return 10 + (y_high - value) / y_span * (height - 30)
+
+        band = " ".join(f"{x(p[0]):.1f},{y(p[3]):.1f}" for p in points)
+        band += " " + " ".join(f"{x(p[0]):.1f},{y(p[2]):.1f}" for p in reversed(points))
+        line = " ".join(f"{x(p[0]):.1f},{y(p[1]):.1f}" for p in points)
+        out.write(
+            f"<svg width='{width}' height='{height}'>"
+            f"<polygon points='{band}' fill='#cde' stroke='none'/>"
+            f"<polyline points='{line}' fill='none' stroke='#236' stroke-width='1.5'/>"
+            f"<text x='2' y='14' font-size='10'>{y_high:.4g}</text>"
+            f"<text x='2' y='{height - 20}' font-size='10'>{y_low:.4g}</text>"
+            f"<text x='40' y='{height - 4}' font-size='10'>mois {x_low + 1:.0f}</text>"
+            f"<text x='{width - 60}' y='{height - 4}' font-size='10'>mois {x_high + 1:.0f}</text>"
+            "</svg>\n"
+        )
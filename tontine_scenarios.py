@@ -0,0 +1,186 @@
+import bisect
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from tontine_config import IndividualParticipantConfig
+
+
+# Flux aléatoire des chocs, distinct de celui des membres pour une même graine
+SCENARIO_STREAM = 0x5C3
+
+
+@dataclass
+class LatentFactor:
+    """
+    Common factor z_t (stationary AR(1) of unit variance, `persistence` being the monthly
+    autocorrelation) scaling every member's probabilities by a lognormal frailty of mean 1:
+    exp(volatility * z_t - volatility^2 / 2) for defaults, and the same with
+    exit_loading * volatility for exits.
+    """
+    volatility: float = 0.0
+    persistence: float = 0.0
+    exit_loading: float = 0.0
+
+
+@dataclass
+class RegimeSwitching:
+    """Markov chain of economic regimes (monthly transitions), each with its probability multipliers"""
+    names: List[str]
+    transitions: List[List[float]]   # transitions[i][j] : probabilité de passer du régime i au régime j
+    default: List[float]             # Multiplicateur de la probabilité de défaut dans chaque régime
+    exit: List[float]                # Multiplicateur de la probabilité de départ dans chaque régime
+    initial: int = 0
+
+
+@dataclass
+class ScheduleEntry:
+    """
+    Multipliers applied on a set of months: months first_month..last_month (simulation months,
+    inclusive, open-ended when None), restricted to the months of the cycle (1-12) in
+    cycle_months when given, for the members of the archetypes (participant config ids) in
+    `archetypes`, or everyone when None
+    """
+    default: float = 1.0
+    exit: float = 1.0
+    first_month: Optional[int] = None
+    last_month: Optional[int] = None
+    cycle_months: Optional[List[int]] = None
+    archetypes: Optional[List[str]] = None
+
+
+@dataclass
+class ScenarioPaths:
+    """
+    Probability multipliers of one replica, precomputed for the whole horizon: row r of
+    default_scale and exit_scale holds the monthly multipliers of archetype archetypes[r],
+    and the last row those of members of another archetype
+    """
+    archetypes: List[str]
+    default_scale: np.ndarray        # (archétypes + 1, mois)
+    exit_scale: np.ndarray           # (archétypes + 1, mois)
+    factor: np.ndarray               # Facteur latent z_t de chaque mois
+    regimes: np.ndarray              # Régime de chaque mois
+
+    def __post_init__(self):
+        self.rows = {archetype: row for row, archetype in enumerate(self.archetypes)}
+
+    def row(self, archetype: str) -> int:
+        return self.rows.get(archetype, len(self.archetypes))
+
+    def rows_of(self, archetypes) -> np.ndarray:
+        """Row of every member, from the ids of their participant config"""
+        return np.array([self.row(archetype) for archetype in archetypes], dtype=np.int64)
+
+    def column(self, scale: np.ndarray, month: int) -> List[float]:
+        """Multipliers of every row for one month, as a list (cheap to index member by member)"""
+        return scale[:, min(month, scale.shape[1] - 1)].tolist()
+
+
+@dataclass
+class Scenario:
+    """
+    Stress scenario: correlated, time-varying default and exit probabilities. The base
+    probability of every member is multiplied each month by the latent factor's frailty, the
+    multiplier of the current regime and the schedule entries covering the month (capped at 1).
+    """
+    factor: LatentFactor = field(default_factory=LatentFactor)
+    regimes: Optional[RegimeSwitching] = None
+    schedule: List[ScheduleEntry] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Scenario":
+        scenario = cls(
+            factor=LatentFactor(**data.get("factor", {})),
+            regimes=RegimeSwitching(**data["regimes"]) if data.get("regimes") else None,
+            schedule=[ScheduleEntry(**entry) for entry in data.get("schedule", [])],
+        )
+        scenario.validate()
+        return scenario
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def validate(self):
+        if not -1.0 < self.factor.persistence < 1.0:
+            raise Exception("The persistence of the latent factor must be in (-1, 1)")
+        if self.factor.volatility < 0:
+            raise Exception("The volatility of the latent factor must be non-negative")
+        if self.regimes is not None:
+            regimes = self.regimes
+            count = len(regimes.names)
+            transitions = np.array(regimes.transitions, dtype=float)
+            if transitions.shape != (count, count) or len(regimes.default) != count or len(regimes.exit) != count:
+                raise Exception(f"The regime transitions and multipliers must cover the {count} regimes")
+            if np.any(transitions < 0) or not np.allclose(transitions.sum(axis=1), 1.0):
+                raise Exception("Every row of the regime transitions must be a probability distribution")
+            if not 0 <= regimes.initial < count:
+                raise Exception(f"Unknown initial regime: {regimes.initial}")
+        for entry in self.schedule:
+            if entry.default < 0 or entry.exit < 0:
+                raise Exception("Schedule multipliers must be non-negative")
+
+    def paths(
+        self,
+        participant_configs: List[IndividualParticipantConfig],
+        num_months: int,
+        seed: Optional[int]
+    ) -> ScenarioPaths:
+        """Draw the multiplier paths of one replica; the same seed gives the same paths in every engine"""
+        rng = np.random.default_rng(None if seed is None else [seed % (1 << 64), SCENARIO_STREAM])
+        num_months = max(num_months, 1)
+        months = np.arange(num_months)
+
+        shocks = rng.standard_normal(num_months)
+        if self.factor.persistence:
+            persistence = self.factor.persistence
+            innovation = (1.0 - persistence ** 2) ** 0.5
+            values = shocks.tolist()
+            for month in range(1, num_months):
+                values[month] = persistence * values[month - 1] + innovation * values[month]
+            factor = np.array(values)
+        else:
+            factor = shocks
+        volatility = self.factor.volatility
+        exit_volatility = self.factor.exit_loading * volatility
+        default = np.exp(volatility * factor - volatility ** 2 / 2)
+        exit = np.exp(exit_volatility * factor - exit_volatility ** 2 / 2)
+
+        regimes = np.zeros(num_months, dtype=np.int64)
+        if self.regimes is not None:
+            cumulative = np.cumsum(np.array(self.regimes.transitions, dtype=float), axis=1).tolist()
+            uniforms = rng.random(num_months).tolist()
+            last = len(cumulative) - 1
+            regime = self.regimes.initial
+            path = [regime]
+            for month in range(1, num_months):
+                regime = min(bisect.bisect_right(cumulative[regime], uniforms[month]), last)
+                path.append(regime)
+            regimes = np.array(path, dtype=np.int64)
+            default = default * np.array(self.regimes.default)[regimes]
+            exit = exit * np.array(self.regimes.exit)[regimes]
+
+        archetypes = [config.id for config in participant_configs]
+        default_scale = np.tile(default, (len(archetypes) + 1, 1))
+        exit_scale = np.tile(exit, (len(archetypes) + 1, 1))
+        for entry in self.schedule:
+            covered = np.ones(num_months, dtype=bool)
+            if entry.first_month is not None:
+                covered &= months >= entry.first_month
+            if entry.last_month is not None:
+                covered &= months <= entry.last_month
+            if entry.cycle_months is not None:
+                covered &= np.isin(months % 12 + 1, entry.cycle_months)
+            rows = np.arange(len(archetypes) + 1) if entry.archetypes is None else \
+                np.array([row for row, archetype in enumerate(archetypes) if archetype in entry.archetypes], dtype=np.int64)
+            default_scale[np.ix_(rows, covered)] *= entry.default
+            exit_scale[np.ix_(rows, covered)] *= entry.exit
+
+        return ScenarioPaths(archetypes, default_scale, exit_scale, factor, regimes)
+
+
+def load_scenario(path: str) -> Scenario:
+    with open(path, "r") as f:
+        return Scenario.from_dict(json.load(f))
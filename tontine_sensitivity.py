@@ -0,0 +1,246 @@
+from dataclasses import dataclass, fields, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from scipy.stats import qmc
+except ImportError:  # scipy est optionnel : on se rabat sur l'hypercube latin
+    qmc = None
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_batch import ResultStore, evaluate_configs, replica_seed
+
+
+PARTICIPANT_PREFIX = "participants."
+INTEGER_FIELDS = {
+    f.name for f in fields(TontineConfig) if f.type in (int, "int")
+}
+
+
+@dataclass
+class SensitivityParameter:
+    """
+    Input varied by the sensitivity analysis.
+
+    `name` is either a TontineConfig field (the sampled value replaces the configured one) or
+    "participants.<field>" for an IndividualParticipantConfig probability, in which case the
+    sampled value multiplies the probability of every participant.
+    """
+    name: str
+    low: float
+    high: float
+
+
+def default_parameters(tontine_config: TontineConfig) -> List[SensitivityParameter]:
+    """Reasonable ranges around a base configuration"""
+    return [
+        SensitivityParameter("monthly_interest_rate", 0.005, 0.05),
+        SensitivityParameter("arrival_probability", 0.0, 0.3),
+        SensitivityParameter("emergency_fund_percentage", 0.0, 0.3),
+        SensitivityParameter("monthly_distribution_percentage", 0.2, 0.9),
+        SensitivityParameter("max_loan_amount", 0.5 * tontine_config.max_loan_amount, 2.0 * tontine_config.max_loan_amount),
+        SensitivityParameter("max_simultaneous_loans", 1, 5),
+        SensitivityParameter("min_membership_months", 1, 12),
+        SensitivityParameter("participants.default_probability", 0.5, 2.0),
+        SensitivityParameter("participants.loan_prob", 0.5, 2.0),
+        SensitivityParameter("participants.loan_reemboursement_prob", 0.5, 2.0),
+        SensitivityParameter("participants.exit_probability", 0.5, 2.0),
+    ]
+
+
+def parse_parameter(spec: str) -> SensitivityParameter:
+    """Parse a "name:low:high" command line specification"""
+    try:
+        name, low, high = spec.split(":")
+        return SensitivityParameter(name, float(low), float(high))
+    except ValueError:
+        raise Exception(f"Invalid parameter specification '{spec}', expected name:low:high")
+
+
+def apply_parameters(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    parameters: List[SensitivityParameter],
+    values: np.ndarray
+) -> Tuple[TontineConfig, List[IndividualParticipantConfig]]:
+    """Return copies of the configurations with the parameter values applied"""
+    tontine_changes = {}
+    participant_scales = {}
+    for parameter, value in zip(parameters, values):
+        if parameter.name.startswith(PARTICIPANT_PREFIX):
+            participant_scales[parameter.name[len(PARTICIPANT_PREFIX):]] = float(value)
+        elif parameter.name in INTEGER_FIELDS:
+            tontine_changes[parameter.name] = int(round(value))
+        else:
+            tontine_changes[parameter.name] = float(value)
+
+    new_participant_configs = []
+    for config in participant_configs:
+        config = config.clone()
+        for name, scale in participant_scales.items():
+            setattr(config, name, min(1.0, getattr(config, name) * scale))
+        new_participant_configs.append(config)
+
+    return replace(tontine_config, **tontine_changes), new_participant_configs
+
+
+def latin_hypercube(num_points: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    """Latin hypercube sample of the unit cube: one point in each of the num_points strata of every axis"""
+    strata = np.argsort(rng.random((num_points, dimension)), axis=0)
+    return (strata + rng.random((num_points, dimension))) / num_points
+
+
+def unit_sample(
+    num_points: int,
+    dimension: int,
+    seed: int = 0,
+    sampler: str = "lhs",
+    block_size: int = 64
+) -> np.ndarray:
+    """
+    Quasi-random sample of the unit cube, nested in num_points: the first points of a larger
+    sample are the points of a smaller one, so extending a study reuses cached evaluations.
+    The Latin hypercube is drawn in independent blocks of block_size points for that reason.
+    """
+    if sampler == "sobol":
+        if qmc is None:
+            raise Exception("The Sobol sampler requires scipy, use --sampler lhs instead")
+        return qmc.Sobol(dimension, scramble=True, seed=seed).random(num_points)
+    if sampler != "lhs":
+        raise Exception(f"Unknown sampler: {sampler}")
+
+    num_blocks = -(-num_points // block_size)
+    blocks = [
+        latin_hypercube(block_size, dimension, np.random.default_rng([seed, block]))
+        for block in range(num_blocks)
+    ]
+    return np.concatenate(blocks)[:num_points]
+
+
+def sobol_indices(
+    f_a: np.ndarray,
+    f_b: np.ndarray,
+    f_ab: np.ndarray,
+    num_bootstrap: int = 200,
+    seed: int = 0
+) -> Dict[str, np.ndarray]:
+    """
+    First order (Saltelli 2010) and total (Jansen) Sobol indices from a Saltelli design.
+
+    f_a, f_b: outputs for the N rows of matrices A and B
+    f_ab: (N, d) outputs where column i of A is replaced by column i of B
+    Confidence half-widths (95%) come from bootstrapping the N rows.
+    """
+    def estimate(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        a, b, ab = f_a[rows], f_b[rows], f_ab[rows]
+        variance = np.var(np.concatenate([a, b]))
+        if variance == 0:
+            zeros = np.zeros(ab.shape[1])
+            return zeros, zeros
+        first = np.mean(b[:, None] * (ab - a[:, None]), axis=0) / variance
+        total = 0.5 * np.mean((a[:, None] - ab) ** 2, axis=0) / variance
+        return first, total
+
+    num_rows = len(f_a)
+    first, total = estimate(np.arange(num_rows))
+    rng = np.random.default_rng(seed)
+    samples = [estimate(rng.integers(0, num_rows, num_rows)) for _ in range(num_bootstrap)]
+    first_samples = np.array([sample[0] for sample in samples])
+    total_samples = np.array([sample[1] for sample in samples])
+
+    return {
+        "first_order": first,
+        "first_order_conf": 1.96 * first_samples.std(axis=0),
+        "total": total,
+        "total_conf": 1.96 * total_samples.std(axis=0),
+    }
+
+
+class SensitivityAnalysis:
+    """
+    Global sensitivity analysis of failure risk and final treasury.
+
+    Builds a Saltelli design (matrices A, B and the d matrices AB_i) from a nested quasi-random
+    sample, evaluates every design point with the same replica seeds as one batch on the worker
+    pool, then computes first order and total Sobol indices of each output.
+    """
+
+    OUTPUTS: Dict[str, Callable[[list], float]] = {
+        "failure_probability": lambda results: float(np.mean([r.failed for r in results])),
+        "final_treasury": lambda results: float(np.mean([r.final_treasury for r in results])),
+    }
+
+    def __init__(
+        self,
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig],
+        parameters: Optional[List[SensitivityParameter]] = None,
+        num_months: int = 36,
+        replicas: int = 20,
+        seed: int = 0,
+        sampler: str = "lhs",
+        store: Optional[ResultStore] = None,
+        workers: Optional[int] = None,
+        engine: str = "auto"
+    ):
+        self.tontine_config = tontine_config
+        self.participant_configs = participant_configs
+        self.parameters = parameters or default_parameters(tontine_config)
+        self.num_months = num_months
+        self.seeds = [replica_seed(seed, index) for index in range(replicas)]
+        self.seed = seed
+        self.sampler = sampler
+        self.store = store
+        self.workers = workers
+        self.engine = engine
+
+    def design(self, num_samples: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the A (N, d), B (N, d) and AB (N, d, d) parameter matrices"""
+        dimension = len(self.parameters)
+        unit = unit_sample(num_samples, 2 * dimension, seed=self.seed, sampler=self.sampler)
+        low = np.tile([p.low for p in self.parameters], 2)
+        high = np.tile([p.high for p in self.parameters], 2)
+        scaled = low + (high - low) * unit
+        a, b = scaled[:, :dimension], scaled[:, dimension:]
+        ab = np.repeat(a[:, None, :], dimension, axis=1)
+        for i in range(dimension):
+            ab[:, i, i] = b[:, i]
+        return a, b, ab
+
+    def run(
+        self,
+        num_samples: int,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        a, b, ab = self.design(num_samples)
+        dimension = len(self.parameters)
+        points = np.concatenate([a, b, ab.reshape(-1, dimension)])
+        configs = [
+            apply_parameters(self.tontine_config, self.participant_configs, self.parameters, values)
+            for values in points
+        ]
+        results = evaluate_configs(
+            configs, self.num_months, self.seeds,
+            store=self.store, workers=self.workers, on_progress=on_progress, engine=self.engine
+        )
+
+        report = {
+            "parameters": [p.name for p in self.parameters],
+            "samples": num_samples,
+            "replicas": len(self.seeds),
+            "evaluations": len(points) * len(self.seeds),
+            "outputs": {},
+        }
+        for output, reduce in self.OUTPUTS.items():
+            values = np.array([reduce(point_results) for point_results in results])
+            f_a = values[:num_samples]
+            f_b = values[num_samples:2 * num_samples]
+            f_ab = values[2 * num_samples:].reshape(num_samples, dimension)
+            indices = sobol_indices(f_a, f_b, f_ab, seed=self.seed)
+            report["outputs"][output] = {
+                "mean": float(values.mean()),
+                "variance": float(np.var(np.concatenate([f_a, f_b]))),
+                **{key: value.tolist() for key, value in indices.items()},
+            }
+        return report
@@ -0,0 +1,367 @@
+import asyncio
+import inspect
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Union, get_args, get_origin, get_type_hints
+
+from tontine_batch import (
+    ReplicaResult, canonical_config, config_hash, replica_seed, resolve_engine, run_replica, summarize_results
+)
+from tontine_initializer import TontineInitializer
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key: str, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class RpcError(Exception):
+    """Error reported to the client as a JSON-RPC error object"""
+
+    QUEUE_FULL = -32001
+    INVALID_PARAMS = -32602
+    METHOD_NOT_FOUND = -32601
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class SimulationJob:
+    """Replicas waiting in the service queue"""
+    tontine_config: Any
+    participant_configs: list
+    num_months: int
+    engine: str
+    seeds: List[int]
+    config_key: str
+    future: asyncio.Future
+    on_progress: Callable[[int, int], None]
+    results: Dict[int, ReplicaResult] = field(default_factory=dict)
+
+
+def _warm_up() -> int:
+    """Executed once in each worker so that simulation modules (and the kernel) are loaded before the first job"""
+    if resolve_engine("auto") == "kernel":
+        from tontine_kernel import warm_up
+        warm_up()
+    return os.getpid()
+
+
+class TontineService:
+    """
+    Long-running local simulation service speaking JSON-RPC 2.0 over TCP (one JSON document per line).
+
+    Methods:
+    - simulate(config | config_path, months=36, seed=0, engine="auto"): one replica
+    - batch(config | config_path, months=36, replicas=100, seed=0, engine="auto"): aggregated
+      statistics of `replicas` replicas, with "progress" notifications sent while the batch runs
+    - status(): queue, cache and worker information
+
+    Replicas run on a pool of warm worker processes. Every replica is cached under the
+    canonical hash of (config, months, engine, seed), so a batch that only adds replicas to a
+    previous request only computes the new ones.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        workers: Optional[int] = None,
+        queue_size: int = 64,
+        cache_size: int = 100_000
+    ):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.queue: "asyncio.Queue[SimulationJob]" = asyncio.Queue(maxsize=queue_size)
+        self.cache = LRUCache(cache_size)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.dispatchers: List[asyncio.Task] = []
+        self.clients: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the worker pool, the job dispatchers and the TCP server"""
+        loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _warm_up) for _ in range(self.workers)))
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+        # Connexions ouvertes et répartiteurs : annulés puis attendus, pour qu'aucune tâche ne survive à l'arrêt
+        tasks = [*self.clients, *self.dispatchers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+
+        async def send(message: Dict[str, Any]):
+            async with write_lock:
+                writer.write((json.dumps(message) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        client = asyncio.current_task()
+        self.clients.add(client)
+        pending = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._handle_request(line, send))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # Arrêt du service : les requêtes en cours sont abandonnées et la connexion se termine
+            # normalement (asyncio signalerait sinon l'annulation comme une erreur de la connexion)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+    async def _handle_request(self, line: bytes, send):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = request.get("method")
+            params = request.get("params") or {}
+            if method == "simulate":
+                result = await self.simulate(**self._check_params(self.simulate, params))
+            elif method == "batch":
+                # Références aux envois en cours : la boucle ne garde que des références faibles aux tâches
+                notifications = set()
+
+                def on_progress(done: int, total: int):
+                    task = asyncio.create_task(send({
+                        "jsonrpc": "2.0",
+                        "method": "progress",
+                        "params": {"id": request_id, "done": done, "total": total}
+                    }))
+                    notifications.add(task)
+                    task.add_done_callback(notifications.discard)
+                result = await self.batch(on_progress=on_progress, **self._check_params(self.batch, params))
+                await asyncio.gather(*notifications)
+            elif method == "status":
+                result = self.status(**self._check_params(self.status, params))
+            else:
+                raise RpcError(RpcError.METHOD_NOT_FOUND, f"Unknown method: {method}")
+            await send({"jsonrpc": "2.0", "id": request_id, "result": result})
+        except RpcError as e:
+            await send({"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": str(e)}})
+        except Exception as e:
+            await send({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": str(e)}})
+
+    @staticmethod
+    def _check_params(handler: Callable, params: Any) -> Dict[str, Any]:
+        """Check the request params against the handler signature and annotations (on_progress is the service's)"""
+        if not isinstance(params, dict):
+            raise RpcError(RpcError.INVALID_PARAMS, "params must be an object")
+        accepted = inspect.signature(handler).parameters
+        hints = get_type_hints(handler)
+        for name, value in params.items():
+            if name not in accepted or name == "on_progress":
+                raise RpcError(RpcError.INVALID_PARAMS, f"Unknown parameter: {name}")
+            expected = hints.get(name, Any)
+            types = get_args(expected) if get_origin(expected) is Union else (expected,)
+            if Any in types:
+                continue
+            # JSON : un entier est un float valide, un booléen n'est pas un entier
+            if isinstance(value, bool):
+                valid = bool in types
+            elif isinstance(value, int) and float in types:
+                valid = True
+            else:
+                valid = isinstance(value, types)
+            if not valid:
+                names = " or ".join("null" if t is type(None) else t.__name__ for t in types)
+                raise RpcError(RpcError.INVALID_PARAMS, f"Parameter '{name}' must be {names}")
+        return params
+
+    def _parse_config(self, config: Optional[dict], config_path: Optional[str]):
+        if config is None and config_path is None:
+            raise RpcError(RpcError.INVALID_PARAMS, "Either 'config' or 'config_path' is required")
+        try:
+            if config is not None:
+                return TontineInitializer.parse_config(config)
+            return TontineInitializer.load_config(config_path)
+        except Exception as e:
+            raise RpcError(RpcError.INVALID_PARAMS, f"Invalid configuration: {e}")
+
+    async def simulate(
+        self,
+        config: Optional[dict] = None,
+        config_path: Optional[str] = None,
+        months: int = 36,
+        seed: int = 0,
+        engine: str = "auto"
+    ) -> Dict[str, Any]:
+        """Run (or fetch from cache) a single replica"""
+        results = await self._run_replicas(config, config_path, months, engine, [seed], lambda done, total: None)
+        return asdict(results[0])
+
+    async def batch(
+        self,
+        config: Optional[dict] = None,
+        config_path: Optional[str] = None,
+        months: int = 36,
+        replicas: int = 100,
+        seed: int = 0,
+        engine: str = "auto",
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """Run (or fetch from cache) a batch of replicas and return their aggregated statistics"""
+        seeds = [replica_seed(seed, index) for index in range(replicas)]
+        results = await self._run_replicas(
+            config, config_path, months, engine, seeds, on_progress or (lambda done, total: None)
+        )
+        return summarize_results(results)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued_jobs": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "cache_entries": len(self.cache.entries),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
+
+    async def _run_replicas(self, config, config_path, months, engine, seeds, on_progress) -> List[ReplicaResult]:
+        tontine_config, participant_configs = self._parse_config(config, config_path)
+        try:
+            engine = resolve_engine(engine)
+        except Exception as e:
+            raise RpcError(RpcError.INVALID_PARAMS, str(e))
+        config_key = config_hash(canonical_config(tontine_config, participant_configs), months, engine)
+
+        cached = {}
+        for seed in seeds:
+            result = self.cache.get(config_hash(config_key, seed))
+            if result is not None:
+                cached[seed] = result
+        missing = [seed for seed in seeds if seed not in cached]
+
+        if missing:
+            job = SimulationJob(
+                tontine_config=tontine_config,
+                participant_configs=participant_configs,
+                num_months=months,
+                engine=engine,
+                seeds=missing,
+                config_key=config_key,
+                future=asyncio.get_running_loop().create_future(),
+                on_progress=lambda done, total: on_progress(done + len(cached), len(seeds)),
+            )
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull:
+                raise RpcError(RpcError.QUEUE_FULL, "Simulation queue is full, retry later")
+            cached.update(await job.future)
+
+        on_progress(len(seeds), len(seeds))
+        return [cached[seed] for seed in seeds]
+
+    async def _dispatch(self):
+        """Take jobs from the queue and run their replicas on the worker pool"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            futures = []
+            try:
+                futures = [
+                    loop.run_in_executor(
+                        self.pool, run_replica,
+                        job.tontine_config, job.participant_configs, job.num_months, seed, None, 0, job.engine
+                    )
+                    for seed in job.seeds
+                ]
+                for future in asyncio.as_completed(futures):
+                    result = await future
+                    job.results[result.seed] = result
+                    self.cache.put(config_hash(job.config_key, result.seed), result)
+                    job.on_progress(len(job.results), len(job.seeds))
+                # Le demandeur peut avoir abandonné (connexion fermée) : son futur est alors annulé
+                if not job.future.done():
+                    job.future.set_result(job.results)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                # Après un échec ou un arrêt : réplications restantes annulées, exceptions des autres lues
+                for future in futures:
+                    if not future.done():
+                        future.cancel()
+                    elif not future.cancelled():
+                        future.exception()
+                if not job.future.done():
+                    job.future.cancel()
+                self.queue.task_done()
+
+
+async def request(
+    method: str,
+    params: Optional[Dict[str, Any]] = None,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Any:
+    """Send one JSON-RPC request to a running service and wait for its result"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}}) + "\n").encode("utf-8"))
+        await writer.drain()
+        while line := await reader.readline():
+            message = json.loads(line)
+            if message.get("method") == "progress":
+                if on_progress is not None:
+                    on_progress(message["params"])
+                continue
+            if "error" in message:
+                raise RpcError(message["error"]["code"], message["error"]["message"])
+            return message["result"]
+        raise ConnectionError("Connection closed by the simulation service")
+    finally:
+        writer.close()
@@ -0,0 +1,366 @@
+import gzip
+import json
+import os
+import socket
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_batch import (
+    ReplicaResult, canonical_config, config_hash, replica_seed, resolve_engine, run_groups, run_replica_group
+)
+from tontine_scenarios import Scenario
+
+
+class Moments:
+    """Count, mean, sum of squared deviations, min and max, merged with Chan's parallel formulas"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Moments"):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Moments":
+        moments = cls()
+        moments.count, moments.mean, moments.m2 = data["count"], data["mean"], data["m2"]
+        moments.min, moments.max = data["min"], data["max"]
+        return moments
+
+
+class Histogram:
+    """Counts over fixed bin edges (shared by every shard), with underflow and overflow counts"""
+
+    def __init__(self, edges: np.ndarray):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+
+    def add(self, value: float):
+        self.counts[np.searchsorted(self.edges, value, side="right")] += 1
+
+    def merge(self, other: "Histogram"):
+        if not np.array_equal(self.edges, other.edges):
+            raise Exception("Cannot merge histograms with different bin edges")
+        self.counts += other.counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"edges": self.edges.tolist(), "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        histogram = cls(np.array(data["edges"]))
+        histogram.counts[:] = data["counts"]
+        return histogram
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest). Values are buffered, then sorted with the
+    centroids and regrouped so that every centroid spans at most one unit of the k1 scale
+    k(q) = compression / (2 pi) * asin(2q - 1): centroids are small in the tails, and there
+    are about compression / 2 of them whatever the number of values.
+    """
+
+    def __init__(self, compression: float = 200):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.buffer: List[float] = []
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + len(self.buffer)
+
+    def add(self, value: float):
+        self.buffer.append(value)
+        if len(self.buffer) >= 10 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        other._compress()
+        self._compress(other.means, other.weights)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _compress(self, means: Optional[np.ndarray] = None, weights: Optional[np.ndarray] = None):
+        buffer = np.array(self.buffer, dtype=np.float64)
+        self.buffer = []
+        if len(buffer):
+            self.min = min(self.min, float(buffer.min()))
+            self.max = max(self.max, float(buffer.max()))
+        parts_means = [self.means, buffer] + ([means] if means is not None else [])
+        parts_weights = [self.weights, np.ones(len(buffer))] + ([weights] if weights is not None else [])
+        all_means = np.concatenate(parts_means)
+        if len(all_means) == len(self.means):
+            return
+        all_weights = np.concatenate(parts_weights)
+        order = np.argsort(all_means, kind="stable")
+        all_means, all_weights = all_means[order], all_weights[order]
+
+        total = all_weights.sum()
+        q_left = (np.cumsum(all_weights) - all_weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1))
+        groups = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        self.weights = np.add.reduceat(all_weights, starts)
+        self.means = np.add.reduceat(all_means * all_weights, starts) / self.weights
+
+    def quantile(self, q: float) -> float:
+        """Interpolate between centroid centres, pinned to the exact min and max"""
+        self._compress()
+        if not len(self.means):
+            return float("nan")
+        total = self.weights.sum()
+        centres = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(
+            q * total, np.r_[0.0, centres, total], np.r_[self.min, self.means, self.max]
+        ))
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        digest = cls(data["compression"])
+        digest.means = np.array(data["means"], dtype=np.float64)
+        digest.weights = np.array(data["weights"], dtype=np.float64)
+        digest.min, digest.max = data["min"], data["max"]
+        return digest
+
+
+class ReplicaSketch:
+    """
+    Constant-size summary of any number of replicas of one configuration, mergeable across
+    shards: moments and t-digests of the replica outputs, histograms of the failure month and
+    of the default rate, and one t-digest of the treasury per simulated month.
+
+    `key` identifies the configuration, horizon and engine, and `ranges` the replica indices
+    already included, so that only sketches of the same study with disjoint replicas merge.
+    """
+
+    OUTPUTS = ("final_treasury", "emergency_fund", "total_interest", "default_rate", "active_members")
+
+    def __init__(self, key: str, months: int, compression: float = 200, month_compression: float = 100):
+        self.key = key
+        self.months = months
+        self.ranges: List[List[int]] = []     # [premier indice, nombre] des réplications incluses
+        self.failures = 0
+        self.moments = {name: Moments() for name in self.OUTPUTS}
+        self.digests = {name: TDigest(compression) for name in self.OUTPUTS}
+        self.failure_months = Histogram(np.arange(months + 1))
+        self.default_rates = Histogram(np.linspace(0, 1, 51))
+        self.treasury = [TDigest(month_compression) for _ in range(months)]
+
+    @property
+    def replicas(self) -> int:
+        return sum(count for _, count in self.ranges)
+
+    def add(self, result: ReplicaResult):
+        for name in self.OUTPUTS:
+            value = float(getattr(result, name))
+            self.moments[name].add(value)
+            self.digests[name].add(value)
+        if result.failed:
+            self.failures += 1
+            self.failure_months.add(result.failure_month)
+        self.default_rates.add(result.default_rate)
+        # Après une faillite, le trésor reste à sa dernière valeur (comme dans les prévisions)
+        path = result.treasury_path[:self.months]
+        for month in range(self.months if path else 0):
+            self.treasury[month].add(path[min(month, len(path) - 1)])
+
+    def merge(self, other: "ReplicaSketch") -> "ReplicaSketch":
+        if other.key != self.key or other.months != self.months:
+            raise Exception("Cannot merge sketches of different configurations, horizons or engines")
+        mine = sorted(self.ranges)
+        for first, count in other.ranges:
+            if any(first < start + length and start < first + count for start, length in mine):
+                raise Exception(f"Replicas {first}..{first + count - 1} are already in the sketch")
+        self.ranges = sorted(self.ranges + other.ranges)
+        self.failures += other.failures
+        for name in self.OUTPUTS:
+            self.moments[name].merge(other.moments[name])
+            self.digests[name].merge(other.digests[name])
+        self.failure_months.merge(other.failure_months)
+        self.default_rates.merge(other.default_rates)
+        for digest, other_digest in zip(self.treasury, other.treasury):
+            digest.merge(other_digest)
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        """Same statistics as summarize_results, plus monthly treasury quantiles"""
+        replicas = self.replicas
+        if not replicas:
+            return {"replicas": 0}
+        failure_counts = self.failure_months.counts[1:-1]
+
+        def describe(name: str) -> Dict[str, float]:
+            return {
+                "mean": self.moments[name].mean,
+                "std": self.moments[name].std,
+                "p05": self.digests[name].quantile(0.05),
+                "p50": self.digests[name].quantile(0.50),
+                "p95": self.digests[name].quantile(0.95),
+            }
+
+        return {
+            "replicas": replicas,
+            "failure_probability": self.failures / replicas,
+            "mean_failure_month": (
+                float(failure_counts @ np.arange(self.months) / self.failures) if self.failures else None
+            ),
+            **{name: describe(name) for name in self.OUTPUTS},
+            "cumulative_failure_probability": (np.cumsum(failure_counts) / replicas).tolist(),
+            "treasury_quantiles": {
+                label: [digest.quantile(q) for digest in self.treasury]
+                for label, q in (("p05", 0.05), ("p50", 0.50), ("p95", 0.95))
+            },
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "months": self.months,
+            "ranges": self.ranges,
+            "failures": self.failures,
+            "moments": {name: moments.to_dict() for name, moments in self.moments.items()},
+            "digests": {name: digest.to_dict() for name, digest in self.digests.items()},
+            "failure_months": self.failure_months.to_dict(),
+            "default_rates": self.default_rates.to_dict(),
+            "treasury": [digest.to_dict() for digest in self.treasury],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReplicaSketch":
+        sketch = cls(data["key"], data["months"])
+        sketch.ranges = [list(r) for r in data["ranges"]]
+        sketch.failures = data["failures"]
+        sketch.moments = {name: Moments.from_dict(d) for name, d in data["moments"].items()}
+        sketch.digests = {name: TDigest.from_dict(d) for name, d in data["digests"].items()}
+        sketch.failure_months = Histogram.from_dict(data["failure_months"])
+        sketch.default_rates = Histogram.from_dict(data["default_rates"])
+        sketch.treasury = [TDigest.from_dict(d) for d in data["treasury"]]
+        return sketch
+
+    def save(self, path: str):
+        """Write the sketch as gzip-compressed JSON, through a temporary file"""
+        path = Path(path)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        # Nom propre à chaque écrivain : deux workers peuvent terminer la même unité reprise
+        temporary = path.with_name(f".{path.name}.{socket.gethostname()}.{os.getpid()}.tmp")
+        with gzip.open(temporary, "wt", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        temporary.replace(path)
+
+    @classmethod
+    def load(cls, path: str) -> "ReplicaSketch":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def sketch_replica_group(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    num_months: int,
+    seeds: List[int],
+    key: str,
+    first_index: int,
+    engine: str = "reference",
+    scenario: Optional[Scenario] = None
+) -> ReplicaSketch:
+    """Run replicas first_index.. with the given seeds and reduce them to a sketch in the worker"""
+    sketch = ReplicaSketch(key, num_months)
+    for result in run_replica_group(tontine_config, participant_configs, num_months, seeds, None, 0, engine, False, scenario):
+        sketch.add(result)
+    sketch.ranges = [[first_index, len(seeds)]]
+    return sketch
+
+
+def merge_sketches(paths: List[str]) -> ReplicaSketch:
+    """Merge any number of shard sketch files, one file in memory at a time"""
+    if not paths:
+        raise Exception("No sketch file to merge")
+    merged = ReplicaSketch.load(paths[0])
+    for path in paths[1:]:
+        merged.merge(ReplicaSketch.load(path))
+    return merged
+
+
+def run_shard(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    num_months: int,
+    replicas: int,
+    seed: int = 0,
+    shard: int = 0,
+    engine: str = "auto",
+    workers: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    scenario: Optional[Scenario] = None
+) -> ReplicaSketch:
+    """
+    Run shard number `shard` of a study: replicas shard * replicas .. (shard + 1) * replicas - 1,
+    seeded like run_batch. Workers send back one sketch per group, merged as they complete.
+    """
+    engine = resolve_engine(engine)
+    study = (canonical_config(tontine_config, participant_configs), num_months, engine, seed)
+    key = config_hash(*study, scenario.to_dict()) if scenario is not None else config_hash(*study)
+    sketch = ReplicaSketch(key, num_months)
+    first = shard * replicas
+    chunk = max(1, -(-replicas // (4 * (workers or os.cpu_count() or 1))))
+    groups = [
+        (tontine_config, participant_configs, num_months,
+         [replica_seed(seed, index) for index in range(start, min(start + chunk, first + replicas))],
+         key, start, engine, scenario)
+        for start in range(first, first + replicas, chunk)
+    ]
+    completed = 0
+
+    def on_group(index: int, group_sketch: ReplicaSketch):
+        nonlocal completed
+        sketch.merge(group_sketch)
+        completed += 1
+        if on_progress is not None:
+            on_progress(completed, len(groups))
+
+    run_groups(groups, workers=workers, on_group=on_group, task=sketch_replica_group)
+    return sketch
@@ -0,0 +1,326 @@
+import gc
+import json
+import os
+import shutil
+from collections.abc import Sequence
+from contextlib import contextmanager
+from dataclasses import fields
+from datetime import datetime
+from operator import attrgetter, is_not
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tontine_config import IndividualParticipantConfig
+from tontine_state import TontineState, ParticipantState, ParticipantStatus
+
+
+SNAPSHOT_VERSION = 1
+
+# Champs scalaires de TontineState, écrits dans l'en-tête JSON (les flottants y sont relus à l'identique)
+STATE_FIELDS = (
+    "current_month", "cycle_number", "month_in_cycle", "total_participants_history",
+    "treasury_balance", "emergency_fund", "total_loans_outstanding", "total_contributions_received",
+    "total_interest_earned", "default_rate", "loan_recovery_rate",
+    "cycle_contributions", "cycle_defaults", "cycle_new_members", "cycle_exits",
+)
+# Colonnes numériques des membres et de leur configuration, dans l'ordre des champs des dataclasses
+PARTICIPANT_COLUMNS = {
+    f.name: {int: np.int64, float: np.float64, bool: np.bool_}[f.type]
+    for f in fields(ParticipantState) if f.type in (int, float, bool)
+}
+CONFIG_COLUMNS = {
+    f.name: {int: np.int64, float: np.float64}[f.type]
+    for f in fields(IndividualParticipantConfig) if f.type in (int, float)
+}
+STATUSES = list(ParticipantStatus)
+
+
+def encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """UTF-8 bytes of all the strings, end to end, and the offset of each one (n + 1 offsets)"""
+    text = "".join(values)
+    if text.isascii():
+        # Un caractère par octet : un seul encodage pour toute la colonne
+        data, lengths = text.encode("ascii"), list(map(len, values))
+    else:
+        encoded = [value.encode("utf-8") for value in values]
+        data, lengths = b"".join(encoded), list(map(len, encoded))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return np.frombuffer(data, dtype=np.uint8), offsets
+
+
+class StringColumn(Sequence):
+    """Strings of a snapshot column, decoded one by one when accessed, or all at once by tolist()"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string column index out of range")
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        if data.isascii():
+            text = data.decode("ascii")
+            return [text[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+        return [data[start:stop].decode("utf-8") for start, stop in zip(offsets[:-1], offsets[1:])]
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while building many objects at once: they form no
+    cycles, and every collection triggered by the allocations would scan them all again
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def encode_ragged(values: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Lists of floats of varying lengths, as their concatenation and the offset of each list"""
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in values], out=offsets[1:])
+    flat = [item for value in values for item in value]
+    return np.array(flat, dtype=np.float64), offsets
+
+
+def write_snapshot(path: str, columns: Dict[str, np.ndarray], header: Dict[str, Any]):
+    """
+    Write a snapshot directory: one .npy file per column and header.json. The directory is
+    written next to its destination and swapped in at the end, so a reader never sees half of it.
+    """
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    temporary = path.with_name(path.name + ".tmp")
+    if temporary.exists():
+        shutil.rmtree(temporary)
+    temporary.mkdir()
+    for name, values in columns.items():
+        np.save(temporary / f"{name}.npy", np.ascontiguousarray(values), allow_pickle=False)
+    header = {
+        "version": SNAPSHOT_VERSION,
+        **header,
+        "columns": {name: {"dtype": str(values.dtype), "shape": list(values.shape)} for name, values in columns.items()},
+    }
+    with open(temporary / "header.json", "w") as f:
+        json.dump(header, f)
+
+    if path.exists() or path.is_symlink():
+        # Ancienne version (instantané ou fichier d'un autre format) remplacée après coup
+        previous = path.with_name(path.name + ".old")
+        os.replace(path, previous)
+        os.replace(temporary, path)
+        if previous.is_dir():
+            shutil.rmtree(previous)
+        else:
+            previous.unlink()
+    else:
+        os.replace(temporary, path)
+
+
+def is_snapshot(path: str) -> bool:
+    return (Path(path) / "header.json").is_file()
+
+
+class Snapshot:
+    """
+    Read access to a snapshot directory. Only the header is read when opening; columns are
+    memory-mapped (mmap=True) when first accessed and strings are decoded on access, so
+    opening a large snapshot costs nothing and an analysis only reads the pages of the
+    columns it uses. participants() and state() build Python objects for every member, in
+    time proportional to the members (a few seconds for a million).
+    """
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = Path(path)
+        if not is_snapshot(self.path):
+            raise Exception(f"Not a snapshot directory: {self.path}")
+        with open(self.path / "header.json") as f:
+            self.header: Dict[str, Any] = json.load(f)
+        if self.header["version"] > SNAPSHOT_VERSION:
+            raise Exception(f"Unsupported snapshot version: {self.header['version']}")
+        self.mmap = mmap
+        self.columns: Dict[str, np.ndarray] = {}
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.header.get("metadata", {})
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.header["columns"]
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            if name not in self:
+                raise Exception(f"Unknown snapshot column: {name}")
+            self.columns[name] = np.load(self.path / f"{name}.npy", mmap_mode="r" if self.mmap else None, allow_pickle=False)
+        return self.columns[name]
+
+    def strings(self, name: str) -> StringColumn:
+        return StringColumn(self.column(name), self.column(f"{name}_offsets"))
+
+    def ragged(self, name: str) -> List[List[float]]:
+        values = self.column(name).tolist()
+        offsets = self.column(f"{name}_offsets").tolist()
+        with paused_gc():
+            return [values[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+
+    def participants(self) -> pd.DataFrame:
+        """One row per member of a state snapshot (historical members, in join order), for analysis"""
+        frame = pd.DataFrame({
+            "id": self.strings("id").tolist(),
+            "config_id": self.strings("config_id").tolist(),
+            "name": self.strings("config_name").tolist(),
+            "status": pd.Categorical.from_codes(np.asarray(self.column("status")), [s.value for s in STATUSES]),
+        })
+        active = np.zeros(len(frame), dtype=bool)
+        active[np.asarray(self.column("active"))] = True
+        frame["active"] = active
+        for name in (*PARTICIPANT_COLUMNS, *CONFIG_COLUMNS):
+            frame[name] = np.asarray(self.column(name))
+        frame["active_loans"] = np.diff(np.asarray(self.column("active_loans_offsets")))
+        return frame
+
+    def state(self, participant_configs: Optional[List[IndividualParticipantConfig]] = None) -> TontineState:
+        """
+        Rebuild the TontineState exactly: values, member order, active members shared with the
+        historical ones. Members whose config equals one of `participant_configs` point to that
+        object, the others share one config object per distinct config.
+        """
+        header = self.header
+        with paused_gc():
+            ids = self.strings("id").tolist()
+            known = {
+                (c.id, c.name, *(getattr(c, name) for name in CONFIG_COLUMNS)): c
+                for c in participant_configs or []
+            }
+            keys = zip(self.strings("config_id").tolist(), self.strings("config_name").tolist(),
+                       *(self.column(name).tolist() for name in CONFIG_COLUMNS))
+            configs = [known.get(key) or known.setdefault(key, IndividualParticipantConfig(*key)) for key in keys]
+
+            columns = []
+            for f in fields(ParticipantState):
+                if f.name == "id":
+                    columns.append(ids)
+                elif f.name == "config":
+                    columns.append(configs)
+                elif f.name == "status":
+                    columns.append([STATUSES[code] for code in self.column("status").tolist()])
+                elif f.name == "active_loans":
+                    columns.append(self.ragged("active_loans"))
+                else:
+                    columns.append(self.column(f.name).tolist())
+            members = list(map(ParticipantState, *columns))
+            historical_participant = dict(zip(ids, members))
+            active = self.column("active").tolist()
+            active_participants = dict(zip(map(ids.__getitem__, active), map(members.__getitem__, active)))
+
+        state = TontineState(
+            active_participants=active_participants,
+            historical_participant=historical_participant,
+            round_robin_history=self.strings("round_robin_history").tolist(),
+            start_date=datetime.fromisoformat(header["start_date"]),
+            **header["state"]
+        )
+        if "monthly_distribution_history" in self:
+            state.monthly_distribution_history = self.strings("monthly_distribution_history").tolist()
+        return state
+
+
+def save_state(path: str, state: TontineState, metadata: Optional[Dict[str, Any]] = None):
+    """
+    Columnar snapshot of a TontineState: every member (historical_participant, in order) is a row,
+    written in bulk column by column; the active members are a column of row numbers
+    """
+    members = list(state.historical_participant.values())
+    ids = list(map(attrgetter("id"), members))
+    if ids != list(state.historical_participant):
+        raise Exception("Members must be keyed by their id to be saved in a snapshot")
+    count = len(members)
+    rows = dict(zip(ids, range(count)))
+    active = list(map(rows.get, state.active_participants))
+    if None in active or any(map(is_not, state.active_participants.values(), map(members.__getitem__, active))):
+        raise Exception("Every active member must also be a historical member")
+
+    configs = list(map(attrgetter("config"), members))
+    columns: Dict[str, np.ndarray] = {}
+
+    def add_strings(name: str, values: List[str]):
+        columns[name], columns[f"{name}_offsets"] = encode_strings(values)
+
+    add_strings("id", ids)
+    add_strings("config_id", list(map(attrgetter("id"), configs)))
+    add_strings("config_name", list(map(attrgetter("name"), configs)))
+    for name, dtype in CONFIG_COLUMNS.items():
+        columns[name] = np.fromiter(map(attrgetter(name), configs), dtype=dtype, count=count)
+    for name, dtype in PARTICIPANT_COLUMNS.items():
+        columns[name] = np.fromiter(map(attrgetter(name), members), dtype=dtype, count=count)
+    columns["status"] = np.fromiter(map(STATUSES.index, map(attrgetter("status"), members)), dtype=np.int8, count=count)
+    columns["active_loans"], columns["active_loans_offsets"] = encode_ragged(list(map(attrgetter("active_loans"), members)))
+    columns["active"] = np.array(active, dtype=np.int64)
+    add_strings("round_robin_history", state.round_robin_history)
+    if hasattr(state, "monthly_distribution_history"):
+        add_strings("monthly_distribution_history", state.monthly_distribution_history)
+
+    write_snapshot(path, columns, {
+        "kind": "state",
+        "members": count,
+        "state": {name: getattr(state, name) for name in STATE_FIELDS},
+        "start_date": state.start_date.isoformat(),
+        "metadata": metadata or {},
+    })
+
+
+def load_state(
+    path: str,
+    participant_configs: Optional[List[IndividualParticipantConfig]] = None
+) -> TontineState:
+    return Snapshot(path).state(participant_configs)
+
+
+def save_results(path: str, results: List[Any], metadata: Optional[Dict[str, Any]] = None):
+    """Columnar snapshot of replica results (ReplicaResult); a missing failure month is stored as -1"""
+    from tontine_batch import ReplicaResult
+
+    columns: Dict[str, np.ndarray] = {}
+    for name, spec in ReplicaResult.__dataclass_fields__.items():
+        values = [getattr(result, name) for result in results]
+        if name == "treasury_path":
+            columns[name], columns[f"{name}_offsets"] = encode_ragged(values)
+        elif name == "failure_month":
+            columns[name] = np.array([-1 if value is None else value for value in values], dtype=np.int64)
+        else:
+            columns[name] = np.array(values, dtype=np.int64 if spec.type is int else np.float64)
+    write_snapshot(path, columns, {"kind": "results", "replicas": len(results), "metadata": metadata or {}})
+
+
+def load_results(path: str) -> List[Any]:
+    from tontine_batch import ReplicaResult
+
+    snapshot = Snapshot(path)
+    columns = {
+        name: snapshot.ragged(name) if name == "treasury_path" else snapshot.column(name).tolist()
+        for name in ReplicaResult.__dataclass_fields__
+    }
+    columns["failure_month"] = [None if month < 0 else month for month in columns["failure_month"]]
+    with paused_gc():
+        return [ReplicaResult(**dict(zip(columns, values))) for values in zip(*columns.values())]
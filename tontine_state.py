@@ -1,10 +1,20 @@
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 
 from tontine_config import IndividualParticipantConfig
 
+# Date du mois 0 : le moteur compte en mois entiers, les dates ne servent qu'aux rapports
+DEFAULT_START_DATE = datetime(2025, 1, 1)
+
+
+def month_to_date(start_date: datetime, month: int) -> datetime:
+    """Calendar date of simulation month `month`, month 0 being `start_date`"""
+    years, month_index = divmod(start_date.month - 1 + month, 12)
+    return start_date.replace(year=start_date.year + years, month=month_index + 1)
+
+
 class ParticipantStatus(Enum):
     ACTIVE = "active"
     DEFAULTED = "defaulted"
@@ -14,23 +24,24 @@ class ParticipantStatus(Enum):
 class ParticipantState:
     id: str
     config: IndividualParticipantConfig  # Add reference to participant's config
-    join_date: datetime
-    exit_date: datetime
+    join_month: int                 # Mois d'adhésion (indice de mois de la simulation)
+    exit_month: int                 # Mois de départ (prévu, puis effectif)
     status: ParticipantStatus
     total_contributions: float
     current_debt: float
     active_loans: List[float]
     missed_payments: int
     consecutive_defaults: int
-    last_payment_date: datetime
+    last_payment_month: int
     total_borrowed: float
     total_repaid: float
     is_eligible_for_loan: bool
+    eligible_month: int             # Premier mois d'éligibilité aux prêts (adhésion + ancienneté minimale)
     monthly_distributions_received: float = 0.0  
 
 @dataclass
 class TontineState:
-    current_date: datetime
+    current_month: int              # Indice du mois en cours (0 = premier mois simulé)
     cycle_number: int
     month_in_cycle: int
     
@@ -58,6 +69,17 @@ class TontineState:
     
     # Round Robin
     round_robin_history: List[str] = field(default_factory=list)
+
+    start_date: datetime = DEFAULT_START_DATE
+
+    @property
+    def current_date(self) -> datetime:
+        """Calendar date of the current month, for reporting"""
+        return self.date_of(self.current_month)
+
+    def date_of(self, month: int) -> datetime:
+        """Calendar date of a simulation month index, for reporting"""
+        return month_to_date(self.start_date, month)
     
     def is_cycle_end(self) -> bool:
         """Check if we're at the end of a cycle"""
@@ -70,5 +92,33 @@ class TontineState:
     def get_participant_state(self, participant_id: str) -> ParticipantState | None:
         """Get the state of a specific participant"""
         return self.active_participants.get(participant_id)
-    
+
+
+@dataclass
+class MonthlyMetrics:
+    """Summary of one simulated month, streamed to the executor observers"""
+    month: int                      # Mois simulé (0-indexé)
+    cycle_number: int
+    month_in_cycle: int
+    treasury_balance: float
+    emergency_fund: float
+    total_loans_outstanding: float
+    total_contributions_received: float
+    total_interest_earned: float
+    default_rate: float
+    loan_recovery_rate: float
+    active_participants: int
+    total_participants_history: int
+    collected: float                # Cotisations collectées ce mois-ci
+    debt_refunded: float            # Montants rendus aux membres sortants ce mois-ci
+    defaults: int                   # Nombre de cotisations manquées ce mois-ci
+    exits: int                      # Départs ce mois-ci
+    arrivals: int                   # Arrivées ce mois-ci
+    beneficiary: str                # Bénéficiaire de la distribution mensuelle
+    members_due: int = 0            # Membres appelés à cotiser ce mois-ci (payeurs et défaillants)
+    # Dette (avant, après) de chaque membre dont la dette a changé ce mois-ci ; None hors de la tontine
+    # (arrivée ou départ), pour mettre à jour des statistiques sans parcourir tous les membres
+    debt_changes: List[Tuple[Optional[float], Optional[float]]] = field(default_factory=list)
+    changed_members: List[str] = field(default_factory=list)  # Identifiants des membres de debt_changes, dans le même ordre
+    paid_members: List[str] = field(default_factory=list)     # Membres ayant payé leur cotisation ce mois-ci
 
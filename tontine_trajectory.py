@@ -0,0 +1,262 @@
+import itertools
+import json
+import zlib
+from operator import attrgetter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from tontine_state import TontineState, MonthlyMetrics, ParticipantState
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    """Group the bytes by rank (all the first bytes, then all the second bytes...): zlib compresses them better"""
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype) -> np.ndarray:
+    itemsize = np.dtype(dtype).itemsize
+    return np.ascontiguousarray(np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T).view(dtype).ravel()
+
+
+class TrajectoryRecorder:
+    """
+    Month-by-month history of every member, recorded as an executor observer.
+
+    Members get a slot in join order. Rows are written in place into a chunk buffer allocated
+    for all members (its capacity doubles as members join); every `chunk_months` months it is
+    written as zlib-compressed columns (fastest level): bit-packed flags (active, paid, defaulted) and, for
+    debt and the cumulative distributions, borrowings and repayments, the first row of the
+    chunk as float64 followed by byte-shuffled float32 deltas. Deltas are taken against the
+    decoded previous value, so rounding errors do not accumulate, and every chunk decodes on its own.
+    The chunk table and member ids go to a JSON index written at the end of the run.
+
+    Each month starts from the previous row and only reads what the executor may have changed:
+    debt, borrowings, repayments, missed payments and presence of the members listed in
+    metrics.changed_members (every such change, arrivals and departures included, goes through
+    them) and of the newcomers, and the distributions of the month's beneficiaries and newcomers.
+    A member has paid when listed in metrics.paid_members.
+    """
+
+    FLAGS = ("active", "paid", "defaulted")
+    VALUES = ("debt", "distributions", "borrowed", "repaid")
+    # Attribut lu pour chaque montant
+    FIELDS = {
+        "debt": attrgetter("current_debt"),
+        "distributions": attrgetter("monthly_distributions_received"),
+        "borrowed": attrgetter("total_borrowed"),
+        "repaid": attrgetter("total_repaid"),
+    }
+
+    def __init__(self, path: str, chunk_months: int = 12):
+        self.path = Path(path)
+        self.chunk_months = chunk_months
+        self.members: List[ParticipantState] = []
+        self.slots: Dict[str, int] = {}
+        self.first_months: List[int] = []
+        self.missed: np.ndarray = np.zeros(0, dtype=np.int64)
+        # Bloc en cours, un mois par ligne, alloué pour `capacity` membres et agrandi au besoin
+        self.capacity = 0
+        self.buffer: Dict[str, np.ndarray] = {
+            **{name: np.zeros((chunk_months, 0), dtype=bool) for name in self.FLAGS},
+            **{name: np.zeros((chunk_months, 0), dtype=np.float64) for name in self.VALUES},
+        }
+        self.months = 0                  # Mois déjà écrits dans le bloc en cours
+        self.distributions_seen = 0      # Bénéficiaires de state.monthly_distribution_history déjà lus
+        self.first_month: Optional[int] = None
+        self.chunks: List[Dict[str, Any]] = []
+        self.offset = 0
+        # Le fichier n'est ouvert que le temps d'écrire un bloc : rien ne reste ouvert si la simulation échoue
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.path.with_suffix(".bin").write_bytes(b"")
+
+    def _grow(self, count: int):
+        """Make room for `count` members in the chunk buffer, doubling its capacity"""
+        self.capacity = max(count, 2 * self.capacity)
+        for name, values in self.buffer.items():
+            grown = np.zeros((self.chunk_months, self.capacity), dtype=values.dtype)
+            grown[:, :values.shape[1]] = values
+            self.buffer[name] = grown
+
+    def on_month(self, metrics: MonthlyMetrics, state: TontineState):
+        if self.first_month is None:
+            self.first_month = metrics.month
+        new_members = list(itertools.islice(state.historical_participant.values(), len(self.members), None))
+        first_new = len(self.members)
+        if new_members:
+            for p in new_members:
+                self.slots[p.id] = len(self.members)
+                self.members.append(p)
+            self.first_months.extend([metrics.month] * len(new_members))
+            self.missed = np.concatenate([self.missed, [p.missed_payments for p in new_members]])
+            if len(self.members) > self.capacity:
+                self._grow(len(self.members))
+
+        count = len(self.members)
+        slots = self.slots
+        month = self.months
+        buffer = self.buffer
+        # La ligne du mois part de celle du mois précédent (dernière ligne du bloc écrit, au premier mois d'un bloc)
+        previous = month - 1 if month > 0 else self.chunk_months - 1
+        for name in ("active", *self.VALUES):
+            buffer[name][month, :count] = buffer[name][previous, :count]
+        buffer["paid"][month] = False
+        buffer["paid"][month, np.fromiter(map(slots.__getitem__, metrics.paid_members), dtype=np.int64,
+                                          count=len(metrics.paid_members))] = True
+        buffer["defaulted"][month] = False
+
+        beneficiaries = getattr(state, "monthly_distribution_history", [])[self.distributions_seen:]
+        self.distributions_seen += len(beneficiaries)
+        # Les distributions ne changent que pour les bénéficiaires du mois (et les arrivants)
+        paid_out = [slots[member_id] for member_id in beneficiaries] + list(range(first_new, count))
+        buffer["distributions"][month, paid_out] = [self.members[slot].monthly_distributions_received for slot in paid_out]
+
+        # Arrivées et départs passent par metrics.changed_members : la présence des autres ne change pas.
+        # Les membres de l'état initial n'y figurent pas à leur premier mois.
+        changed_ids = metrics.changed_members
+        if first_new < count:
+            changed_ids = list(dict.fromkeys([*changed_ids, *(p.id for p in new_members)]))
+        changed = np.fromiter(map(slots.__getitem__, changed_ids), dtype=np.int64, count=len(changed_ids))
+        members = list(map(self.members.__getitem__, changed.tolist()))
+        buffer["active"][month, changed] = np.fromiter(
+            map(state.active_participants.__contains__, changed_ids), dtype=bool, count=len(members)
+        )
+        for name in ("debt", "borrowed", "repaid"):
+            buffer[name][month, changed] = np.fromiter(map(self.FIELDS[name], members), dtype=np.float64, count=len(members))
+        missed = np.fromiter(map(attrgetter("missed_payments"), members), dtype=np.int64, count=len(members))
+        buffer["defaulted"][month, changed] = missed > self.missed[changed]
+        self.missed[changed] = missed
+
+        self.months += 1
+        if self.months == self.chunk_months:
+            self._flush()
+
+    def _write(self, f, data: bytes) -> List[int]:
+        compressed = zlib.compress(data, 1)
+        f.write(compressed)
+        self.offset += len(compressed)
+        return [self.offset - len(compressed), len(compressed)]
+
+    def _flush(self):
+        if not self.months:
+            return
+        months = self.months
+        slots = len(self.members)
+        chunk = {"first_month": self.first_month + len(self.chunks) * self.chunk_months, "months": months, "slots": slots}
+        with open(self.path.with_suffix(".bin"), "ab") as f:
+            for name in self.FLAGS:
+                chunk[name] = self._write(f, np.packbits(self.buffer[name][:months, :slots]).tobytes())
+            for name in self.VALUES:
+                values = self.buffer[name][:months, :slots]
+                deltas = np.zeros((months - 1, slots), dtype=np.float32)
+                decoded = values[0].copy()
+                for index in range(1, months):
+                    # Valeur inchangée : delta nul (le reste d'arrondi attend le prochain changement)
+                    changed = values[index] != values[index - 1]
+                    deltas[index - 1, changed] = values[index, changed] - decoded[changed]
+                    decoded += deltas[index - 1]
+                chunk[name] = self._write(f, _shuffle(np.ascontiguousarray(values[0])) + _shuffle(deltas))
+        self.chunks.append(chunk)
+        # La dernière ligne du bloc sert de point de départ au premier mois du suivant
+        for values in self.buffer.values():
+            values[-1, :slots] = values[months - 1, :slots]
+        self.months = 0
+
+    def on_simulation_end(self, state: TontineState, failure_month: Optional[int]):
+        self._flush()
+        index = {
+            "chunk_months": self.chunk_months,
+            "members": [p.id for p in self.members],
+            "first_months": self.first_months,
+            "chunks": self.chunks,
+        }
+        with open(self.path.with_suffix(".json"), "w") as f:
+            json.dump(index, f)
+
+
+class TrajectoryReader:
+    """Random access to a recorded trajectory: only the chunks covering the requested months are read"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path.with_suffix(".json")) as f:
+            index = json.load(f)
+        self.member_ids: List[str] = index["members"]
+        self.first_months = np.array(index["first_months"], dtype=np.int64)
+        self.slots = {member_id: slot for slot, member_id in enumerate(self.member_ids)}
+        self.chunks: List[Dict[str, Any]] = index["chunks"]
+
+    @property
+    def months(self) -> range:
+        if not self.chunks:
+            return range(0)
+        return range(self.chunks[0]["first_month"], self.chunks[-1]["first_month"] + self.chunks[-1]["months"])
+
+    def _read(self, f, location: List[int]) -> bytes:
+        f.seek(location[0])
+        return zlib.decompress(f.read(location[1]))
+
+    def _decode(self, f, chunk: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        months, slots = chunk["months"], chunk["slots"]
+        columns = {}
+        for name in TrajectoryRecorder.FLAGS:
+            bits = np.unpackbits(np.frombuffer(self._read(f, chunk[name]), dtype=np.uint8), count=months * slots)
+            columns[name] = bits.reshape(months, slots).astype(bool)
+        for name in TrajectoryRecorder.VALUES:
+            data = self._read(f, chunk[name])
+            first = _unshuffle(data[:8 * slots], np.float64)
+            deltas = _unshuffle(data[8 * slots:], np.float32).reshape(months - 1, slots)
+            columns[name] = np.cumsum(np.vstack([first, deltas.astype(np.float64)]), axis=0)
+        return columns
+
+    def read(
+        self,
+        member_ids: Optional[List[str]] = None,
+        first_month: Optional[int] = None,
+        last_month: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        One row per (member, month) for months first_month..last_month (inclusive) and the given
+        members (all by default). Values are the member's state at the end of the month.
+        """
+        months = self.months
+        first_month = months.start if first_month is None else first_month
+        last_month = months.stop - 1 if last_month is None else last_month
+        if member_ids is None:
+            slots = np.arange(len(self.member_ids))
+        else:
+            unknown = [member_id for member_id in member_ids if member_id not in self.slots]
+            if unknown:
+                raise Exception(f"Unknown members: {', '.join(unknown[:10])}")
+            slots = np.array([self.slots[member_id] for member_id in member_ids], dtype=np.int64)
+
+        frames = []
+        with open(self.path.with_suffix(".bin"), "rb") as f:
+            for chunk in self.chunks:
+                chunk_last = chunk["first_month"] + chunk["months"] - 1
+                if chunk_last < first_month or chunk["first_month"] > last_month:
+                    continue
+                columns = self._decode(f, chunk)
+                rows = np.arange(max(first_month, chunk["first_month"]), min(last_month, chunk_last) + 1)
+                selected = slots[slots < chunk["slots"]]      # Membres déjà arrivés à la fin du bloc
+                grid_rows, grid_slots = np.meshgrid(rows - chunk["first_month"], selected, indexing="ij")
+                # Avant son arrivée, un membre n'a pas d'historique
+                joined = (grid_rows + chunk["first_month"] >= self.first_months[grid_slots]).ravel()
+                grid_rows, grid_slots = grid_rows.ravel()[joined], grid_slots.ravel()[joined]
+                frame = {
+                    "member_id": [self.member_ids[slot] for slot in grid_slots],
+                    "month": grid_rows + chunk["first_month"],
+                }
+                for name, values in columns.items():
+                    frame[name] = values[grid_rows, grid_slots]
+                frames.append(pd.DataFrame(frame))
+        if not frames:
+            return pd.DataFrame(columns=["member_id", "month", *TrajectoryRecorder.FLAGS, *TrajectoryRecorder.VALUES])
+        result = pd.concat(frames, ignore_index=True)
+        return result.sort_values(["member_id", "month"], kind="stable").reset_index(drop=True)
+
+    def member(self, member_id: str, first_month: Optional[int] = None, last_month: Optional[int] = None) -> pd.DataFrame:
+        """History of one member"""
+        return self.read([member_id], first_month, last_month).drop(columns="member_id").reset_index(drop=True)
@@ -0,0 +1,182 @@
+import math
+import os
+import time
+from statistics import NormalDist
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_batch import ReplicaResult, replica_seed, resolve_engine, run_groups
+from tontine_scenarios import Scenario
+
+
+def ks_two_sample(a: np.ndarray, b: np.ndarray) -> Tuple[float, float]:
+    """
+    Two-sample Kolmogorov-Smirnov test: maximum distance between the empirical CDFs and its
+    asymptotic p-value (conservative for discrete values, e.g. counts)
+    """
+    a, b = np.sort(a), np.sort(b)
+    values = np.concatenate([a, b])
+    distance = float(np.max(np.abs(
+        np.searchsorted(a, values, side="right") / len(a) - np.searchsorted(b, values, side="right") / len(b)
+    )))
+    effective = math.sqrt(len(a) * len(b) / (len(a) + len(b)))
+    scaled = (effective + 0.12 + 0.11 / effective) * distance
+    if scaled < 1e-3:
+        return distance, 1.0
+    terms = [(-1) ** (k - 1) * math.exp(-2.0 * k * k * scaled * scaled) for k in range(1, 101)]
+    return distance, min(1.0, max(0.0, 2.0 * sum(terms)))
+
+
+def two_proportion_test(successes_a: int, n_a: int, successes_b: int, n_b: int) -> Tuple[float, float]:
+    """z statistic and two-sided p-value of the difference between two proportions"""
+    pooled = (successes_a + successes_b) / (n_a + n_b)
+    variance = pooled * (1 - pooled) * (1 / n_a + 1 / n_b)
+    if variance == 0:
+        return 0.0, 1.0
+    z = (successes_a / n_a - successes_b / n_b) / math.sqrt(variance)
+    return z, math.erfc(abs(z) / math.sqrt(2))
+
+
+class EngineValidation:
+    """
+    Statistical equivalence of a candidate engine with the reference executor.
+
+    Both engines run the same configuration over the same replica seeds (their random streams
+    differ, so runs are compared as distributions, not one by one). For every output, the
+    candidate passes when:
+
+    - a two-sample Kolmogorov-Smirnov test does not detect a difference of distribution at
+      level alpha (Bonferroni-corrected over the outputs), and
+    - the difference of the means is not significantly beyond the tolerance band of
+      `tolerance` reference standard deviations. Unlike the test, this bound ignores
+      differences too small to matter, which large samples always end up detecting.
+
+    The failure probability is compared with a two-proportion test. The wall time of each
+    engine gives the speedup.
+    """
+
+    OUTPUTS: Dict[str, Callable[[ReplicaResult], float]] = {
+        # Mois de faillite, censuré à l'horizon pour les réplications sans faillite
+        "failure_month": lambda r: float(r.failure_month if r.failed else r.months),
+        "final_treasury": lambda r: r.final_treasury,
+        "total_interest": lambda r: r.total_interest,
+        "total_defaults": lambda r: float(r.total_defaults),
+        "active_members": lambda r: float(r.active_members),
+        "total_members": lambda r: float(r.total_members),
+    }
+
+    def __init__(
+        self,
+        tontine_config: TontineConfig,
+        participant_configs: List[IndividualParticipantConfig],
+        num_months: int = 36,
+        replicas: int = 1000,
+        candidate: str = "kernel",
+        seed: int = 0,
+        alpha: float = 0.01,
+        tolerance: float = 0.1,
+        workers: Optional[int] = 1,
+        scenario: Optional[Scenario] = None
+    ):
+        self.tontine_config = tontine_config
+        self.participant_configs = participant_configs
+        self.num_months = num_months
+        self.seeds = [replica_seed(seed, index) for index in range(replicas)]
+        # "auto" désigne ici le seul moteur alternatif, le noyau, qui s'exécute aussi sans numba
+        self.candidate = "kernel" if candidate == "auto" else resolve_engine(candidate)
+        if self.candidate == "reference":
+            raise Exception("The candidate engine must differ from the reference engine")
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.workers = workers
+        self.scenario = scenario
+        self.results: Dict[str, List[ReplicaResult]] = {}   # Réplications de chaque moteur, après run()
+
+    def _run(self, engine: str, on_progress: Optional[Callable[[str, int, int], None]]) -> Tuple[List[ReplicaResult], float]:
+        """Run every seed on one engine; return the results in seed order and the wall time"""
+        chunk = max(1, -(-len(self.seeds) // (4 * (self.workers or os.cpu_count() or 1))))
+        groups = [
+            (self.tontine_config, self.participant_configs, self.num_months, self.seeds[start:start + chunk],
+             None, 0, engine, False, self.scenario)
+            for start in range(0, len(self.seeds), chunk)
+        ]
+        completed = 0
+
+        def on_group(index: int, group_results: List[ReplicaResult]):
+            nonlocal completed
+            completed += 1
+            if on_progress is not None:
+                on_progress(engine, completed, len(groups))
+
+        started = time.perf_counter()
+        results = run_groups(groups, workers=self.workers, on_group=on_group)
+        return [result for group in results for result in group], time.perf_counter() - started
+
+    @staticmethod
+    def _describe(values: np.ndarray) -> Dict[str, float]:
+        return {
+            "mean": float(values.mean()),
+            "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+            "p05": float(np.quantile(values, 0.05)),
+            "p50": float(np.quantile(values, 0.50)),
+            "p95": float(np.quantile(values, 0.95)),
+        }
+
+    def run(self, on_progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+        if self.candidate == "kernel":
+            from tontine_kernel import warm_up
+            warm_up()  # La compilation ne compte pas dans le temps du moteur
+        reference, reference_time = self._run("reference", on_progress)
+        candidate, candidate_time = self._run(self.candidate, on_progress)
+        self.results = {"reference": reference, self.candidate: candidate}
+
+        level = self.alpha / len(self.OUTPUTS)
+        critical = NormalDist().inv_cdf(1 - level)
+        outputs = {}
+        for name, output in self.OUTPUTS.items():
+            a = np.array([output(r) for r in reference])
+            b = np.array([output(r) for r in candidate])
+            statistic, p_value = ks_two_sample(a, b)
+            scale = a.std(ddof=1)
+            difference = float(b.mean() - a.mean())
+            standardized = float(abs(difference) / scale) if scale > 0 else (0.0 if difference == 0 else float("inf"))
+            # Écart au-delà de la bande, rapporté à l'erreur type de la différence des moyennes
+            error = math.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+            excess = abs(difference) - self.tolerance * scale
+            outputs[name] = {
+                "reference": self._describe(a),
+                "candidate": self._describe(b),
+                "mean_difference": difference,
+                "standardized_difference": standardized,
+                "ks_statistic": statistic,
+                "ks_p_value": p_value,
+                "band": float(self.tolerance * scale),
+                "passed": bool(p_value >= level and excess <= critical * error),
+            }
+
+        failures_a = sum(r.failed for r in reference)
+        failures_b = sum(r.failed for r in candidate)
+        z, p_value = two_proportion_test(failures_a, len(reference), failures_b, len(candidate))
+        failure = {
+            "reference": failures_a / len(reference),
+            "candidate": failures_b / len(candidate),
+            "z": z,
+            "p_value": p_value,
+            "passed": bool(p_value >= self.alpha),
+        }
+
+        return {
+            "candidate": self.candidate,
+            "months": self.num_months,
+            "replicas": len(self.seeds),
+            "alpha": self.alpha,
+            "tolerance": self.tolerance,
+            "reference_seconds": reference_time,
+            "candidate_seconds": candidate_time,
+            "speedup": reference_time / candidate_time if candidate_time > 0 else float("inf"),
+            "failure_probability": failure,
+            "outputs": outputs,
+            "passed": failure["passed"] and all(output["passed"] for output in outputs.values()),
+        }
@@ -0,0 +1,274 @@
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tontine_config import TontineConfig, IndividualParticipantConfig
+from tontine_initializer import TontineInitializer
+from tontine_batch import canonical_config, config_hash, replica_seed, resolve_engine
+from tontine_compare import apply_changes, parse_change
+from tontine_sketch import ReplicaSketch, sketch_replica_group
+
+
+# Décalage d'horloge toléré (secondes) entre le serveur de fichiers et les machines qui jugent les baux
+CLOCK_SKEW_MARGIN = 30.0
+
+
+def parse_sweep(spec: str) -> Tuple[str, List[float]]:
+    """Parse a "name=v1,v2,..." sweep specification"""
+    try:
+        name, values = spec.split("=")
+        return name, [float(value) for value in values.split(",")]
+    except ValueError:
+        raise Exception(f"Invalid sweep specification '{spec}', expected name=v1,v2,...")
+
+
+def sweep_points(specs: List[str]) -> List[Dict[str, float]]:
+    """Cartesian product of the sweep specifications, as {name: value} changes (one empty point without specs)"""
+    sweeps = [parse_sweep(spec) for spec in specs]
+    return [
+        {name: value for (name, _), value in zip(sweeps, values)}
+        for values in itertools.product(*[values for _, values in sweeps])
+    ]
+
+
+def point_config(
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    changes: Dict[str, float]
+) -> Tuple[TontineConfig, List[IndividualParticipantConfig]]:
+    if not changes:
+        return tontine_config, participant_configs
+    return apply_changes(tontine_config, participant_configs, [parse_change(f"{name}={value}") for name, value in changes.items()])
+
+
+class WorkQueue:
+    """
+    Work queue shared through a directory (e.g. on NFS), without any server:
+
+    - study.json describes the study (configuration, horizon, engine, seed, sweep points)
+    - pending/ holds one JSON file per work unit (one sweep point, a range of replicas)
+    - a worker claims a unit by renaming it into claimed/ under its own name; rename is atomic,
+      so exactly one worker wins. The claimed file's mtime is the lease, renewed while the
+      unit runs; units whose lease expired (dead worker) are renamed back to pending/
+    - results/ holds one sketch per unit, written to a temporary file then renamed, so a unit
+      computed twice (a slow worker whose lease expired) leaves one complete, identical result
+    - done/ receives the unit file once its result is written
+    """
+
+    DIRECTORIES = ("pending", "claimed", "done", "results")
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.pending = self.path / "pending"
+        self.claimed = self.path / "claimed"
+        self.done = self.path / "done"
+        self.results = self.path / "results"
+
+    @classmethod
+    def create(cls, path: str, study: Dict[str, Any], units: List[Dict[str, Any]]) -> "WorkQueue":
+        """Create the queue, or reopen it if it already holds the same study (coordinator restart)"""
+        queue = cls(path)
+        study_path = queue.path / "study.json"
+        if study_path.exists():
+            if queue.study != study:
+                raise Exception(f"The queue {path} already holds a different study")
+            return queue
+        for name in cls.DIRECTORIES:
+            (queue.path / name).mkdir(parents=True, exist_ok=True)
+        for unit in units:
+            queue._write_atomic(queue.pending / f"{unit['id']}.json", unit)
+        # study.json en dernier : sa présence signale une file complète
+        queue._write_atomic(study_path, study)
+        return queue
+
+    @property
+    def study(self) -> Dict[str, Any]:
+        with open(self.path / "study.json") as f:
+            return json.load(f)
+
+    def _write_atomic(self, path: Path, data: Dict[str, Any]):
+        temporary = self.path / f".{path.name}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+    def claim(self, worker_id: str) -> Optional[Tuple[Dict[str, Any], Path]]:
+        """Take the first pending unit; return (unit, claimed file) or None if nothing is pending"""
+        for name in sorted(os.listdir(self.pending)):
+            claimed = self.claimed / f"{name}@{worker_id}"
+            try:
+                # Bail renouvelé avant le renommage, qui conserve la date de modification :
+                # une unité longtemps en attente ne doit pas paraître expirée dès sa prise
+                os.utime(self.pending / name)
+                os.rename(self.pending / name, claimed)
+                with open(claimed) as f:
+                    return json.load(f), claimed
+            except FileNotFoundError:
+                continue  # Pris par un autre worker, ou bail jugé expiré entre-temps
+        return None
+
+    def reclaim_stale(self, lease: float) -> int:
+        """
+        Put back in pending/ the claimed units whose lease expired; return how many.
+
+        Lease dates are set by the file server, but compared with this machine's clock: clocks
+        are assumed to agree within CLOCK_SKEW_MARGIN seconds, which are added to the lease.
+        """
+        reclaimed = 0
+        now = time.time()
+        for name in os.listdir(self.claimed):
+            claimed = self.claimed / name
+            try:
+                if now - claimed.stat().st_mtime <= lease + CLOCK_SKEW_MARGIN:
+                    continue
+                os.rename(claimed, self.pending / name.split("@")[0])
+                reclaimed += 1
+            except FileNotFoundError:
+                continue
+        return reclaimed
+
+    def result_path(self, unit: Dict[str, Any]) -> Path:
+        return self.results / f"{unit['id']}.json.gz"
+
+    def complete(self, unit: Dict[str, Any], claimed: Path, sketch: Optional[ReplicaSketch]):
+        """Store the unit's result (unless already there) and move the unit to done/"""
+        result_path = self.result_path(unit)
+        if sketch is not None and not result_path.exists():
+            sketch.save(result_path)
+        try:
+            os.rename(claimed, self.done / claimed.name.split("@")[0])
+        except FileNotFoundError:
+            pass  # Bail expiré et unité reprise : le résultat est identique
+
+    def counts(self) -> Dict[str, int]:
+        return {name: len(os.listdir(self.path / name)) for name in ("pending", "claimed", "done")}
+
+    def finished(self) -> bool:
+        return len(os.listdir(self.done)) >= self.study["units"]
+
+
+@contextmanager
+def lease_renewal(claimed: Path, interval: float):
+    """Touch the claimed file every `interval` seconds while the block runs"""
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(interval):
+            try:
+                os.utime(claimed)
+            except FileNotFoundError:
+                return
+
+    thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def create_study(
+    path: str,
+    tontine_config: TontineConfig,
+    participant_configs: List[IndividualParticipantConfig],
+    num_months: int,
+    replicas: int,
+    unit_size: int = 50,
+    seed: int = 0,
+    engine: str = "auto",
+    sweeps: Optional[List[str]] = None,
+    lease: float = 300.0
+) -> WorkQueue:
+    """Create the queue of a study: `replicas` replicas of every sweep point, cut into units of `unit_size`"""
+    points = sweep_points(sweeps or [])
+    units = [
+        {"id": f"unit_{point:04d}_{first:08d}", "point": point, "first": first, "count": min(unit_size, replicas - first)}
+        for point in range(len(points))
+        for first in range(0, replicas, unit_size)
+    ]
+    study = {
+        "config": TontineInitializer.dump_config(tontine_config, participant_configs),
+        "months": num_months,
+        "replicas": replicas,
+        "seed": seed,
+        # Résolu ici : tous les workers utilisent le même moteur, quelle que soit leur machine
+        "engine": resolve_engine(engine),
+        "lease": lease,
+        "points": points,
+        "units": len(units),
+    }
+    return WorkQueue.create(path, study, units)
+
+
+def run_worker(
+    path: str,
+    worker_id: Optional[str] = None,
+    poll: float = 2.0,
+    on_unit: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> int:
+    """Claim and run units until the study is finished; return the number of units run"""
+    queue = WorkQueue(path)
+    while not (queue.path / "study.json").exists():
+        time.sleep(poll)
+    study = queue.study
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    base = TontineInitializer.parse_config(study["config"])
+    configs: Dict[int, Tuple[TontineConfig, List[IndividualParticipantConfig]]] = {}
+    completed = 0
+
+    while True:
+        queue.reclaim_stale(study["lease"])
+        claim = queue.claim(worker_id)
+        if claim is None:
+            if queue.finished():
+                return completed
+            time.sleep(poll)
+            continue
+        unit, claimed = claim
+        sketch = None
+        if not queue.result_path(unit).exists():
+            if unit["point"] not in configs:
+                configs[unit["point"]] = point_config(*base, study["points"][unit["point"]])
+            tontine_config, participant_configs = configs[unit["point"]]
+            key = config_hash(canonical_config(tontine_config, participant_configs), study["months"], study["engine"], study["seed"])
+            seeds = [replica_seed(study["seed"], index) for index in range(unit["first"], unit["first"] + unit["count"])]
+            with lease_renewal(claimed, study["lease"] / 3):
+                sketch = sketch_replica_group(
+                    tontine_config, participant_configs, study["months"], seeds, key, unit["first"], study["engine"]
+                )
+        queue.complete(unit, claimed, sketch)
+        completed += 1
+        if on_unit is not None:
+            on_unit(unit)
+
+
+def collect_study(path: str, poll: float = 2.0, on_progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, Any]:
+    """
+    Wait for every unit of the study (reclaiming the expired leases meanwhile), then merge the
+    results of each sweep point, one result file in memory at a time
+    """
+    queue = WorkQueue(path)
+    study = queue.study
+    while not queue.finished():
+        queue.reclaim_stale(study["lease"])
+        if on_progress is not None:
+            on_progress(queue.counts())
+        time.sleep(poll)
+
+    points = []
+    for index, changes in enumerate(study["points"]):
+        merged: Optional[ReplicaSketch] = None
+        for result in sorted(queue.results.glob(f"unit_{index:04d}_*.json.gz")):
+            sketch = ReplicaSketch.load(result)
+            merged = sketch if merged is None else merged.merge(sketch)
+        if merged is None or merged.replicas != study["replicas"]:
+            raise Exception(f"Missing results for sweep point {index} ({changes})")
+        points.append({"changes": changes, "summary": merged.summary()})
+    return {"months": study["months"], "replicas": study["replicas"], "engine": study["engine"], "points": points}